@@ -0,0 +1,230 @@
+"""
+Generatore di cataloghi musicali sintetici per i test di scalabilità.
+
+Produce file con lo stesso schema di `dataset/data/dataset.csv` (e, su richiesta, di
+`dataset/data/clean_tracks.csv`, con il mood già assegnato) e distribuzioni realistiche:
+- popolarità degli artisti a legge di Zipf (pochi artisti con molte tracce),
+- feature audio dipendenti dal genere (es. `classical` acustica e poco energetica,
+  `edm` energetica e ballabile) e correlate tra loro (loudness ed energia,
+  acousticness inversamente all'energia),
+- instrumentalness e speechiness concentrate vicino allo zero con code lunghe,
+- durata log-normale, tempo e popolarità con la forma del catalogo reale,
+- una quota di titoli ripetuti (stessa canzone pubblicata in più generi o versioni).
+
+La scrittura avviene a blocchi, quindi la memoria usata non dipende dal numero di tracce.
+
+Esempio:
+    python benchmark/generate_dataset.py --tracks 1000000 --output dataset/data/dataset.csv
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Percorsi predefiniti
+OUTPUT_PATH = "dataset/data/dataset.csv"
+CLEAN_OUTPUT_PATH = "dataset/data/clean_tracks.csv"
+
+# Numero di tracce generate per blocco
+CHUNK_SIZE = 100_000
+
+# Colonne di `dataset.csv`, nell'ordine del file originale
+DATASET_COLUMNS = [
+    "track_id", "artists", "album_name", "track_name", "popularity", "duration_ms",
+    "explicit", "danceability", "energy", "key", "loudness", "mode", "speechiness",
+    "acousticness", "instrumentalness", "liveness", "valence", "tempo",
+    "time_signature", "track_genre",
+]
+
+# Colonne di `clean_tracks.csv` (come `OUTPUT_COLUMNS` di `kmeans_clustering.py`)
+CLEAN_COLUMNS = [
+    "track_id", "track_name", "artists", "album_name", "track_genre",
+    "popularity", "duration_ms", "explicit",
+    "danceability", "energy", "valence", "tempo",
+    "acousticness", "instrumentalness", "loudness",
+    "speechiness", "liveness", "key", "mode", "time_signature",
+    "mood",
+]
+
+# Profili di genere: (peso, media danceability, media energy, media valence,
+# media acousticness, probabilità di brano strumentale, tempo medio)
+GENRE_PROFILES = {
+    "pop":         (0.10, 0.65, 0.65, 0.55, 0.20, 0.03, 120),
+    "rock":        (0.08, 0.50, 0.75, 0.50, 0.10, 0.08, 125),
+    "hip-hop":     (0.08, 0.75, 0.65, 0.50, 0.15, 0.02, 100),
+    "edm":         (0.06, 0.70, 0.85, 0.40, 0.05, 0.40, 128),
+    "dance":       (0.06, 0.75, 0.75, 0.60, 0.10, 0.10, 122),
+    "indie":       (0.06, 0.55, 0.60, 0.45, 0.30, 0.10, 118),
+    "acoustic":    (0.05, 0.55, 0.35, 0.45, 0.75, 0.05, 110),
+    "jazz":        (0.05, 0.55, 0.40, 0.50, 0.60, 0.35, 110),
+    "classical":   (0.05, 0.30, 0.15, 0.25, 0.90, 0.85, 100),
+    "metal":       (0.05, 0.40, 0.92, 0.30, 0.02, 0.15, 135),
+    "latin":       (0.05, 0.75, 0.75, 0.70, 0.20, 0.02, 115),
+    "r-n-b":       (0.05, 0.65, 0.55, 0.50, 0.25, 0.02, 105),
+    "country":     (0.04, 0.60, 0.60, 0.60, 0.35, 0.01, 120),
+    "ambient":     (0.04, 0.30, 0.20, 0.20, 0.80, 0.80, 95),
+    "punk":        (0.04, 0.45, 0.90, 0.55, 0.03, 0.02, 160),
+    "reggae":      (0.04, 0.75, 0.55, 0.75, 0.20, 0.05, 95),
+    "blues":       (0.04, 0.55, 0.50, 0.55, 0.45, 0.10, 110),
+    "sad":         (0.04, 0.50, 0.35, 0.20, 0.55, 0.05, 105),
+}
+
+# Prototipi dei mood su (valence, energy, danceability, acousticness), usati per
+# assegnare il mood nei file `clean_tracks.csv` generati
+MOOD_PROTOTYPES = {
+    "felice":     (0.75, 0.70, 0.70, 0.20),
+    "triste":     (0.25, 0.30, 0.45, 0.70),
+    "aggressivo": (0.35, 0.90, 0.45, 0.05),
+    "energetico": (0.55, 0.80, 0.65, 0.10),
+    "altro":      (0.45, 0.50, 0.55, 0.40),
+}
+
+# Quota di tracce che ripetono il titolo di una traccia precedente
+DUPLICATE_RATE = 0.08
+
+def beta_with_mean(rng, mean, concentration, size):
+    """
+    Estrae valori da una Beta con media e concentrazione date.
+
+    Args:
+        rng (np.random.Generator): Generatore casuale.
+        mean (np.ndarray): Media desiderata per ciascun valore (in (0, 1)).
+        concentration (float): Somma dei parametri (più alta = meno dispersione).
+        size (int): Numero di valori.
+
+    Returns:
+        np.ndarray: Valori in (0, 1).
+    """
+    mean = np.clip(mean, 0.02, 0.98)
+    return rng.beta(mean * concentration, (1 - mean) * concentration, size)
+
+def assign_mood(chunk):
+    """
+    Assegna a ciascuna traccia il mood del prototipo più vicino.
+
+    Args:
+        chunk (pd.DataFrame): Tracce con valence, energy, danceability e acousticness.
+
+    Returns:
+        np.ndarray: Etichette di mood.
+    """
+    features = chunk[["valence", "energy", "danceability", "acousticness"]].to_numpy()
+    names = list(MOOD_PROTOTYPES)
+    prototypes = np.array([MOOD_PROTOTYPES[name] for name in names])
+    distances = ((features[:, None, :] - prototypes[None, :, :]) ** 2).sum(axis=2)
+    return np.array(names)[distances.argmin(axis=1)]
+
+def generate_chunk(rng, start, n, n_artists, artist_weights):
+    """
+    Genera un blocco di tracce sintetiche.
+
+    Args:
+        rng (np.random.Generator): Generatore casuale.
+        start (int): Indice della prima traccia del blocco (per identificativi univoci).
+        n (int): Numero di tracce del blocco.
+        n_artists (int): Numero di artisti del catalogo.
+        artist_weights (np.ndarray): Probabilità di ciascun artista (legge di Zipf).
+
+    Returns:
+        pd.DataFrame: Blocco con le colonne di `DATASET_COLUMNS`.
+    """
+    genres = list(GENRE_PROFILES)
+    profiles = np.array([GENRE_PROFILES[g] for g in genres])
+    weights = profiles[:, 0] / profiles[:, 0].sum()
+    genre_idx = rng.choice(len(genres), n, p=weights)
+    profile = profiles[genre_idx]
+
+    ids = np.arange(start, start + n)
+    artist_idx = rng.choice(n_artists, n, p=artist_weights)
+
+    # Titoli: una quota ripete il titolo di una traccia precedente
+    title_idx = ids.copy()
+    repeated = rng.random(n) < DUPLICATE_RATE
+    title_idx[repeated] = rng.integers(0, np.maximum(ids[repeated], 1))
+
+    energy = beta_with_mean(rng, profile[:, 2], 8, n)
+    acousticness = beta_with_mean(rng, 0.7 * profile[:, 4] + 0.3 * (1 - energy), 3, n)
+    instrumental = rng.random(n) < profile[:, 5]
+    instrumentalness = np.where(
+        instrumental, rng.beta(5, 1.5, n), rng.exponential(0.01, n).clip(0, 1)
+    )
+    speech_boost = np.where(np.array(genres)[genre_idx] == "hip-hop", 0.12, 0.0)
+    speechiness = (rng.lognormal(-3.0, 0.6, n) + speech_boost).clip(0.02, 0.97)
+
+    return pd.DataFrame({
+        "track_id": [f"syn{i:09d}" for i in ids],
+        "artists": [f"Artist {a}" for a in artist_idx],
+        "album_name": [f"Album {a}-{i % 7}" for a, i in zip(artist_idx, ids)],
+        "track_name": [f"Song {t}" for t in title_idx],
+        "popularity": (rng.gamma(2.0, 15.0, n)).clip(0, 100).astype(int),
+        "duration_ms": rng.lognormal(np.log(210_000), 0.3, n).astype(int),
+        "explicit": rng.random(n) < 0.09,
+        "danceability": beta_with_mean(rng, profile[:, 1], 10, n),
+        "energy": energy,
+        "key": rng.integers(0, 12, n),
+        "loudness": (-22 + 18 * energy + rng.normal(0, 2.5, n)).clip(-50, 1),
+        "mode": (rng.random(n) < 0.64).astype(int),
+        "speechiness": speechiness,
+        "acousticness": acousticness,
+        "instrumentalness": instrumentalness,
+        "liveness": (rng.beta(2, 9, n) + (rng.random(n) < 0.07) * 0.5).clip(0, 1),
+        "valence": beta_with_mean(rng, profile[:, 3], 5, n),
+        "tempo": rng.normal(profile[:, 6], 22, n).clip(40, 240),
+        "time_signature": rng.choice([4, 3, 5, 1], n, p=[0.89, 0.08, 0.02, 0.01]),
+        "track_genre": np.array(genres)[genre_idx],
+    })[DATASET_COLUMNS]
+
+def generate_dataset(n_tracks, output=OUTPUT_PATH, clean_output=None, seed=42,
+                     chunk_size=CHUNK_SIZE):
+    """
+    Genera un catalogo sintetico e lo scrive a blocchi su CSV.
+
+    Args:
+        n_tracks (int): Numero di tracce.
+        output (str | None): Percorso di `dataset.csv` (None = non scritto).
+        clean_output (str | None): Percorso di `clean_tracks.csv` con il mood assegnato
+            (None = non scritto).
+        seed (int): Seme del generatore casuale (stesso seme, stesso catalogo).
+        chunk_size (int): Numero di tracce per blocco.
+
+    Returns:
+        int: Numero di tracce generate.
+    """
+    rng = np.random.default_rng(seed)
+    n_artists = max(1, n_tracks // 8)
+    ranks = np.arange(1, n_artists + 1)
+    artist_weights = 1.0 / ranks ** 0.9
+    artist_weights /= artist_weights.sum()
+
+    targets = [path for path in (output, clean_output) if path]
+    for path in targets:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    for start in range(0, n_tracks, chunk_size):
+        chunk = generate_chunk(rng, start, min(chunk_size, n_tracks - start),
+                               n_artists, artist_weights)
+        first = start == 0
+        if output:
+            chunk.to_csv(output, mode="w" if first else "a", header=first, index=False)
+        if clean_output:
+            chunk["mood"] = assign_mood(chunk)
+            chunk[CLEAN_COLUMNS].to_csv(clean_output, mode="w" if first else "a",
+                                        header=first, index=False, float_format="%.6g")
+
+    for path in targets:
+        print(f"Catalogo sintetico ({n_tracks} tracce) salvato in '{path}'")
+    return n_tracks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generatore di cataloghi musicali sintetici")
+    parser.add_argument("--tracks", type=int, default=100_000, help="numero di tracce")
+    parser.add_argument("--output", default=OUTPUT_PATH,
+                        help=f"percorso di dataset.csv (default: {OUTPUT_PATH})")
+    parser.add_argument("--clean-output", default=None,
+                        help="percorso di clean_tracks.csv con mood assegnato (opzionale)")
+    parser.add_argument("--seed", type=int, default=42, help="seme del generatore")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="tracce per blocco")
+    args = parser.parse_args()
+    generate_dataset(args.tracks, args.output, args.clean_output, args.seed, args.chunk_size)
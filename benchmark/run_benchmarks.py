@@ -0,0 +1,339 @@
+"""
+Suite di benchmark end-to-end del sistema su cataloghi sintetici di dimensione crescente.
+
+Per ciascuna scala viene creata una cartella di lavoro temporanea con la struttura del
+progetto (`dataset/data`, `classificator`, `prolog`, `sparql`), vi viene generato un
+`dataset.csv` sintetico (`generate_dataset.py`) e vengono eseguiti, ciascuno in un processo
+figlio con la cartella di lavoro come directory corrente:
+- generate, deduplication, preprocessing, clustering, training, kb_prolog, ontology
+  (gli script del progetto),
+- query_offline, query_prolog, query_sparql (raccomandazioni e interrogazioni ripetute).
+
+Per ogni stadio vengono misurati tempo totale, memoria massima del processo (RSS, tramite
+`os.wait4`) e throughput (tracce o query al secondo). I risultati vengono aggiunti a un CSV
+storico (`benchmark/outputs/benchmark_results.csv`) con identificativo dell'esecuzione e
+commit git, e confrontati con l'esecuzione precedente per segnalare regressioni.
+
+Esempio:
+    python benchmark/run_benchmarks.py --sizes 10000 100000 --stages preprocessing clustering
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from main import project_env
+
+# Report storico dei risultati
+OUTPUT_CSV = "benchmark/outputs/benchmark_results.csv"
+
+# Soglia di peggioramento (relativa) oltre la quale uno stadio è segnalato come regressione
+REGRESSION_THRESHOLD = 0.2
+
+# Stadi della suite: (nome, comando relativo alla radice del progetto, unità del throughput)
+STAGES = [
+    ("generate", ["benchmark/generate_dataset.py", "--output", "dataset/data/dataset.csv"],
+     "tracce/s"),
+    ("deduplication", ["clustering/deduplication.py"], "tracce/s"),
+    ("preprocessing", ["clustering/preprocessing.py"], "tracce/s"),
+    ("clustering", ["clustering/kmeans_clustering.py"], "tracce/s"),
+    ("training", ["classificator/supervised_runner.py"], "tracce/s"),
+    ("kb_prolog", ["prolog/regenerate_kb_prolog.py"], "tracce/s"),
+    ("ontology", ["sparql/regenerate_ontology.py"], "tracce/s"),
+    ("query_offline", ["benchmark/run_benchmarks.py", "--query", "offline"], "query/s"),
+    ("query_prolog", ["benchmark/run_benchmarks.py", "--query", "prolog"], "query/s"),
+    ("query_sparql", ["benchmark/run_benchmarks.py", "--query", "sparql"], "query/s"),
+]
+STAGE_NAMES = [name for name, _, _ in STAGES]
+
+# Numero di query eseguite dagli stadi di interrogazione
+N_QUERIES = 100
+
+# Cartelle della struttura del progetto create nella cartella di lavoro
+WORKDIR_LAYOUT = ["dataset/data", "classificator", "prolog", "sparql"]
+
+def git_commit():
+    """Restituisce l'hash abbreviato del commit corrente (None se non disponibile)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_workdir(workdir):
+    """
+    Crea nella cartella di lavoro la struttura attesa dagli script del progetto.
+
+    Args:
+        workdir (str): Cartella di lavoro.
+    """
+    for folder in WORKDIR_LAYOUT:
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+    shutil.copy(os.path.join(ROOT_DIR, "prolog/rules.pl"), os.path.join(workdir, "prolog"))
+
+def run_child(args, workdir, env=None):
+    """
+    Esegue uno script Python in un processo figlio e ne misura tempo e memoria.
+
+    Args:
+        args (list[str]): Script (relativo alla radice del progetto) e argomenti.
+        workdir (str): Directory corrente del processo figlio.
+        env (dict | None): Variabili d'ambiente aggiuntive.
+
+    Returns:
+        tuple[int, float, int | None, str]: Codice di uscita, tempo totale (s),
+        RSS massimo in KB (None se non misurabile) e output del processo.
+    """
+    command = [sys.executable, os.path.join(ROOT_DIR, args[0]), *args[1:]]
+    with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as out:
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, cwd=workdir, stdout=out, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, env={**project_env(), **(env or {})})
+        max_rss = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            max_rss = usage.ru_maxrss
+        else:
+            proc.wait()
+        elapsed = time.perf_counter() - start
+        out.seek(0)
+        output = out.read()
+    return proc.returncode, elapsed, max_rss, output
+
+def parse_result(output):
+    """
+    Estrae il risultato JSON stampato da uno stadio di interrogazione (`RESULT {...}`).
+
+    Args:
+        output (str): Output del processo figlio.
+
+    Returns:
+        dict | None: Risultato dello stadio, o None se assente.
+    """
+    for line in reversed(output.splitlines()):
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    return None
+
+def run_scale(n_tracks, stages, n_queries, seed, keep=False):
+    """
+    Esegue gli stadi richiesti su un catalogo sintetico di `n_tracks` tracce.
+
+    Uno stadio fallito viene registrato con lo stato `error`; gli stadi di interrogazione
+    possono risultare `skipped` se una dipendenza opzionale (es. `pyswip`) non è installata.
+
+    Args:
+        n_tracks (int): Numero di tracce del catalogo sintetico.
+        stages (list[str]): Stadi da eseguire, nell'ordine di `STAGES`.
+        n_queries (int): Numero di query degli stadi di interrogazione.
+        seed (int): Seme del generatore del catalogo e delle query.
+        keep (bool): Se True, la cartella di lavoro non viene eliminata.
+
+    Returns:
+        list[dict]: Una riga di risultati per stadio.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"bench_{n_tracks}_")
+    prepare_workdir(workdir)
+    rows = []
+    try:
+        for name, args, unit in STAGES:
+            if name not in stages:
+                continue
+            if name == "generate":
+                args = [*args, "--tracks", str(n_tracks), "--seed", str(seed)]
+            elif name.startswith("query_"):
+                args = [*args, "--n-queries", str(n_queries), "--seed", str(seed)]
+            print(f"[{n_tracks} tracce] {name}...", flush=True)
+
+            returncode, elapsed, max_rss, output = run_child(args, workdir)
+            result = parse_result(output) or {}
+            status = result.get("status", "ok" if returncode == 0 else "error")
+            items = result.get("items", None if name.startswith("query_") else n_tracks)
+            work_s = result.get("seconds", elapsed)
+            if status == "error":
+                print(output[-2000:])
+            rows.append({
+                "n_tracks": n_tracks, "stage": name, "status": status,
+                "wall_s": round(elapsed, 4), "max_rss_kb": max_rss, "items": items,
+                "throughput": round(items / work_s, 2) if status == "ok" and work_s else None,
+                "unit": unit,
+            })
+    finally:
+        if keep:
+            print(f"Cartella di lavoro conservata: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+def compare_with_previous(report, history):
+    """
+    Confronta i tempi dell'esecuzione corrente con quelli dell'esecuzione precedente.
+
+    Args:
+        report (pd.DataFrame): Risultati dell'esecuzione corrente.
+        history (pd.DataFrame | None): Risultati storici (esecuzioni precedenti).
+
+    Returns:
+        pd.DataFrame: Per stadio e scala, tempo precedente, tempo corrente, variazione
+        relativa e flag di regressione (vuoto se non esistono esecuzioni precedenti).
+    """
+    if history is None or history.empty:
+        return pd.DataFrame()
+    previous_run = history["run_id"].iloc[-1]
+    previous = history[(history["run_id"] == previous_run) & (history["status"] == "ok")]
+    merged = report[report["status"] == "ok"].merge(
+        previous[["n_tracks", "stage", "wall_s"]], on=["n_tracks", "stage"],
+        suffixes=("", "_prev"),
+    )
+    merged["delta"] = (merged["wall_s"] - merged["wall_s_prev"]) / merged["wall_s_prev"]
+    merged["regression"] = merged["delta"] > REGRESSION_THRESHOLD
+    return merged[["n_tracks", "stage", "wall_s_prev", "wall_s", "delta", "regression"]]
+
+def run_benchmarks(sizes, stages=None, n_queries=N_QUERIES, seed=42, output=OUTPUT_CSV,
+                   keep=False):
+    """
+    Esegue la suite per ciascuna scala, aggiorna il report storico e segnala le regressioni.
+
+    Args:
+        sizes (list[int]): Numero di tracce dei cataloghi sintetici.
+        stages (list[str] | None): Stadi da eseguire (default: tutti). Gli stadi richiedono
+            gli output dei precedenti (es. `training` richiede `clustering`).
+        n_queries (int): Numero di query degli stadi di interrogazione.
+        seed (int): Seme del generatore.
+        output (str): Percorso del report CSV storico.
+        keep (bool): Se True, conserva le cartelle di lavoro.
+
+    Returns:
+        pd.DataFrame: Risultati dell'esecuzione corrente.
+    """
+    stages = stages or STAGE_NAMES
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = git_commit()
+
+    rows = []
+    for n in sizes:
+        rows += run_scale(n, stages, n_queries, seed, keep)
+    report = pd.DataFrame(rows)
+    report.insert(0, "run_id", run_id)
+    report.insert(1, "commit", commit)
+
+    output = os.path.join(ROOT_DIR, output)
+    history = pd.read_csv(output) if os.path.exists(output) else None
+    comparison = compare_with_previous(report, history)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    report.to_csv(output, mode="a", header=history is None, index=False)
+
+    print("\n=== Risultati ===")
+    print(report.drop(columns=["run_id", "commit"]).to_string(index=False))
+    if not comparison.empty:
+        print("\n=== Confronto con l'esecuzione precedente ===")
+        print(comparison.to_string(index=False))
+        regressions = comparison[comparison["regression"]]
+        if not regressions.empty:
+            print(f"\nAttenzione: {len(regressions)} stadi più lenti di oltre "
+                  f"{REGRESSION_THRESHOLD:.0%} rispetto all'esecuzione precedente.")
+    print(f"\nReport aggiornato in: {output}")
+    return report
+
+# --- Stadi di interrogazione (eseguiti nel processo figlio) ---
+
+def query_offline(n_queries, rng):
+    """Raccomandazioni per similarità con `offline_recommender.raccomanda_simili`."""
+    sys.path.insert(0, os.path.join(ROOT_DIR, "recommender"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import offline_recommender as rec
+    positions = [rng.randrange(len(rec.catalogo)) for _ in range(n_queries)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for pos in positions:
+            rec.raccomanda_simili(rec.catalogo.traccia(pos))
+    return time.perf_counter() - start
+
+def query_prolog(n_queries, rng):
+    """Raccomandazioni simboliche per mood e per soglia con `prolog_recommender`."""
+    sys.path.insert(0, os.path.join(ROOT_DIR, "recommender"))
+    import prolog_recommender as rec
+    moods = ["felice", "triste", "energetico", "aggressivo", "altro"]
+    queries = [
+        lambda seed: rec.recommend_by_mood(rng.choice(moods), seed=seed),
+        lambda seed: rec.relaxing_tracks(seed=seed),
+        lambda seed: rec.danceable_tracks(seed=seed),
+    ]
+    start = time.perf_counter()
+    for i in range(n_queries):
+        queries[i % len(queries)](rng.randrange(1 << 30))
+    return time.perf_counter() - start
+
+def query_sparql(n_queries, rng):
+    """Ricerche per mood e intervalli numerici con `ontology_module.cerca_tracce`."""
+    sys.path.insert(0, os.path.join(ROOT_DIR, "sparql"))
+    from ontology_module import cerca_tracce, load_ontology
+    from range_index import load_range_index
+    graph = load_ontology()
+    index = load_range_index()
+    moods = ["felice", "triste", "energetico", "aggressivo", "altro"]
+    start = time.perf_counter()
+    for _ in range(n_queries):
+        low = rng.uniform(0.0, 0.8)
+        cerca_tracce(graph, mood=rng.choice(moods), energy=(low, low + 0.2),
+                     limit=10, index=index)
+    return time.perf_counter() - start
+
+QUERY_STAGES = {"offline": query_offline, "prolog": query_prolog, "sparql": query_sparql}
+
+def run_query_stage(kind, n_queries, seed):
+    """
+    Esegue uno stadio di interrogazione e stampa il risultato come riga `RESULT {...}`.
+
+    Il tempo misurato esclude il caricamento delle risorse (modello, KB, grafo), già
+    compreso nel tempo totale del processo.
+
+    Args:
+        kind (str): Tipo di interrogazione (chiave di `QUERY_STAGES`).
+        n_queries (int): Numero di query.
+        seed (int): Seme per la scelta delle query.
+    """
+    try:
+        seconds = QUERY_STAGES[kind](n_queries, random.Random(seed))
+    except ImportError as e:
+        print(f"RESULT {json.dumps({'status': 'skipped', 'reason': str(e)})}")
+        return
+    print(f"RESULT {json.dumps({'status': 'ok', 'items': n_queries, 'seconds': seconds})}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end su cataloghi sintetici")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="dimensioni dei cataloghi sintetici (numero di tracce)")
+    parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, default=None,
+                        help="stadi da eseguire (default: tutti)")
+    parser.add_argument("--n-queries", type=int, default=N_QUERIES,
+                        help="query per gli stadi di interrogazione")
+    parser.add_argument("--seed", type=int, default=42, help="seme del generatore")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="report CSV storico")
+    parser.add_argument("--keep", action="store_true",
+                        help="conserva le cartelle di lavoro")
+    parser.add_argument("--query", choices=sorted(QUERY_STAGES), default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.query:
+        run_query_stage(args.query, args.n_queries, args.seed)
+    else:
+        run_benchmarks(args.sizes, args.stages, args.n_queries, args.seed, args.output,
+                       args.keep)
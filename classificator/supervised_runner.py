@@ -25,16 +25,22 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.ensemble import AdaBoostClassifier
+try:
+    from instrumentation import span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
 
 # Flag per il numero di tracce da utilizzare per i test
 N = 50000
 
-# Eliminazione warning
-warnings.filterwarnings("ignore", category=UndefinedMetricWarning)
-
-# Caricamento dati
-df = pd.read_csv("dataset/data/clean_tracks.csv")
-df = df.sample(N, random_state=42)
+# Percorsi
+INPUT_PATH = "dataset/data/clean_tracks.csv"
+MODEL_PATH = "classificator/mood_classifier.pkl"
 
 # Features e target
 features = [
@@ -42,19 +48,11 @@ features = [
     "instrumentalness", "speechiness", "artists", "duration_ms", "track_genre"
 ]
 
-# Codifica delle colonne categoriche
-df["artists"] = LabelEncoder().fit_transform(df["artists"].astype(str))
-df["track_genre"] = LabelEncoder().fit_transform(df["track_genre"].astype(str))
-
-X = df[features]
-y = df["mood"]
-
-# Codifica target
-le = LabelEncoder()
-y_encoded = le.fit_transform(y)
+# Eliminazione warning
+warnings.filterwarnings("ignore", category=UndefinedMetricWarning)
 
 # Funzione di valutazione
-def evaluate_model(name, model):
+def evaluate_model(name, model, X, y_encoded):
     """
     Valuta un modello di classificazione supervisionata usando 
     cross-validation stratificata a 5 fold.
@@ -65,6 +63,8 @@ def evaluate_model(name, model):
     Args:
         name (str): Nome descrittivo del modello (usato nella stampa a video).
         model (sklearn.base.BaseEstimator): Istanza del modello da addestrare e valutare.
+        X (pd.DataFrame): Feature codificate.
+        y_encoded (np.ndarray): Target codificato.
 
     Returns:
         None: I risultati vengono stampati a video 
@@ -77,8 +77,10 @@ def evaluate_model(name, model):
         x_train, x_test = X.iloc[train_idx], X.iloc[test_idx]
         y_train, y_test = y_encoded[train_idx], y_encoded[test_idx]
 
-        model.fit(x_train, y_train)
-        y_pred = model.predict(x_test)
+        with span("training.fit_fold", modello=name):
+            model.fit(x_train, y_train)
+        with span("training.predict_fold", modello=name):
+            y_pred = model.predict(x_test)
 
         acc_scores.append(accuracy_score(y_test, y_pred))
         prec_scores.append(precision_score(y_test, y_pred, average='macro', zero_division=0))
@@ -92,16 +94,52 @@ def evaluate_model(name, model):
     print(f"F1-score : {np.mean(f1_scores):.3f} ± {np.std(f1_scores):.3f}")
     print()
 
-# Valutazione dei modelli
-evaluate_model("Random Forest", RandomForestClassifier())
-evaluate_model("Decision Tree", DecisionTreeClassifier())
-evaluate_model("Naive Bayes", GaussianNB())
-evaluate_model("K-Nearest Neighbors", KNeighborsClassifier())
-evaluate_model("AdaBoost", AdaBoostClassifier())
+def train_classifier(df=None):
+    """
+    Valuta i modelli candidati e salva il RandomForest finale in `MODEL_PATH`.
 
-# Addestramento e salvataggio del RandomForest
-model_final = RandomForestClassifier()
-model_final.fit(X, y_encoded)
+    Args:
+        df (pd.DataFrame | None): Tracce clusterizzate già caricate in memoria; se None
+            vengono lette da `INPUT_PATH`. Il DataFrame non viene modificato.
 
-with open("classificator/mood_classifier.pkl", "wb") as f:
-    pickle.dump((model_final, le), f)
+    Returns:
+        tuple: (modello addestrato, LabelEncoder del mood).
+    """
+    # Caricamento dati
+    if df is None:
+        with span("training.carica_csv"):
+            df = pd.read_csv(INPUT_PATH)
+    df = df.sample(min(N, len(df)), random_state=42)
+
+    # Codifica delle colonne categoriche
+    with span("training.fit_encoder"):
+        df["artists"] = LabelEncoder().fit_transform(df["artists"].astype(str))
+        df["track_genre"] = LabelEncoder().fit_transform(df["track_genre"].astype(str))
+
+    X = df[features]
+    y = df["mood"]
+
+    # Codifica target
+    le = LabelEncoder()
+    y_encoded = le.fit_transform(y)
+
+    # Valutazione dei modelli
+    evaluate_model("Random Forest", RandomForestClassifier(), X, y_encoded)
+    evaluate_model("Decision Tree", DecisionTreeClassifier(), X, y_encoded)
+    evaluate_model("Naive Bayes", GaussianNB(), X, y_encoded)
+    evaluate_model("K-Nearest Neighbors", KNeighborsClassifier(), X, y_encoded)
+    evaluate_model("AdaBoost", AdaBoostClassifier(), X, y_encoded)
+
+    # Addestramento e salvataggio del RandomForest
+    model_final = RandomForestClassifier()
+    with span("training.fit_finale"):
+        model_final.fit(X, y_encoded)
+
+    with span("training.salva_modello"):
+        with open(MODEL_PATH, "wb") as f:
+            pickle.dump((model_final, le), f)
+
+    return model_final, le
+
+if __name__ == "__main__":
+    train_classifier()
@@ -0,0 +1,251 @@
+"""
+Modulo per la deduplicazione delle tracce del dataset musicale.
+
+La rimozione dei duplicati per `track_name` elimina brani diversi con lo stesso titolo e
+conserva i duplicati reali con titoli leggermente diversi (es. "Song - Remastered 2011").
+Qui due righe sono considerate la stessa traccia se:
+- hanno lo stesso `track_id`, oppure
+- hanno titolo normalizzato e primo artista uguali e feature audio quasi identiche.
+
+Il confronto tra feature usa il locality-sensitive hashing (proiezioni casuali quantizzate,
+più tabelle indipendenti): le righe vengono raggruppate per (titolo, artista, bucket) e
+confrontate a coppie all'interno del proprio gruppo. I gruppi sono piccoli (stesso titolo,
+stesso artista e feature vicine), quindi il costo resta quasi lineare nel numero di tracce;
+nei gruppi con più di `PAIR_WINDOW` righe ciascuna riga viene confrontata solo con le
+`PAIR_WINDOW` successive. Le coppie confermate vengono unite nelle componenti
+connesse di un grafo sparso; per ciascuna componente la traccia canonica è la prima
+occorrenza nel dataset.
+
+Il risultato è una mappatura `track_id → canonical_id` salvata in CSV, che gli stadi
+successivi applicano con `applica_deduplicazione`.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+try:
+    from instrumentation import incrementa, span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+    def incrementa(name, value=1):
+        pass
+
+# Percorsi dei file
+INPUT_PATH = "dataset/data/dataset.csv"
+MAPPING_PATH = "dataset/data/canonical_tracks.csv"
+
+# Feature audio confrontate (standardizzate) per riconoscere i duplicati
+AUDIO_FEATURES = [
+    'danceability', 'energy', 'valence',
+    'tempo', 'acousticness', 'instrumentalness',
+    'loudness', 'speechiness', 'liveness'
+]
+
+# Distanza euclidea massima (sulle feature standardizzate) tra due duplicati
+DUPLICATE_THRESHOLD = 0.3
+
+# Parametri LSH: tabelle, proiezioni per tabella e larghezza dei bucket
+LSH_TABLES = 4
+LSH_PROJECTIONS = 4
+LSH_WIDTH = 1.0
+
+# Righe successive con cui viene confrontata ciascuna riga di un gruppo LSH
+PAIR_WINDOW = 32
+
+# Suffissi e parti del titolo ignorati dalla normalizzazione
+TITLE_NOISE = (
+    r"\s*[\(\[][^\)\]]*[\)\]]"                                 # (Remastered 2011), [Live]
+    r"|\s+-\s+.*(?:remaster|version|mix|edit|live|mono|stereo).*$"  # - Remastered 2011
+    r"|\s+(?:feat|ft)\.?\s.*$"                                 # feat. Artista
+)
+
+def normalizza_titolo(titoli: pd.Series) -> pd.Series:
+    """
+    Normalizza i titoli per il confronto: minuscole, senza accenti, senza suffissi di
+    versione (remaster, live, feat. ...) né punteggiatura.
+
+    Args:
+        titoli (pd.Series): Titoli originali.
+
+    Returns:
+        pd.Series: Titoli normalizzati.
+    """
+    return (titoli.astype(str)
+            .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+            .str.lower()
+            .str.replace(TITLE_NOISE, "", regex=True)
+            .str.replace(r"[^a-z0-9]+", " ", regex=True)
+            .str.strip())
+
+def _chiavi_lsh(x_scaled, seed=42):
+    """
+    Calcola le chiavi LSH (proiezioni casuali quantizzate) per ciascuna tabella.
+
+    Args:
+        x_scaled (np.ndarray): Feature standardizzate, una riga per traccia.
+        seed (int): Seme delle proiezioni casuali.
+
+    Returns:
+        list[np.ndarray]: Per ogni tabella, una matrice (tracce × proiezioni) di interi.
+    """
+    rng = np.random.default_rng(seed)
+    keys = []
+    for _ in range(LSH_TABLES):
+        directions = rng.normal(size=(x_scaled.shape[1], LSH_PROJECTIONS))
+        directions /= np.linalg.norm(directions, axis=0)
+        offsets = rng.uniform(0, LSH_WIDTH, LSH_PROJECTIONS)
+        keys.append(np.floor((x_scaled @ directions + offsets) / LSH_WIDTH).astype(np.int64))
+    return keys
+
+def _coppie_gruppo(group_ids, x_scaled):
+    """
+    Confronta a coppie le righe di ciascun gruppo.
+
+    Le righe vengono ordinate per gruppo (a parità, in ordine di dataset) e ciascuna viene
+    confrontata con le righe dello stesso gruppo a distanza 1, 2, ... nell'ordinamento,
+    fino a `PAIR_WINDOW`: un passo per distanza, vettoriale su tutti i gruppi.
+
+    Args:
+        group_ids (np.ndarray): Identificativo del gruppo di ciascuna riga.
+        x_scaled (np.ndarray): Feature standardizzate.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Coppie di righe confermate come duplicati.
+    """
+    order = np.argsort(group_ids, kind="stable")
+    sorted_ids = group_ids[order]
+    sources, targets = [], []
+    for lag in range(1, min(PAIR_WINDOW, len(order) - 1) + 1):
+        same = np.flatnonzero(sorted_ids[:-lag] == sorted_ids[lag:])
+        if len(same) == 0:
+            break
+        src, dst = order[same], order[same + lag]
+        dist = np.linalg.norm(x_scaled[src] - x_scaled[dst], axis=1)
+        confirmed = dist <= DUPLICATE_THRESHOLD
+        sources.append(src[confirmed])
+        targets.append(dst[confirmed])
+    if not sources:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(sources), np.concatenate(targets)
+
+def trova_duplicati(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Raggruppa le righe duplicate e sceglie la traccia canonica di ciascun gruppo.
+
+    Args:
+        df (pd.DataFrame): Dataset con `track_id`, `track_name`, `artists` e
+            `AUDIO_FEATURES`. Le righe con valori mancanti vengono ignorate.
+
+    Returns:
+        pd.DataFrame: Colonne `track_id` e `canonical_id`, una riga per `track_id`.
+    """
+    df = df.dropna(subset=AUDIO_FEATURES + ['track_id', 'track_name'])
+    n = len(df)
+    with span("deduplicazione.lsh"):
+        x = df[AUDIO_FEATURES].to_numpy(dtype=np.float64)
+        std = x.std(axis=0)
+        x_scaled = (x - x.mean(axis=0)) / np.where(std > 0, std, 1)
+
+        title = normalizza_titolo(df['track_name'])
+        artist = df['artists'].fillna("").astype(str).str.split(";").str[0].str.lower()
+        title_ids = pd.MultiIndex.from_arrays([title, artist]).factorize()[0]
+
+        sources = [np.arange(n)]
+        targets = [pd.Series(np.arange(n)).groupby(df['track_id'].to_numpy())
+                   .transform("first").to_numpy()]
+        for keys in _chiavi_lsh(x_scaled):
+            columns = [title_ids, *keys.T]
+            group_ids = pd.MultiIndex.from_arrays(columns).factorize()[0]
+            src, dst = _coppie_gruppo(group_ids, x_scaled)
+            sources.append(src)
+            targets.append(dst)
+
+    with span("deduplicazione.componenti"):
+        src, dst = np.concatenate(sources), np.concatenate(targets)
+        graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+        _, components = connected_components(graph, directed=False)
+        # La canonica è la prima riga (in ordine di dataset) della componente
+        canonical_row = pd.Series(np.arange(n)).groupby(components).transform("min").to_numpy()
+
+    track_ids = df['track_id'].to_numpy()
+    mapping = pd.DataFrame({"track_id": track_ids, "canonical_id": track_ids[canonical_row]})
+    mapping = mapping.drop_duplicates(subset='track_id', keep='first').reset_index(drop=True)
+    duplicates = int((mapping['track_id'] != mapping['canonical_id']).sum())
+    incrementa("deduplicazione.duplicati", duplicates)
+    return mapping
+
+def carica_mappatura(path: str = MAPPING_PATH) -> pd.DataFrame | None:
+    """
+    Carica la mappatura `track_id → canonical_id`, se presente.
+
+    Args:
+        path (str): Percorso del CSV della mappatura.
+
+    Returns:
+        pd.DataFrame | None: Mappatura, o None se il file non esiste.
+    """
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype=str)
+
+def applica_deduplicazione(df: pd.DataFrame, mapping: pd.DataFrame | None = None,
+                           path: str = MAPPING_PATH) -> pd.DataFrame:
+    """
+    Mantiene solo le tracce canoniche (una riga per `track_id`).
+
+    Se la mappatura non è fornita viene letta da `path`; se il file non esiste viene
+    calcolata al momento con `trova_duplicati`. I `track_id` assenti dalla mappatura
+    (es. tracce aggiunte dopo la deduplicazione) sono considerati canonici.
+
+    Args:
+        df (pd.DataFrame): Dataset con la colonna `track_id`. Non viene modificato.
+        mapping (pd.DataFrame | None): Mappatura `track_id → canonical_id`.
+        path (str): Percorso della mappatura salvata.
+
+    Returns:
+        pd.DataFrame: Righe canoniche, nell'ordine originale.
+    """
+    if mapping is None:
+        mapping = carica_mappatura(path)
+    if mapping is None:
+        mapping = trova_duplicati(df)
+    canonical = df['track_id'].map(mapping.set_index('track_id')['canonical_id'])
+    keep = canonical.isna() | (canonical == df['track_id'])
+    return df[keep].drop_duplicates(subset='track_id', keep='first')
+
+def run_deduplication(df: pd.DataFrame | None = None, output: str = MAPPING_PATH) -> pd.DataFrame:
+    """
+    Calcola la mappatura delle tracce canoniche e la salva su file.
+
+    Args:
+        df (pd.DataFrame | None): Dataset già caricato in memoria; se None viene letto
+            da `INPUT_PATH`. Il DataFrame non viene modificato.
+        output (str): Percorso del CSV della mappatura.
+
+    Returns:
+        pd.DataFrame: Mappatura `track_id → canonical_id`.
+    """
+    if df is None:
+        with span("deduplicazione.carica_csv"):
+            df = pd.read_csv(INPUT_PATH)
+
+    mapping = trova_duplicati(df)
+    with span("deduplicazione.salva_csv"):
+        mapping.to_csv(output, index=False)
+
+    n_canonical = int((mapping['track_id'] == mapping['canonical_id']).sum())
+    print(f"Mappatura salvata in: {output}")
+    print(f"Righe: {len(df)}, track_id distinti: {len(mapping)}, tracce canoniche: {n_canonical}")
+    return mapping
+
+# Test manuale
+if __name__ == "__main__":
+    run_deduplication()
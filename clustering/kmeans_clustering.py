@@ -14,6 +14,16 @@ Output:
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
+from deduplication import applica_deduplicazione
+try:
+    from instrumentation import span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
 
 # Percorsi
 INPUT_PATH = "dataset/data/dataset.csv"
@@ -45,7 +55,7 @@ MOOD_MAP = {
     4: "triste"
 }
 
-def run_kmeans_clustering(n_clusters=5):
+def run_kmeans_clustering(n_clusters=5, df=None):
     """
     Applica il clustering KMeans su un dataset musicale e assegna un mood a ciascuna traccia.
 
@@ -55,23 +65,29 @@ def run_kmeans_clustering(n_clusters=5):
 
     Args:
         n_clusters (int): Numero di cluster da utilizzare (default: 5).
+        df (pd.DataFrame | None): Dataset completo già caricato in memoria; se None
+            viene letto da `INPUT_PATH`. Il DataFrame non viene modificato.
 
     Returns:
-        None
+        pd.DataFrame: Tracce con mood assegnato, come salvate in `OUTPUT_PATH`.
     """
     # Carica dataset completo
-    df = pd.read_csv(INPUT_PATH)
+    if df is None:
+        with span("clustering.carica_csv"):
+            df = pd.read_csv(INPUT_PATH)
 
-    # Rimuove righe con valori mancanti per le colonne richieste
-    df = df.dropna(subset=AUDIO_FEATURES + ['track_name']).drop_duplicates(subset='track_name')
+    # Rimuove righe con valori mancanti e duplicati (mantiene le tracce canoniche)
+    df = applica_deduplicazione(df.dropna(subset=AUDIO_FEATURES + ['track_name']))
 
     # Normalizza solo le colonne audio per clustering
-    scaler = StandardScaler()
-    x_scaled = scaler.fit_transform(df[AUDIO_FEATURES])
+    with span("clustering.normalizzazione"):
+        scaler = StandardScaler()
+        x_scaled = scaler.fit_transform(df[AUDIO_FEATURES])
 
     # KMeans clustering
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    df['cluster'] = kmeans.fit_predict(x_scaled)
+    with span("clustering.kmeans"):
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+        df['cluster'] = kmeans.fit_predict(x_scaled)
 
     # Assegna mood
     df['mood'] = df['cluster'].map(MOOD_MAP)
@@ -80,7 +96,8 @@ def run_kmeans_clustering(n_clusters=5):
     df_clean = df[OUTPUT_COLUMNS]
 
     # Salva CSV coerente
-    df_clean.to_csv(OUTPUT_PATH, index=False, float_format='%.6g')
+    with span("clustering.salva_csv"):
+        df_clean.to_csv(OUTPUT_PATH, index=False, float_format='%.6g')
     print(f"File salvato come: {OUTPUT_PATH}")
 
     # Distribuzione dei mood
@@ -93,5 +110,7 @@ def run_kmeans_clustering(n_clusters=5):
     means = df.groupby('cluster')[AUDIO_FEATURES].mean()
     print(means.round(3))
 
+    return df_clean
+
 if __name__ == "__main__":
     run_kmeans_clustering()
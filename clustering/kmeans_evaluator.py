@@ -17,6 +17,7 @@ import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+from deduplication import applica_deduplicazione
 
 # Percorsi
 INPUT_PATH = "dataset/data/dataset.csv"
@@ -52,7 +53,7 @@ def evaluate_kmeans_range(k_range=range(2, 11), sample_size=30000):
         'speechiness', 'tempo'
     ]
 
-    df = df[columns_to_use].dropna().drop_duplicates(subset='track_name')
+    df = applica_deduplicazione(df.dropna(subset=columns_to_use))[columns_to_use]
 
     # Campionamento
     if sample_size < len(df):
@@ -3,33 +3,48 @@ Modulo per il preprocessing di un dataset musicale.
 
 Effettua:
 - selezione e pulizia delle colonne numeriche rilevanti,
-- rimozione di duplicati sulla base del nome della traccia,
+- rimozione dei duplicati con la mappatura delle tracce canoniche (`deduplication.py`),
 - normalizzazione delle feature numeriche con StandardScaler,
 - salvataggio del dataset normalizzato su file.
 """
 
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
+from deduplication import applica_deduplicazione
+try:
+    from instrumentation import span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
 
 def preprocess_dataset(path_csv: str = "dataset/data/dataset.csv",
-                       save_to: str = "dataset/data/normalized_dataset.csv") -> pd.DataFrame:
+                       save_to: str = "dataset/data/normalized_dataset.csv",
+                       df: pd.DataFrame | None = None) -> pd.DataFrame:
     """
     Preprocessa un dataset musicale: seleziona colonne rilevanti, normalizza le feature
     numeriche e salva il risultato su file.
 
-    Il dataset risultante conterrà solo tracce non duplicate (per nome) e con valori validi
+    Il dataset risultante conterrà solo tracce canoniche (vedi `deduplication.py`) e con valori validi
     nelle colonne specificate. Le feature numeriche vengono scalate tramite StandardScaler.
 
     Args:
         path_csv (str): Percorso al file CSV di input.
         save_to (str): Percorso dove salvare il file CSV normalizzato.
+        df (pd.DataFrame | None): Dataset già caricato in memoria; se fornito,
+            `path_csv` viene ignorato. Il DataFrame non viene modificato.
 
     Returns:
         pd.DataFrame: DataFrame contenente i dati normalizzati.
     """
 
     # Caricamento dati
-    df = pd.read_csv(path_csv)
+    if df is None:
+        with span("preprocessing.carica_csv"):
+            df = pd.read_csv(path_csv)
 
     # Colonne da mantenere
     columns_to_keep = [
@@ -40,22 +55,24 @@ def preprocess_dataset(path_csv: str = "dataset/data/dataset.csv",
     ]
 
     # Filtro e pulizia
-    df_filtered = df[columns_to_keep].dropna()
+    df_filtered = df.dropna(subset=columns_to_keep)
 
-    # Rimozione dei track_name duplicati (mantiene la prima occorrenza)
-    df_filtered = df_filtered.drop_duplicates(subset='track_name', keep='first')
+    # Rimozione dei duplicati (mantiene la traccia canonica di ciascun gruppo)
+    df_filtered = applica_deduplicazione(df_filtered)[columns_to_keep]
 
     # Normalizzazione delle feature
     features = df_filtered.drop(columns=['track_name'])
-    scaler = StandardScaler()
-    scaled_features = scaler.fit_transform(features)
+    with span("preprocessing.normalizzazione"):
+        scaler = StandardScaler()
+        scaled_features = scaler.fit_transform(features)
 
     # Creazione del DataFrame normalizzato
     df_scaled = pd.DataFrame(scaled_features, columns=features.columns)
     df_scaled.insert(0, 'track_name', df_filtered['track_name'].values)
 
     # Salvataggio su file
-    df_scaled.to_csv(save_to, index=False)
+    with span("preprocessing.salva_csv"):
+        df_scaled.to_csv(save_to, index=False)
 
     return df_scaled
 
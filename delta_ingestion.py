@@ -0,0 +1,449 @@
+"""
+delta_ingestion.py - Aggiornamento incrementale del catalogo a partire da un file di delta.
+
+Invece di rieseguire clustering, KB Prolog, ontologia e indici sull'intero dataset, il
+comando applica un delta di tracce aggiunte, modificate e rimosse a ciascun artefatto:
+1. `dataset.csv`: righe rimosse, aggiornate (solo le colonne valorizzate nel delta) e accodate;
+2. mappatura delle tracce canoniche (`deduplication.py`), ricalcolata in tempo quasi lineare;
+3. `clean_tracks.csv`: entrano/escono le tracce diventate (o non più) canoniche e vengono
+   aggiornate quelle modificate. Il mood delle tracce nuove, o con feature audio cambiate,
+   è quello indicato nel delta oppure il voto dei vicini più prossimi (sulle feature audio
+   standardizzate) tra le tracce invariate, senza rieseguire KMeans;
+4. knowledge base Prolog: rigenerata in modo vettoriale dal catalogo aggiornato;
+5. export N-Triples, indice degli intervalli e triple store: aggiornati per URI;
+6. grafo dei K vicini: ricalcolate solo le righe interessate (`aggiorna_knn_graph`).
+
+Prima delle modifiche viene salvata una copia degli artefatti in `SNAPSHOT_DIR`; se un passo
+o la verifica di consistenza finale falliscono, gli artefatti vengono ripristinati.
+Gli stadi della pipeline (`main.py --pipeline`) aggiornati prima del delta restano marcati
+come aggiornati; preprocessing, training e probabilità del mood (i codici di artista e
+genere usati dal classificatore dipendono dall'intero catalogo) risultano da rieseguire.
+
+Formato del delta: CSV con la colonna `op` ("add", "change" o "remove") e le colonne di
+`dataset.csv`; per "remove" basta `track_id`, per "change" le colonne vuote mantengono il
+valore attuale. La colonna opzionale `mood` forza il mood delle tracce aggiunte o modificate.
+
+Esempio:
+    python delta_ingestion.py delta.csv     # applica il delta
+    python delta_ingestion.py --check       # verifica la consistenza degli artefatti
+    python delta_ingestion.py --rollback    # ripristina lo snapshot dell'ultimo delta
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+for folder in ("clustering", "prolog", "sparql", "recommender"):
+    if os.path.join(ROOT_DIR, folder) not in sys.path:
+        sys.path.insert(0, os.path.join(ROOT_DIR, folder))
+from instrumentation import span
+from main import STAGES, load_state, save_state, stage_fingerprint, stale_reason
+
+# Percorsi degli artefatti
+DATASET_PATH = "dataset/data/dataset.csv"
+MAPPING_PATH = "dataset/data/canonical_tracks.csv"
+CLEAN_PATH = "dataset/data/clean_tracks.csv"
+KB_PATH = "prolog/knowledge_base.pl"
+QLF_PATH = "prolog/knowledge_base.qlf"
+ONTOLOGY_PATH = "sparql/mood_ontology.nt"
+STORE_PATH = "sparql/triple_store"
+INDEX_PATH = "sparql/range_index.npz"
+GRAPH_PATH = "recommender/knn_graph.npz"
+STATE_PATH = ".pipeline_state.json"
+
+# Cartella dello snapshot usato per il rollback
+SNAPSHOT_DIR = ".delta_snapshot"
+ARTIFACTS = [DATASET_PATH, MAPPING_PATH, CLEAN_PATH, KB_PATH, QLF_PATH, ONTOLOGY_PATH,
+             STORE_PATH, INDEX_PATH, GRAPH_PATH, STATE_PATH]
+
+# Operazioni ammesse nel delta
+OPERATIONS = ("add", "change", "remove")
+
+# Stadi della pipeline i cui output vengono aggiornati dal delta
+PATCHED_STAGES = {"deduplication", "clustering", "kb_prolog", "ontology", "knn_graph"}
+
+# Vicini considerati per assegnare il mood alle tracce nuove o modificate
+MOOD_NEIGHBOURS = 15
+
+def leggi_delta(path, dataset):
+    """
+    Legge e valida il file di delta.
+
+    Args:
+        path (str): Percorso del CSV del delta.
+        dataset (pd.DataFrame): Dataset corrente.
+
+    Returns:
+        pd.DataFrame: Delta validato (colonna `op` normalizzata in minuscolo).
+
+    Raises:
+        ValueError: Se il delta contiene operazioni o colonne non valide, `track_id`
+            ripetuti, aggiunte di tracce esistenti o modifiche di tracce inesistenti.
+    """
+    delta = pd.read_csv(path, dtype={"track_id": str})
+    if "op" not in delta.columns or "track_id" not in delta.columns:
+        raise ValueError("Il delta deve contenere le colonne 'op' e 'track_id'.")
+    unknown = set(delta.columns) - set(dataset.columns) - {"op", "mood"}
+    if unknown:
+        raise ValueError(f"Colonne sconosciute nel delta: {sorted(unknown)}")
+
+    delta["op"] = delta["op"].str.strip().str.lower()
+    invalid = set(delta["op"]) - set(OPERATIONS)
+    if invalid:
+        raise ValueError(f"Operazioni non valide: {sorted(invalid)} (attese: {OPERATIONS})")
+    if delta["track_id"].isna().any() or delta["track_id"].duplicated().any():
+        raise ValueError("Ogni riga del delta deve avere un track_id distinto.")
+
+    existing = delta["track_id"].isin(dataset["track_id"])
+    if (existing & (delta["op"] == "add")).any():
+        raise ValueError("Il delta aggiunge tracce già presenti: "
+                         f"{delta.loc[existing & (delta['op'] == 'add'), 'track_id'].tolist()}")
+    if (~existing & (delta["op"] != "add")).any():
+        raise ValueError("Il delta modifica o rimuove tracce inesistenti: "
+                         f"{delta.loc[~existing & (delta['op'] != 'add'), 'track_id'].tolist()}")
+    return delta
+
+def applica_al_dataset(dataset, delta):
+    """
+    Applica il delta al dataset grezzo.
+
+    Args:
+        dataset (pd.DataFrame): Dataset corrente (non viene modificato).
+        delta (pd.DataFrame): Delta validato.
+
+    Returns:
+        pd.DataFrame: Dataset aggiornato (rimozioni, modifiche in posizione, aggiunte in coda).
+    """
+    removed = delta.loc[delta["op"] == "remove", "track_id"]
+    dataset = dataset[~dataset["track_id"].isin(removed)].copy()
+
+    changes = delta[delta["op"] == "change"].set_index("track_id")
+    for column in changes.columns.intersection(dataset.columns):
+        values = changes[column].dropna()
+        if values.empty:
+            continue
+        mask = dataset["track_id"].isin(values.index)
+        dataset.loc[mask, column] = dataset.loc[mask, "track_id"].map(values)
+
+    added = delta.loc[delta["op"] == "add"].reindex(columns=dataset.columns)
+    return pd.concat([dataset, added], ignore_index=True)
+
+def assegna_mood(righe, riferimento, features):
+    """
+    Assegna il mood per voto di maggioranza dei vicini più prossimi.
+
+    Args:
+        righe (pd.DataFrame): Tracce a cui assegnare il mood.
+        riferimento (pd.DataFrame): Tracce con mood già assegnato.
+        features (list[str]): Feature audio usate dal clustering.
+
+    Returns:
+        np.ndarray: Mood di ciascuna traccia di `righe`.
+    """
+    from sklearn.neighbors import NearestNeighbors
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(riferimento[features])
+    k = min(MOOD_NEIGHBOURS, len(riferimento))
+    nn = NearestNeighbors(n_neighbors=k).fit(scaler.transform(riferimento[features]))
+    _, idx = nn.kneighbors(scaler.transform(righe[features]))
+    votes = pd.DataFrame(riferimento["mood"].to_numpy()[idx])
+    return votes.mode(axis=1)[0].to_numpy()
+
+def aggiorna_catalogo(clean, canonical, delta, features, output_columns):
+    """
+    Aggiorna il catalogo pulito in base alle nuove tracce canoniche.
+
+    Args:
+        clean (pd.DataFrame): Catalogo pulito corrente.
+        canonical (pd.DataFrame): Righe canoniche del dataset aggiornato.
+        delta (pd.DataFrame): Delta validato.
+        features (list[str]): Feature audio usate dal clustering.
+        output_columns (list[str]): Colonne di `clean_tracks.csv`.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, list[str]]: Catalogo aggiornato, righe aggiunte o
+        modificate (già con il mood) e `track_id` rimossi.
+    """
+    canonical = canonical.set_index("track_id", drop=False)
+    removed = clean.loc[~clean["track_id"].isin(canonical.index), "track_id"].tolist()
+    added_ids = canonical.index[~canonical.index.isin(clean["track_id"])]
+    changed_ids = clean.loc[clean["track_id"].isin(delta.loc[delta["op"] == "change", "track_id"])
+                            & ~clean["track_id"].isin(removed), "track_id"]
+
+    current = clean.set_index("track_id", drop=False)
+    changed = canonical.loc[changed_ids].copy()
+    changed["mood"] = current.loc[changed_ids, "mood"]
+    moved = ~np.isclose(changed[features].to_numpy(dtype=float),
+                        current.loc[changed_ids, features].to_numpy(dtype=float),
+                        rtol=1e-5).all(axis=1)
+    added = canonical.loc[added_ids].copy()
+    added["mood"] = np.nan
+
+    # Mood: quello del delta se indicato, altrimenti voto dei vicini tra le tracce invariate
+    rows = pd.concat([changed, added])
+    needs_mood = np.concatenate([moved, np.ones(len(added), dtype=bool)])
+    if "mood" in delta.columns:
+        forced = rows["track_id"].map(delta.set_index("track_id")["mood"])
+        rows.loc[forced.notna(), "mood"] = forced[forced.notna()]
+        needs_mood &= forced.isna().to_numpy()
+    if needs_mood.any():
+        stable = clean[~clean["track_id"].isin([*removed, *changed_ids])]
+        rows.loc[needs_mood, "mood"] = assegna_mood(rows[needs_mood], stable, features)
+    rows = rows[output_columns].reset_index(drop=True)
+
+    updated = clean[~clean["track_id"].isin(removed)].set_index("track_id", drop=False)
+    updated.loc[changed_ids, output_columns] = rows.iloc[:len(changed)].set_index(
+        "track_id", drop=False)[output_columns]
+    updated = pd.concat([updated.reset_index(drop=True), rows.iloc[len(changed):]],
+                        ignore_index=True)
+    return updated, rows, removed
+
+def scrivi_csv(df, path, **kwargs):
+    """Scrive un CSV in modo atomico (file temporaneo e sostituzione)."""
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False, **kwargs)
+    os.replace(tmp_path, path)
+
+def crea_snapshot():
+    """
+    Copia gli artefatti esistenti in `SNAPSHOT_DIR`, sostituendo lo snapshot precedente.
+
+    Returns:
+        list[str]: Artefatti presenti al momento dello snapshot.
+    """
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    os.makedirs(SNAPSHOT_DIR)
+    present = [p for p in ARTIFACTS if os.path.exists(p)]
+    for path in present:
+        target = os.path.join(SNAPSHOT_DIR, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(path):
+            shutil.copytree(path, target)
+        else:
+            shutil.copy2(path, target)
+    with open(os.path.join(SNAPSHOT_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"artifacts": present, "created": time.time()}, f, indent=2)
+    return present
+
+def ripristina_snapshot():
+    """
+    Ripristina gli artefatti dall'ultimo snapshot; quelli creati dopo vengono eliminati.
+
+    Raises:
+        FileNotFoundError: Se non esiste alcuno snapshot.
+    """
+    manifest_path = os.path.join(SNAPSHOT_DIR, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Nessuno snapshot da ripristinare in '{SNAPSHOT_DIR}'.")
+    with open(manifest_path, encoding="utf-8") as f:
+        present = json.load(f)["artifacts"]
+    for path in ARTIFACTS:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        if path in present:
+            source = os.path.join(SNAPSHOT_DIR, path)
+            if os.path.isdir(source):
+                shutil.copytree(source, path)
+            else:
+                shutil.copy2(source, path)
+    print(f"Artefatti ripristinati dallo snapshot '{SNAPSHOT_DIR}'.")
+
+def verifica_consistenza():
+    """
+    Verifica che gli artefatti descrivano lo stesso catalogo di `clean_tracks.csv`.
+
+    Controlla: `track_id` univoci e presenti nel dataset, tracce canoniche secondo la
+    mappatura, numero di fatti `track/8` della KB, tracce dell'export, del triple store e
+    dell'indice degli intervalli, allineamento del grafo dei K vicini.
+
+    Returns:
+        list[str]: Problemi riscontrati (vuota se gli artefatti sono consistenti).
+    """
+    from deduplication import carica_mappatura
+    from regenerate_kb_prolog import build_facts
+    from regenerate_ontology import EX, FLOAT_PROPERTIES, RDF, track_uri
+
+    problems = []
+    clean = pd.read_csv(CLEAN_PATH, dtype={"track_id": str})
+    ids = clean["track_id"]
+    if ids.duplicated().any():
+        problems.append(f"clean_tracks: {int(ids.duplicated().sum())} track_id ripetuti")
+    dataset_ids = pd.read_csv(DATASET_PATH, usecols=["track_id"], dtype=str)["track_id"]
+    if not ids.isin(dataset_ids).all():
+        problems.append(f"clean_tracks: {int((~ids.isin(dataset_ids)).sum())} tracce "
+                        "assenti dal dataset")
+    mapping = carica_mappatura(MAPPING_PATH)
+    if mapping is not None:
+        canonical = ids.map(mapping.set_index("track_id")["canonical_id"])
+        if (canonical.notna() & (canonical != ids)).any():
+            problems.append("clean_tracks: contiene tracce non canoniche")
+
+    if os.path.exists(KB_PATH):
+        with open(KB_PATH, encoding="utf-8") as f:
+            facts = sum(1 for line in f if line.startswith("track("))
+        expected = len(build_facts(clean)[0])
+        if facts != expected:
+            problems.append(f"KB Prolog: {facts} fatti track/8, attesi {expected}")
+
+    uris = set(ids.map(track_uri))
+    if os.path.exists(ONTOLOGY_PATH):
+        type_triple = f" <{RDF.type}> <{EX.Track}> ."
+        with open(ONTOLOGY_PATH, encoding="utf-8") as f:
+            subjects = {line.split(" ", 1)[0][1:-1] for line in f if type_triple in line}
+        if subjects != uris:
+            problems.append(f"export RDF: {len(subjects - uris)} tracce in più, "
+                            f"{len(uris - subjects)} mancanti")
+    if os.path.isdir(STORE_PATH):
+        try:
+            import pyoxigraph as ox
+            store = ox.Store.read_only(STORE_PATH)
+            result = store.query("SELECT (COUNT(DISTINCT ?s) AS ?n) WHERE { GRAPH ?g "
+                                 "{ ?s a <http://example.org/mood#Track> } }")
+            n_store = int(next(iter(result))["n"].value)
+            if n_store != len(clean):
+                problems.append(f"triple store: {n_store} tracce, attese {len(clean)}")
+        except ImportError:
+            pass
+        except OSError as e:
+            problems.append(f"triple store non leggibile: {e}")
+    if os.path.exists(INDEX_PATH):
+        with np.load(INDEX_PATH) as data:
+            for _, column in FLOAT_PROPERTIES:
+                expected = set(clean.loc[clean[column].notna(), "track_id"].map(track_uri))
+                indexed = data[f"{column}_tracks"]
+                if len(indexed) != len(expected) or set(indexed.tolist()) != expected:
+                    problems.append(f"indice degli intervalli: '{column}' non allineato")
+    if os.path.exists(GRAPH_PATH):
+        with np.load(GRAPH_PATH) as data:
+            graph_ids = np.char.decode(data["track_ids"], "utf-8")
+        if not np.array_equal(graph_ids, ids.to_numpy(dtype=str)):
+            problems.append("grafo dei K vicini: non allineato al catalogo")
+    return problems
+
+def applica_delta(delta_path, check=True):
+    """
+    Applica un file di delta a tutti gli artefatti, con snapshot e rollback automatico.
+
+    Args:
+        delta_path (str): Percorso del CSV del delta.
+        check (bool): Se True, verifica la consistenza al termine (rollback se fallisce).
+
+    Returns:
+        dict: Numero di righe del delta per operazione, tracce aggiunte/modificate/rimosse
+        nel catalogo, righe del grafo ricalcolate e stadi della pipeline da rieseguire.
+
+    Raises:
+        ValueError: Se il delta non è valido o la verifica di consistenza fallisce.
+    """
+    from catalogo import Catalogo
+    from deduplication import applica_deduplicazione, trova_duplicati
+    from kmeans_clustering import AUDIO_FEATURES, OUTPUT_COLUMNS
+    from knn_graph import aggiorna_knn_graph
+    from regenerate_kb_prolog import compile_qlf, write_knowledge_base
+    from regenerate_ontology import aggiorna_ontologia
+
+    dataset = pd.read_csv(DATASET_PATH, dtype={"track_id": str})
+    delta = leggi_delta(delta_path, dataset)
+
+    # Stadi della pipeline aggiornati prima del delta
+    state = load_state()
+    fresh = set()
+    for stage in STAGES:
+        try:
+            if stage["name"] in state and stale_reason(stage, state) is None:
+                fresh.add(stage["name"])
+        except FileNotFoundError:
+            pass
+
+    crea_snapshot()
+    try:
+        with span("delta.dataset"):
+            dataset = applica_al_dataset(dataset, delta)
+            scrivi_csv(dataset, DATASET_PATH)
+        with span("delta.deduplicazione"):
+            mapping = trova_duplicati(dataset)
+            scrivi_csv(mapping, MAPPING_PATH)
+        with span("delta.catalogo"):
+            clean = pd.read_csv(CLEAN_PATH, dtype={"track_id": str})
+            canonical = applica_deduplicazione(
+                dataset.dropna(subset=AUDIO_FEATURES + ["track_name"]), mapping)
+            clean, rows, removed = aggiorna_catalogo(clean, canonical, delta, AUDIO_FEATURES,
+                                                     OUTPUT_COLUMNS)
+            scrivi_csv(clean, CLEAN_PATH, float_format="%.6g")
+            # Riletto per usare negli altri artefatti gli stessi valori (arrotondati) del CSV
+            clean = pd.read_csv(CLEAN_PATH, dtype={"track_id": str})
+            rows = clean[clean["track_id"].isin(rows["track_id"])]
+        with span("delta.kb_prolog"):
+            write_knowledge_base(clean, KB_PATH)
+            if os.path.exists(QLF_PATH) and not compile_qlf(KB_PATH):
+                os.remove(QLF_PATH)
+        with span("delta.ontologia"):
+            aggiorna_ontologia(rows, removed, output=ONTOLOGY_PATH)
+        recomputed = 0
+        if os.path.exists(GRAPH_PATH):
+            with span("delta.knn_graph"):
+                _, recomputed = aggiorna_knn_graph(
+                    Catalogo(clean), [*rows["track_id"], *removed], GRAPH_PATH)
+
+        problems = verifica_consistenza() if check else []
+        if problems:
+            raise ValueError("Verifica di consistenza fallita: " + "; ".join(problems))
+    except BaseException:
+        print("Errore durante l'applicazione del delta: ripristino dello snapshot.")
+        ripristina_snapshot()
+        raise
+
+    # Gli stadi aggiornati prima del delta e rigenerati dal delta restano aggiornati
+    state = load_state()
+    for stage in STAGES:
+        if stage["name"] in fresh & PATCHED_STAGES:
+            state[stage["name"]] = stage_fingerprint(stage)
+    save_state(state)
+
+    return {
+        "delta": delta["op"].value_counts().to_dict(),
+        "catalogo": {"aggiunte o modificate": len(rows), "rimosse": len(removed),
+                     "tracce": len(clean)},
+        "righe_grafo_ricalcolate": recomputed,
+        "da_rieseguire": [s["name"] for s in STAGES if s["name"] not in PATCHED_STAGES],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggiornamento incrementale del catalogo")
+    parser.add_argument("delta", nargs="?", help="CSV con le tracce aggiunte/modificate/rimosse")
+    parser.add_argument("--check", action="store_true",
+                        help="verifica la consistenza degli artefatti e termina")
+    parser.add_argument("--rollback", action="store_true",
+                        help="ripristina gli artefatti dallo snapshot dell'ultimo delta")
+    parser.add_argument("--no-check", action="store_true",
+                        help="non verifica la consistenza dopo l'applicazione")
+    args = parser.parse_args()
+
+    if args.rollback:
+        ripristina_snapshot()
+    elif args.check:
+        problems = verifica_consistenza()
+        for problem in problems:
+            print(f"- {problem}")
+        print("Artefatti consistenti." if not problems else f"{len(problems)} problemi trovati.")
+        sys.exit(1 if problems else 0)
+    elif args.delta:
+        start = time.perf_counter()
+        summary = applica_delta(args.delta, check=not args.no_check)
+        print(f"\nDelta applicato in {time.perf_counter() - start:.1f}s")
+        print(f"Operazioni: {summary['delta']}")
+        print(f"Catalogo: {summary['catalogo']}")
+        print(f"Righe del grafo dei vicini ricalcolate: {summary['righe_grafo_ricalcolate']}")
+        print(f"Stadi da rieseguire con 'main.py --pipeline': "
+              f"{', '.join(summary['da_rieseguire'])}")
+    else:
+        parser.print_help()
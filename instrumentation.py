@@ -0,0 +1,268 @@
+"""
+Strumentazione leggera del progetto: span con nome, contatori e istogrammi.
+
+La raccolta delle metriche si attiva impostando la variabile d'ambiente `MOOD_METRICS`
+con il percorso del file di output, prima di avviare lo script:
+- estensione `.prom`: file di testo in formato Prometheus, scritto all'uscita del processo;
+- qualsiasi altra estensione: JSON lines, con un evento per ogni span concluso e, all'uscita,
+  una riga riassuntiva per ciascun contatore e istogramma.
+
+Il segnaposto `{pid}` nel percorso viene sostituito con il PID del processo, utile quando
+più processi (es. i worker di `prolog_pool`) scrivono le proprie metriche.
+
+Con la variabile non impostata la strumentazione è disattivata: `span` restituisce un
+context manager vuoto condiviso, `traccia` lascia la funzione decorata invariata e
+contatori e istogrammi tornano subito.
+
+Il modulo si trova nella radice del progetto. Gli entry point della pipeline (`main.py`,
+`delta_ingestion.py`, `benchmark/run_benchmarks.py`) rendono importabile la radice e la
+passano ai sottoprocessi in `PYTHONPATH` (vedi `main.project_env`). I moduli delle
+sottocartelle lo importano in modo opzionale: se uno script viene avviato direttamente
+(es. `python recommender/offline_recommender.py`) e la radice non è importabile, usano
+segnaposto vuoti e la strumentazione resta disattivata. Per raccogliere le metriche anche
+in questo caso: `PYTHONPATH=. MOOD_METRICS=metriche.jsonl python recommender/...`.
+
+Esempio:
+    from instrumentation import span, incrementa, traccia
+
+    with span("offline.carica_csv"):
+        df = pd.read_csv(path)
+    incrementa("prolog.cache_hit")
+
+    @traccia("offline.predici_mood")
+    def predici_mood(traccia): ...
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Variabile d'ambiente con il percorso del file delle metriche
+METRICS_ENV = "MOOD_METRICS"
+
+# Estremi superiori (secondi) dei bucket degli istogrammi di durata
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_NOOP = nullcontext()
+
+_path = os.environ.get(METRICS_ENV) or None
+ENABLED = _path is not None
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_events = None
+
+class Istogramma:
+    """
+    Istogramma cumulativo con bucket fissi, conteggio e somma dei valori.
+
+    Args:
+        buckets (tuple[float, ...]): Estremi superiori ordinati dei bucket.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def osserva(self, value):
+        """Registra un valore nel bucket corrispondente."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def cumulativi(self):
+        """
+        Restituisce i conteggi cumulativi per bucket (l'ultimo corrisponde a `+Inf`).
+
+        Returns:
+            list[tuple[str, int]]: Coppie (estremo superiore, conteggio cumulativo).
+        """
+        result, running = [], 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+class _Span:
+    """Misura la durata di un blocco e la registra nell'istogramma `<nome>_seconds`."""
+
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        osserva(f"{self.name}_seconds", elapsed)
+        if _events is not None:
+            event = {"type": "span", "name": self.name, "seconds": round(elapsed, 6),
+                     "ts": time.time(), "pid": os.getpid()}
+            if self.labels:
+                event["labels"] = self.labels
+            if exc_type is not None:
+                event["error"] = exc_type.__name__
+            line = json.dumps(event, ensure_ascii=False) + "\n"
+            with _lock:
+                _events.write(line)
+        return False
+
+def span(name, **labels):
+    """
+    Restituisce un context manager che misura la durata del blocco.
+
+    Args:
+        name (str): Nome dello span (es. "prolog.query").
+        **labels: Etichette aggiuntive riportate negli eventi JSON lines.
+
+    Returns:
+        contextlib.AbstractContextManager: Span attivo, o un context manager vuoto se la
+        strumentazione è disattivata.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, labels)
+
+def traccia(name):
+    """
+    Decoratore che misura ogni chiamata della funzione come span `name`.
+
+    Con la strumentazione disattivata restituisce la funzione invariata.
+
+    Args:
+        name (str): Nome dello span.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def incrementa(name, value=1):
+    """
+    Incrementa un contatore.
+
+    Args:
+        name (str): Nome del contatore.
+        value (int | float): Incremento (default: 1).
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def osserva(name, value, buckets=DEFAULT_BUCKETS):
+    """
+    Registra un valore in un istogramma.
+
+    Args:
+        name (str): Nome dell'istogramma.
+        value (float): Valore osservato.
+        buckets (tuple[float, ...]): Bucket usati alla prima osservazione.
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Istogramma(buckets)
+        histogram.osserva(value)
+
+def _metric_name(name):
+    """Converte un nome con punti nel formato dei nomi di metrica Prometheus."""
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+def formato_prometheus():
+    """
+    Serializza contatori e istogrammi nel formato di testo Prometheus.
+
+    Returns:
+        str: Testo delle metriche.
+    """
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = _metric_name(name)
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, histogram in sorted(_histograms.items()):
+            metric = _metric_name(name)
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in histogram.cumulativi():
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines += [f"{metric}_sum {histogram.total}", f"{metric}_count {histogram.count}"]
+    return "\n".join(lines) + "\n"
+
+def riepilogo():
+    """
+    Restituisce lo stato corrente di contatori e istogrammi.
+
+    Returns:
+        list[dict]: Un record per metrica (tipo, nome e valori).
+    """
+    with _lock:
+        records = [{"type": "counter", "name": name, "value": value}
+                   for name, value in sorted(_counters.items())]
+        records += [
+            {"type": "histogram", "name": name, "count": h.count, "sum": round(h.total, 6),
+             "buckets": dict(h.cumulativi())}
+            for name, h in sorted(_histograms.items())
+        ]
+    return records
+
+def esporta(path=None):
+    """
+    Scrive le metriche raccolte nel file di output (JSON lines o Prometheus).
+
+    Args:
+        path (str | None): File di destinazione (default: quello di `MOOD_METRICS`).
+    """
+    if path is None:
+        if not ENABLED:
+            return
+        path = _output_path()
+    if path.endswith(".prom"):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(formato_prometheus())
+        os.replace(tmp_path, path)
+        return
+    lines = "".join(json.dumps({**r, "pid": os.getpid()}) + "\n" for r in riepilogo())
+    with _lock:
+        if _events is not None and path == _output_path():
+            _events.write(lines)
+            _events.flush()
+            return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+def _output_path():
+    """Percorso del file delle metriche con il segnaposto `{pid}` risolto."""
+    return _path.replace("{pid}", str(os.getpid()))
+
+if ENABLED:
+    os.makedirs(os.path.dirname(_output_path()) or ".", exist_ok=True)
+    if not _output_path().endswith(".prom"):
+        _events = open(_output_path(), "a", encoding="utf-8", buffering=1 << 16)
+    atexit.register(esporta)
@@ -8,22 +8,132 @@ Questo modulo implementa una pipeline interattiva che consente all'utente di:
 4. Lanciare una demo Prolog con eventuale rigenerazione della knowledge base simbolica.
 
 L'utente può scegliere quali componenti eseguire tramite prompt interattivi.
+
+In alternativa, con l'opzione `--pipeline`, viene eseguita una pipeline non interattiva
+in cui ogni stadio dichiara i propri file di input e di output: gli stadi vengono
+rieseguiti solo se l'hash del contenuto di un input (o dello script stesso) è cambiato
+rispetto all'ultima esecuzione, o se un output manca o è stato modificato.
+Gli stadi indipendenti (es. KB Prolog e ontologia) vengono eseguiti in parallelo.
+
+Gli stadi della pipeline vengono importati come funzioni ed eseguiti nello stesso processo,
+condividendo in memoria i DataFrame già caricati; gli stadi marcati come `isolated`
+(o tutti, con `--isolated`) vengono invece eseguiti in un sottoprocesso dedicato.
 """
 
+import argparse
+import hashlib
+import importlib.util
+import json
 import os
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# File in cui vengono memorizzati gli hash dell'ultima esecuzione di ciascuno stadio
+STATE_PATH = ".pipeline_state.json"
+
+# Stadi della pipeline con input e output dichiarati (percorsi relativi alla root).
+# Gli output in `optional_outputs` dipendono da pacchetti opzionali (es. il triple store
+# richiede `pyoxigraph`): se mancavano già all'ultima esecuzione non rendono lo stadio
+# da rieseguire.
+STAGES = [
+    {
+        "name": "deduplication",
+        "script": "clustering/deduplication.py",
+        "inputs": ["dataset/data/dataset.csv"],
+        "outputs": ["dataset/data/canonical_tracks.csv"],
+        "function": "run_deduplication",
+        "isolated": False,
+    },
+    {
+        "name": "preprocessing",
+        "script": "clustering/preprocessing.py",
+        "inputs": ["dataset/data/dataset.csv", "dataset/data/canonical_tracks.csv"],
+        "outputs": ["dataset/data/normalized_dataset.csv"],
+        "function": "preprocess_dataset",
+        "isolated": False,
+    },
+    {
+        "name": "clustering",
+        "script": "clustering/kmeans_clustering.py",
+        "inputs": ["dataset/data/dataset.csv", "dataset/data/canonical_tracks.csv"],
+        "outputs": ["dataset/data/clean_tracks.csv"],
+        "function": "run_kmeans_clustering",
+        "isolated": False,
+    },
+    {
+        "name": "training",
+        "script": "classificator/supervised_runner.py",
+        "inputs": ["dataset/data/clean_tracks.csv"],
+        "outputs": ["classificator/mood_classifier.pkl"],
+        "function": "train_classifier",
+        "isolated": False,
+    },
+    {
+        "name": "kb_prolog",
+        "script": "prolog/regenerate_kb_prolog.py",
+        "inputs": ["dataset/data/clean_tracks.csv"],
+        "outputs": ["prolog/knowledge_base.pl"],
+        "function": "main",
+        "kwargs": {"qlf": True},
+        "isolated": False,
+    },
+    {
+        "name": "ontology",
+        "script": "sparql/regenerate_ontology.py",
+        "inputs": ["dataset/data/clean_tracks.csv"],
+        "outputs": ["sparql/mood_ontology.nt", "sparql/triple_store", "sparql/range_index.npz"],
+        "optional_outputs": ["sparql/triple_store"],
+        "function": "export_ontology",
+        "isolated": False,
+    },
+    {
+        "name": "knn_graph",
+        "script": "recommender/knn_graph.py",
+        "inputs": ["dataset/data/clean_tracks.csv"],
+        "outputs": ["recommender/knn_graph.npz"],
+        "function": "build_knn_graph",
+        "isolated": False,
+    },
+    {
+        "name": "mood_proba",
+        "script": "recommender/probabilita_mood.py",
+        "inputs": ["dataset/data/clean_tracks.csv", "classificator/mood_classifier.pkl"],
+        "outputs": ["recommender/mood_proba.npz"],
+        "function": "build_mood_probabilities",
+        "isolated": False,
+    },
+]
+
+def project_env():
+    """
+    Restituisce le variabili d'ambiente per gli script eseguiti in un sottoprocesso.
+
+    La radice del progetto viene aggiunta in testa a `PYTHONPATH`, così i moduli nelle
+    sottocartelle importano `instrumentation` senza modificare `sys.path` (in-process la
+    radice è già importabile, essendo la cartella di `main.py`).
+
+    Returns:
+        dict: Ambiente corrente con `PYTHONPATH` aggiornato.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = [base_dir, *filter(None, os.environ.get("PYTHONPATH", "").split(os.pathsep))]
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(dict.fromkeys(paths))}
 
-def run_python(filepath):
+def run_python(filepath, *args):
     """
     Esegue uno script Python con path assoluto normalizzato.
     
     Args:
         filepath (str): Percorso relativo allo script Python da eseguire.
+        *args (str): Argomenti aggiuntivi da passare allo script.
     """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     full_path = os.path.normpath(os.path.join(base_dir, filepath))
     print(f"\nEsecuzione: {full_path}")
-    subprocess.run(["python", full_path], check=True)
+    subprocess.run(["python", full_path, *args], check=True, env=project_env())
 
 def run_swipl(filepath):
     """
@@ -49,11 +159,285 @@ def prompt_yes(prompt):
     """
     return input(f"{prompt} (s/n): ").strip().lower() == "s"
 
-if __name__ == "__main__":
+def import_stage(filepath):
+    """
+    Importa uno script della pipeline come modulo, senza eseguirne il blocco `__main__`.
+
+    La cartella dello script viene aggiunta a `sys.path` per consentire gli import
+    tra moduli della stessa cartella (es. `from preprocessing import ...`).
+
+    Args:
+        filepath (str): Percorso relativo dello script Python.
+
+    Returns:
+        module: Modulo importato (memorizzato in `sys.modules` per i riutilizzi).
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    full_path = os.path.normpath(os.path.join(base_dir, filepath))
+    name = os.path.splitext(os.path.basename(full_path))[0]
+    module = sys.modules.get(name)
+    if module is not None and getattr(module, "__file__", None) == full_path:
+        return module
+    script_dir = os.path.dirname(full_path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    spec = importlib.util.spec_from_file_location(name, full_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def load_frame(path, frames):
+    """
+    Restituisce il DataFrame di un file CSV, leggendolo solo se non già in memoria.
+
+    Args:
+        path (str): Percorso del file CSV.
+        frames (dict): Cache condivisa percorso → DataFrame.
+
+    Returns:
+        pd.DataFrame: Contenuto del file.
+    """
+    if path not in frames:
+        import pandas as pd
+        frames[path] = pd.read_csv(path)
+    return frames[path]
+
+def run_stage(stage, frames, isolated=False):
+    """
+    Esegue uno stadio della pipeline.
+
+    In modalità in-process la funzione dello stadio riceve come `df` il DataFrame del
+    primo input CSV (dalla cache condivisa) più gli eventuali `kwargs` dello stadio e,
+    se restituisce un DataFrame, il suo primo output CSV viene riletto una sola volta
+    in cache per gli stadi successivi: si usa il file scritto (es. con `float_format`)
+    e non il DataFrame in memoria, così gli stadi a valle vedono gli stessi dati di cui
+    lo stato registra l'hash. Gli stadi non devono modificare il DataFrame ricevuto.
+    In un sottoprocesso i `kwargs` booleani diventano flag `--nome`.
+
+    Args:
+        stage (dict): Definizione dello stadio.
+        frames (dict): Cache condivisa percorso → DataFrame.
+        isolated (bool): Se True, esegue lo script in un sottoprocesso.
+    """
+    csv_outputs = [p for p in stage["outputs"] if p.endswith(".csv")]
+    kwargs = stage.get("kwargs", {})
+    if isolated or stage["isolated"]:
+        flags = [f"--{k}" for k, v in kwargs.items() if v is True]
+        run_python(stage["script"], *flags)
+        for path in csv_outputs:
+            frames.pop(path, None)
+        return
+
+    print(f"\nEsecuzione in-process: {stage['script']}::{stage['function']}")
+    func = getattr(import_stage(stage["script"]), stage["function"])
+    csv_inputs = [p for p in stage["inputs"] if p.endswith(".csv")]
+    if csv_inputs:
+        kwargs = {"df": frames[csv_inputs[0]], **kwargs}
+    result = func(**kwargs)
+
+    import pandas as pd
+    for path in csv_outputs:
+        frames.pop(path, None)
+    if csv_outputs and isinstance(result, pd.DataFrame):
+        frames[csv_outputs[0]] = pd.read_csv(csv_outputs[0])
+
+def hash_file(path):
+    """
+    Calcola l'hash SHA-256 del contenuto di un file, leggendolo a blocchi.
+
+    Per le cartelle (es. il triple store) viene verificata solo la presenza, perché
+    il loro contenuto binario può cambiare anche senza modifiche ai dati.
+
+    Args:
+        path (str): Percorso del file o della cartella.
+
+    Returns:
+        str | None: Hash esadecimale (o "directory"), o None se il percorso non esiste.
+    """
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        return "directory"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_state():
+    """Carica lo stato (hash) dell'ultima esecuzione della pipeline, se presente."""
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state):
+    """Salva lo stato della pipeline su file in modo atomico."""
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, STATE_PATH)
+
+def stage_fingerprint(stage):
+    """
+    Calcola gli hash correnti di input (script incluso) e output di uno stadio.
+
+    Args:
+        stage (dict): Definizione dello stadio.
+
+    Returns:
+        dict: Dizionario con le chiavi 'inputs' e 'outputs' (percorso → hash).
+    """
+    return {
+        "inputs": {p: hash_file(p) for p in [stage["script"]] + stage["inputs"]},
+        "outputs": {p: hash_file(p) for p in stage["outputs"]},
+    }
+
+def stale_reason(stage, state):
+    """
+    Determina se uno stadio deve essere rieseguito.
+
+    Args:
+        stage (dict): Definizione dello stadio.
+        state (dict): Stato salvato dell'ultima esecuzione.
+
+    Returns:
+        str | None: Motivo della rigenerazione, o None se lo stadio è aggiornato.
+    """
+    current = stage_fingerprint(stage)
+    missing_inputs = [p for p, h in current["inputs"].items() if h is None]
+    if missing_inputs:
+        raise FileNotFoundError(
+            f"Input mancanti per lo stadio '{stage['name']}': {', '.join(missing_inputs)}"
+        )
+    previous = state.get(stage["name"])
+    if previous is None:
+        return "mai eseguito"
+    optional = stage.get("optional_outputs", [])
+    for path, digest in current["outputs"].items():
+        if digest is None and path in optional and previous["outputs"].get(path) is None:
+            continue
+        if digest is None:
+            return f"output mancante: {path}"
+        if previous["outputs"].get(path) != digest:
+            return f"output modificato: {path}"
+    for path, digest in current["inputs"].items():
+        if previous["inputs"].get(path) != digest:
+            return f"input modificato: {path}"
+    return None
+
+def stage_waves(stages):
+    """
+    Ordina gli stadi in "onde" rispettando le dipendenze input/output.
+
+    Uno stadio dipende da un altro se uno dei suoi input è un output dell'altro.
+    Gli stadi di una stessa onda sono indipendenti e possono essere eseguiti in parallelo.
+
+    Args:
+        stages (list[dict]): Stadi da ordinare.
+
+    Returns:
+        list[list[dict]]: Onde di stadi in ordine di esecuzione.
+    """
+    producers = {out: s["name"] for s in stages for out in s["outputs"]}
+    deps = {
+        s["name"]: {producers[i] for i in s["inputs"] if i in producers}
+        for s in stages
+    }
+    waves, done = [], set()
+    pending = list(stages)
+    while pending:
+        wave = [s for s in pending if deps[s["name"]] <= done]
+        if not wave:
+            raise ValueError("Dipendenze cicliche tra gli stadi della pipeline.")
+        waves.append(wave)
+        done.update(s["name"] for s in wave)
+        pending = [s for s in pending if s not in wave]
+    return waves
+
+def run_pipeline(selected=None, force=False, jobs=2, isolated=False):
+    """
+    Esegue la pipeline non interattiva, rigenerando solo gli artefatti non aggiornati.
+
+    Gli stadi vengono eseguiti per onde; all'interno di un'onda gli stadi da rigenerare
+    sono lanciati in parallelo. Lo stato (hash) viene aggiornato dopo ogni stadio
+    completato, così un'interruzione non invalida il lavoro già svolto.
+    Se uno stadio fallisce, gli stadi che ne dipendono vengono saltati.
+
+    Args:
+        selected (list[str] | None): Nomi degli stadi da considerare (default: tutti).
+        force (bool): Se True, riesegue gli stadi anche se aggiornati.
+        jobs (int): Numero massimo di stadi eseguiti in parallelo.
+        isolated (bool): Se True, esegue ogni stadio in un sottoprocesso separato.
+
+    Returns:
+        bool: True se tutti gli stadi sono aggiornati al termine, False altrimenti.
+    """
+    stages = [s for s in STAGES if selected is None or s["name"] in selected]
+    state = load_state()
+    lock = threading.Lock()
+    timings = {}
+    failed = set()
+    frames = {}
+
+    def execute(stage):
+        start = time.perf_counter()
+        try:
+            run_stage(stage, frames, isolated)
+        except Exception as e:
+            timings[stage["name"]] = ("fallito", time.perf_counter() - start)
+            print(f"Stadio '{stage['name']}' fallito: {e}")
+            return False
+        timings[stage["name"]] = ("eseguito", time.perf_counter() - start)
+        with lock:
+            state[stage["name"]] = stage_fingerprint(stage)
+            save_state(state)
+        return True
+
+    producers = {out: s["name"] for s in stages for out in s["outputs"]}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for wave in stage_waves(stages):
+            to_run = []
+            for stage in wave:
+                upstream = {producers[i] for i in stage["inputs"] if i in producers}
+                if upstream & failed:
+                    failed.add(stage["name"])
+                    timings[stage["name"]] = ("saltato", 0.0)
+                    continue
+                try:
+                    reason = "forzato" if force else stale_reason(stage, state)
+                except FileNotFoundError as e:
+                    print(e)
+                    failed.add(stage["name"])
+                    timings[stage["name"]] = ("fallito", 0.0)
+                    continue
+                if reason is None:
+                    timings[stage["name"]] = ("aggiornato", 0.0)
+                    continue
+                print(f"\n[{stage['name']}] da rigenerare ({reason})")
+                to_run.append(stage)
+            # Caricamento dei CSV condivisi prima del lancio parallelo
+            for stage in to_run:
+                if not (isolated or stage["isolated"]):
+                    for path in [p for p in stage["inputs"] if p.endswith(".csv")][:1]:
+                        load_frame(path, frames)
+            results = list(executor.map(execute, to_run))
+            failed.update(s["name"] for s, ok in zip(to_run, results) if not ok)
+
+    print("\n=== Tempi per stadio ===")
+    for stage in stages:
+        status, elapsed = timings[stage["name"]]
+        print(f"{stage['name']:<15} {status:<11} {elapsed:8.2f}s")
+    return not failed
+
+def run_interactive():
+    """Esegue la pipeline interattiva guidata da prompt."""
     print("=== AVVIO PIPELINE MOOD RECOMMENDER ===")
 
     # A) Rigenerazione del classificatore supervisionato
     if prompt_yes("Vuoi rigenerare il classificatore supervisionato? (Operazione lunga)"):
+        run_python("clustering/deduplication.py")
         run_python("clustering/preprocessing.py")
         run_python("clustering/kmeans_clustering.py")
         run_python("classificator/supervised_runner.py")
@@ -76,3 +460,24 @@ if __name__ == "__main__":
         run_python("sparql/sparql_demo.py")
 
     print("=== ESECUZIONE COMPLETA ===")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline Mood-Based Music Recommender")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="esegue la pipeline non interattiva incrementale")
+    parser.add_argument("--stages", nargs="+", choices=[s["name"] for s in STAGES],
+                        help="stadi da considerare (default: tutti)")
+    parser.add_argument("--force", action="store_true",
+                        help="riesegue gli stadi anche se aggiornati")
+    parser.add_argument("--jobs", type=int, default=2,
+                        help="numero massimo di stadi in parallelo (default: 2)")
+    parser.add_argument("--isolated", action="store_true",
+                        help="esegue ogni stadio in un sottoprocesso separato")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        if not run_pipeline(args.stages, force=args.force, jobs=args.jobs,
+                            isolated=args.isolated):
+            raise SystemExit(1)
+    else:
+        run_interactive()
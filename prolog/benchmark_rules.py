@@ -0,0 +1,172 @@
+"""
+Benchmark di scalabilità delle regole Prolog al crescere della knowledge base.
+
+Per ciascuna dimensione richiesta viene generata una KB sintetica con lo stesso schema
+prodotto da `regenerate_kb_prolog.py` (fatti `track/8` e fatti ausiliari indicizzati),
+che viene poi caricata da un processo `swipl` dedicato. Vengono misurati:
+- tempo di caricamento della KB (sorgente `.pl` e, se richiesto, precompilata `.qlf`),
+- memoria massima del processo (RSS),
+- latenza media per predicato di `recommend_by_mood`, `is_relaxing`, `is_energetic`,
+  `is_danceable` e `happy_track_with_high_valence` (enumerazione di tutte le soluzioni).
+
+I risultati vengono salvati in un report CSV.
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+from regenerate_kb_prolog import write_knowledge_base, compile_qlf
+
+# Percorsi
+RULES_PL = "prolog/rules.pl"
+OUTPUT_CSV = "prolog/outputs/rules_benchmark.csv"
+
+# Predicati misurati (nome, goal)
+PREDICATES = [
+    ("recommend_by_mood", "recommend_by_mood(felice, T, A)"),
+    ("is_relaxing", "is_relaxing(T, A)"),
+    ("is_energetic", "is_energetic(T, A)"),
+    ("is_danceable", "is_danceable(T, A)"),
+    ("happy_track_with_high_valence", "happy_track_with_high_valence(T, A)"),
+]
+
+MOODS = ["altro", "felice", "aggressivo", "energetico", "triste"]
+GENRES = ["acoustic", "alternative", "dance", "jazz", "pop", "rock", "classical", "hip-hop"]
+
+BENCH_PROGRAM = """
+bench_goal(Name, Goal, Repeats) :-
+    aggregate_all(count, Goal, N),
+    get_time(T0),
+    forall(between(1, Repeats, _), aggregate_all(count, Goal, _)),
+    get_time(T1),
+    Ms is (T1 - T0) * 1000 / Repeats,
+    format("PRED,~w,~w,~6f~n", [Name, N, Ms]).
+
+run_bench(KB, Rules, Goals, Repeats) :-
+    get_time(T0),
+    load_files(KB, []),
+    get_time(T1),
+    consult(Rules),
+    Load is T1 - T0,
+    format("LOAD,~6f~n", [Load]),
+    forall(member(Name-Goal, Goals), bench_goal(Name, Goal, Repeats)).
+"""
+
+def synthetic_tracks(n, seed=42):
+    """
+    Genera un catalogo sintetico con le colonne usate da `regenerate_kb_prolog.py`.
+
+    Args:
+        n (int): Numero di tracce.
+        seed (int): Seme del generatore casuale.
+
+    Returns:
+        pd.DataFrame: Tracce sintetiche.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "track_name": [f"Track {i}" for i in range(n)],
+        "artists": [f"Artist {i}" for i in rng.integers(0, max(1, n // 10), n)],
+        "track_genre": rng.choice(GENRES, n),
+        "danceability": rng.beta(5, 3, n),
+        "energy": rng.beta(3, 2, n),
+        "valence": rng.beta(2, 2, n),
+        "tempo": rng.normal(120, 28, n).clip(40, 220),
+        "mood": rng.choice(MOODS, n),
+    })
+
+def run_swipl(kb_path, repeats):
+    """
+    Esegue il benchmark in un processo `swipl` e ne misura la memoria massima.
+
+    Args:
+        kb_path (str): File della KB da caricare (`.pl` o `.qlf`).
+        repeats (int): Ripetizioni per la misura di latenza di ciascun predicato.
+
+    Returns:
+        tuple[float, int | None, list[tuple[str, int, float]]]: Tempo di caricamento (s),
+        RSS massimo in KB (None se non misurabile) e (predicato, soluzioni, latenza ms).
+    """
+    rules = os.path.abspath(RULES_PL).replace("\\", "/")
+    kb = os.path.abspath(kb_path).replace("\\", "/")
+    goals = ", ".join(f"'{name}'-({goal})" for name, goal in PREDICATES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        program = os.path.join(tmp, "bench.pl")
+        with open(program, "w", encoding="utf-8") as f:
+            f.write(BENCH_PROGRAM)
+        out_path = os.path.join(tmp, "out.txt")
+        goal = f"run_bench('{kb}', '{rules}', [{goals}], {int(repeats)})"
+        with open(out_path, "w", encoding="utf-8") as out:
+            proc = subprocess.Popen(
+                ["swipl", "-q", "-g", goal, "-t", "halt", program], stdout=out
+            )
+            max_rss = None
+            if hasattr(os, "wait4"):
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                max_rss = usage.ru_maxrss
+            else:
+                proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"swipl terminato con codice {proc.returncode}")
+        with open(out_path, encoding="utf-8") as f:
+            lines = [line.strip().split(",") for line in f if "," in line]
+
+    load_s = next(float(parts[1]) for parts in lines if parts[0] == "LOAD")
+    preds = [(p[1], int(p[2]), float(p[3])) for p in lines if p[0] == "PRED"]
+    return load_s, max_rss, preds
+
+def run_benchmark(sizes, repeats=5, qlf=False, output=OUTPUT_CSV):
+    """
+    Esegue il benchmark per ciascuna dimensione della KB e salva il report CSV.
+
+    Args:
+        sizes (list[int]): Numero di tracce delle KB sintetiche.
+        repeats (int): Ripetizioni per la misura di latenza.
+        qlf (bool): Se True, misura anche il caricamento della KB precompilata `.qlf`.
+        output (str): Percorso del report CSV.
+
+    Returns:
+        pd.DataFrame: Report del benchmark.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            kb_path = os.path.join(tmp, f"kb_{n}.pl")
+            write_knowledge_base(synthetic_tracks(n), kb_path)
+            variants = [("pl", kb_path)]
+            if qlf and compile_qlf(kb_path):
+                variants.append(("qlf", os.path.splitext(kb_path)[0] + ".qlf"))
+
+            for fmt, path in variants:
+                print(f"Benchmark KB {fmt} con {n} tracce...")
+                load_s, max_rss, preds = run_swipl(path, repeats)
+                for name, solutions, latency_ms in preds:
+                    rows.append({
+                        "n_tracks": n, "format": fmt, "load_s": load_s,
+                        "max_rss_kb": max_rss, "predicate": name,
+                        "solutions": solutions, "latency_ms": latency_ms,
+                    })
+
+    report = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    report.to_csv(output, index=False)
+    print(report.to_string(index=False))
+    print(f"\nReport salvato in: {output}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark delle regole Prolog")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="dimensioni delle KB sintetiche (numero di tracce)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="ripetizioni per la misura di latenza")
+    parser.add_argument("--qlf", action="store_true",
+                        help="misura anche il caricamento della KB precompilata .qlf")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="percorso del report CSV")
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.repeats, args.qlf, args.output)
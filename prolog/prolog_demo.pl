@@ -2,7 +2,20 @@
 % Test delle regole simboliche
 % ====================================
 
-:- consult('knowledge_base').
+% Carica knowledge_base.qlf se più recente del sorgente, altrimenti knowledge_base.pl
+load_knowledge_base :-
+    prolog_load_context(directory, Dir),
+    atomic_list_concat([Dir, '/knowledge_base.pl'], Source),
+    atomic_list_concat([Dir, '/knowledge_base.qlf'], Qlf),
+    (   exists_file(Qlf),
+        time_file(Qlf, TQlf),
+        time_file(Source, TSource),
+        TQlf >= TSource
+    ->  load_files(Qlf, [])
+    ;   consult(Source)
+    ).
+
+:- load_knowledge_base.
 :- consult('rules').
 
 % === Utility: stampa massimo N risultati unici ===
@@ -24,7 +37,7 @@ run_all_tests :-
     test_is_relaxing,
     test_is_energetic,
     test_is_danceable,
-    test_similar_tracks_by_energy_limited,
+    test_similar_tracks_by_energy,
     test_happy_track_with_high_valence.
 
 test_recommend_by_mood :-
@@ -47,32 +60,13 @@ test_happy_track_with_high_valence :-
     write('Test happy_track_with_high_valence:'), nl,
     limited_results(happy_track_with_high_valence(T, A), 20).
 
-% === Test su subset limitato per similar_tracks_by_energy ===
-test_similar_tracks_by_energy_limited :-
-    write('Test similar_tracks_by_energy su sottoinsieme ridotto:'), nl,
-    findall(T, has_energy_limited(T, _), AllTracks),
-    sort(AllTracks, Unique),
-    prefix(Unique, LimitedTracks, 50),
-    find_limited_similar_pairs(LimitedTracks, Pairs),
-    prefix(Pairs, FinalPairs, 20),
-    print_pairs(FinalPairs).
-
-find_limited_similar_pairs([], []).
-find_limited_similar_pairs([T1|Rest], AllPairs) :-
-    has_energy_limited(T1, E1),
-    findall((T1, T2), (
-        member(T2, Rest),
-        has_energy_limited(T2, E2),
-        Diff is abs(E1 - E2),
-        Diff =< 0.1
-    ), Pairs1),
-    find_limited_similar_pairs(Rest, PairsRest),
-    append(Pairs1, PairsRest, AllPairs).
+% === Test similar_tracks_by_feature sull'intera KB (join a finestra scorrevole) ===
+test_similar_tracks_by_energy :-
+    write('Test similar_tracks_by_feature (energy):'), nl,
+    findnsols(20, (T1, T2), similar_tracks_by_feature(energy, 0.1, 3, T1, T2), Pairs), !,
+    print_pairs(Pairs).
 
 % Utility comuni
-prefix(List, Prefix, N) :- length(Prefix, N), append(Prefix, _, List), !.
-prefix(List, List, _) :- !.
-
 print_pairs([]).
 print_pairs([(A,B)|T]) :-
     format('  -> ~w ~w~n', [A, B]),
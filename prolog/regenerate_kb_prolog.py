@@ -4,19 +4,37 @@ a partire dal file CSV `clean_tracks.csv`.
 
 Ogni riga del dataset viene trasformata in un fatto Prolog del tipo:
 track(Name, Artist, Genre, Danceability, Energy, Valence, Tempo, Mood).
+con il mood come atomo minuscolo, affiancato da fatti ausiliari indicizzati per mood
+e per fasce di energia e danceability.
 
 Le stringhe vengono sanificate per garantire compatibilità con la sintassi di Prolog.
-L'output viene scritto nel file `knowledge_base.pl` all'interno della cartella `prolog/`.
+La sanificazione è eseguita una sola volta per ciascun valore distinto e i fatti sono
+costruiti in modo vettoriale e scritti a blocchi.
+L'output viene scritto nel file `knowledge_base.pl` all'interno della cartella `prolog/`;
+con l'opzione `--qlf` viene prodotta anche la versione precompilata `knowledge_base.qlf`.
 """
 
+import argparse
 import os
 import re
+import shutil
+import subprocess
 import unicodedata
 import pandas as pd
 
 # Percorsi input/output
 INPUT_CSV = "dataset/data/clean_tracks.csv"
 OUTPUT_PL = "prolog/knowledge_base.pl"
+OUTPUT_QLF = "prolog/knowledge_base.qlf"
+
+# Numero di fatti scritti per blocco
+CHUNK_SIZE = 100_000
+
+# Fasce precalcolate usate dalle regole in `rules.pl` (la prima condizione vera vince,
+# altrimenti si usa l'ultima fascia): is_relaxing (energia ≤ 0.5), is_energetic
+# (energia ≥ 0.75) e is_danceable (danceability ≥ 0.7)
+ENERGY_BANDS = [("low", lambda v: v <= 0.5), ("high", lambda v: v >= 0.75), ("medium", None)]
+DANCEABILITY_BANDS = [("high", lambda v: v >= 0.7), ("low", None)]
 
 # Funzione per sanificare le stringhe Prolog-friendly
 def sanitize(s):
@@ -43,47 +61,207 @@ def sanitize(s):
     s = re.sub(r'\s+', ' ', s)
     return s.strip()
 
-def main():
+def sanitize_column(col):
     """
-    Legge il file `clean_tracks.csv`, elabora ogni traccia e genera i fatti Prolog corrispondenti.
+    Sanifica una colonna applicando `sanitize` una sola volta per valore distinto.
 
-    Ogni riga valida viene trasformata in un fatto Prolog della forma:
-    track(Name, Artist, Genre, Danceability, Energy, Valence, Tempo, Mood).
+    Args:
+        col (pd.Series): Colonna da sanificare (convertita in stringa).
 
-    L'output viene scritto nel file `prolog/knowledge_base.pl`. Le righe con titoli vuoti o
-    non validi vengono ignorate.
+    Returns:
+        pd.Series: Colonna sanificata.
+    """
+    col = col.astype(str)
+    uniques = col.unique()
+    mapping = dict(zip(uniques, map(sanitize, uniques)))
+    return col.map(mapping)
+
+def round_column(col, digits):
+    """
+    Arrotonda una colonna numerica con `round` di Python.
+
+    L'arrotondamento decimale di `round` è corretto (a differenza di `Series.round`),
+    così i valori coincidono con quelli dei fatti generati riga per riga.
+
+    Args:
+        col (pd.Series): Colonna numerica.
+        digits (int): Numero di cifre decimali.
 
     Returns:
-        None
+        pd.Series: Colonna arrotondata.
+    """
+    return pd.Series([round(v, digits) for v in col.tolist()], index=col.index, dtype=float)
+
+def band_facts(name, band, track_name, artist):
     """
-    df = pd.read_csv(INPUT_CSV)
+    Costruisce i fatti ausiliari `Name(Band, Track, Artist)` indicizzati sul primo argomento.
 
-    os.makedirs(os.path.dirname(OUTPUT_PL), exist_ok=True)
+    Le tracce senza fascia (valore mancante) vengono scartate.
+
+    Args:
+        name (str): Nome del predicato.
+        band (pd.Series): Fascia (atomo) di ciascuna traccia, o NaN.
+        track_name (pd.Series): Titoli sanificati.
+        artist (pd.Series): Artisti sanificati.
+
+    Returns:
+        pd.Series: Fatti Prolog ordinati per fascia.
+    """
+    has_band = band.notna()
+    facts = (
+        name + "(" + band[has_band] + ', "' + track_name[has_band] + '", "'
+        + artist[has_band] + '").\n'
+    )
+    return facts.iloc[band[has_band].argsort(kind="stable")]
+
+def classify(values, bands):
+    """
+    Assegna a ciascun valore la fascia corrispondente.
+
+    Args:
+        values (pd.Series): Valori numerici (arrotondati come nei fatti `track/8`).
+        bands (list[tuple[str, callable | None]]): Fasce (nome, condizione vettoriale)
+            valutate in ordine; l'ultima fascia, senza condizione, raccoglie il resto.
+
+    Returns:
+        pd.Series: Nome della fascia per ciascun valore, o NaN se il valore manca.
+    """
+    band = pd.Series(bands[-1][0], index=values.index, dtype=object)
+    assigned = pd.Series(False, index=values.index)
+    for label, condition in bands[:-1]:
+        mask = condition(values) & ~assigned
+        band[mask] = label
+        assigned |= mask
+    band[values.isna()] = pd.NA
+    return band
+
+def build_facts(df):
+    """
+    Costruisce in modo vettoriale i fatti della knowledge base a partire dalle tracce.
+
+    Oltre ai fatti `track/8` (con il mood come atomo minuscolo) vengono generati fatti
+    ausiliari con la chiave di ricerca come primo argomento, così che SWI-Prolog possa
+    usare l'indicizzazione sul primo argomento invece di scandire tutti i `track/8`:
+    - mood_track(Mood, Track, Artist)
+    - energy_band(Band, Track, Artist), con fasce `ENERGY_BANDS`
+    - danceability_band(Band, Track, Artist), con fasce `DANCEABILITY_BANDS`
+
+    Le righe con titoli vuoti o non validi (es. "-" o "_") vengono scartate.
+
+    Args:
+        df (pd.DataFrame): Tracce con le colonne del dataset pulito.
 
-    with open(OUTPUT_PL, "w", encoding="utf-8") as f:
+    Returns:
+        list[pd.Series]: Blocchi di fatti Prolog (terminati da newline), uno per predicato;
+        il primo blocco contiene i fatti `track/8`.
+    """
+    track_name = sanitize_column(df["track_name"])
+    valid = (track_name != "") & ~track_name.isin(["-", "_"])
+    df = df[valid]
+    track_name = track_name[valid]
+
+    artist = sanitize_column(df["artists"])
+    genre = sanitize_column(df["track_genre"])
+    mood = "'" + sanitize_column(df["mood"]).str.lower() + "'"
+
+    danceability = round_column(df["danceability"], 3)
+    energy = round_column(df["energy"], 3)
+    valence = round_column(df["valence"], 3)
+    tempo = round_column(df["tempo"], 2)
+
+    tracks = (
+        'track("' + track_name + '", "' + artist + '", "' + genre + '", '
+        + danceability.astype(str) + ", " + energy.astype(str) + ", "
+        + valence.astype(str) + ", " + tempo.astype(str) + ", " + mood + ").\n"
+    )
+
+    return [
+        tracks,
+        band_facts("mood_track", mood, track_name, artist),
+        band_facts("energy_band", classify(energy, ENERGY_BANDS), track_name, artist),
+        band_facts("danceability_band", classify(danceability, DANCEABILITY_BANDS),
+                   track_name, artist),
+    ]
+
+def write_knowledge_base(df, path=OUTPUT_PL):
+    """
+    Scrive la knowledge base Prolog delle tracce, a blocchi di `CHUNK_SIZE` fatti.
+
+    Args:
+        df (pd.DataFrame): Tracce con le colonne del dataset pulito.
+        path (str): Percorso del file `.pl` da generare.
+
+    Returns:
+        int: Numero di fatti `track/8` scritti.
+    """
+    blocks = build_facts(df)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as f:
         f.write("%% Knowledge base generata automaticamente da clean_tracks.csv\n\n")
+        for facts in blocks:
+            for start in range(0, len(facts), CHUNK_SIZE):
+                f.write("".join(facts.iloc[start:start + CHUNK_SIZE]))
+            f.write("\n")
 
-        for _, row in df.iterrows():
-            track_name = sanitize(str(row["track_name"]))
-            if not track_name.strip() or track_name.strip() in ["-", "_"]:
-                continue  # Salta brani senza nome valido
+    return len(blocks[0])
 
-            artist = sanitize(str(row["artists"]))
-            genre = sanitize(str(row["track_genre"]))
-            danceability = round(row["danceability"], 3)
-            energy = round(row["energy"], 3)
-            valence = round(row["valence"], 3)
-            tempo = round(row["tempo"], 2)
-            mood = sanitize(str(row["mood"]))
+def compile_qlf(path=OUTPUT_PL):
+    """
+    Precompila la knowledge base in formato Quick Load File (`.qlf`) tramite SWI-Prolog.
 
-            fact = (
-                f'track("{track_name}", "{artist}", "{genre}", '
-                f'{danceability}, {energy}, {valence}, {tempo}, "{mood}").\n'
-            )
+    Il file `.qlf` viene creato accanto al sorgente e viene caricato al posto del `.pl`
+    solo se più recente di quest'ultimo.
 
-            f.write(fact)
+    Args:
+        path (str): Percorso del file `.pl` da compilare.
 
+    Returns:
+        bool: True se la compilazione è riuscita, False altrimenti.
+    """
+    if shutil.which("swipl") is None:
+        print("swipl non trovato: compilazione .qlf saltata.")
+        return False
+    kb = os.path.abspath(path).replace("\\", "/")
+    try:
+        subprocess.run(
+            ["swipl", "-q", "-g", f"qcompile('{kb}')", "-t", "halt"], check=True
+        )
+    except subprocess.CalledProcessError as e:
+        print(f"Errore durante la compilazione .qlf: {e}")
+        return False
+    return True
+
+def main(df=None, qlf=False):
+    """
+    Legge il file `clean_tracks.csv`, elabora ogni traccia e genera i fatti Prolog corrispondenti.
+
+    Ogni riga valida viene trasformata in un fatto Prolog della forma:
+    track(Name, Artist, Genre, Danceability, Energy, Valence, Tempo, Mood).
+
+    L'output viene scritto nel file `prolog/knowledge_base.pl`. Le righe con titoli vuoti o
+    non validi vengono ignorate.
+
+    Args:
+        df (pd.DataFrame | None): Tracce già caricate in memoria; se None vengono
+            lette da `INPUT_CSV`.
+        qlf (bool): Se True, produce anche la versione precompilata `knowledge_base.qlf`.
+
+    Returns:
+        None
+    """
+    if df is None:
+        df = pd.read_csv(INPUT_CSV)
+
+    write_knowledge_base(df, OUTPUT_PL)
     print(f"Knowledge base Prolog scritta in: {OUTPUT_PL}")
 
+    if qlf and compile_qlf(OUTPUT_PL):
+        print(f"Knowledge base precompilata scritta in: {OUTPUT_QLF}")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generazione della knowledge base Prolog")
+    parser.add_argument("--qlf", action="store_true",
+                        help="produce anche la versione precompilata knowledge_base.qlf")
+    args = parser.parse_args()
+    main(qlf=args.qlf)
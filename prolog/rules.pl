@@ -2,12 +2,33 @@
 % Regole simboliche di raccomandazione musicale
 % ====================================
 
+:- use_module(library(aggregate)).
+:- use_module(library(lists)).
+:- use_module(library(ordsets)).
+:- use_module(library(random)).
+:- use_module(library(solution_sequences)).
+
+% La knowledge base memorizza il mood come atomo minuscolo e contiene fatti ausiliari
+% con la chiave di ricerca come primo argomento (indicizzati da SWI-Prolog):
+%   mood_track(Mood, Track, Artist)
+%   energy_band(low|medium|high, Track, Artist)
+%   danceability_band(low|high, Track, Artist)
+% Le soglie delle fasce sono definite in regenerate_kb_prolog.py.
+
+% --- Normalizzazione del mood richiesto (atomo o stringa, maiuscole ammesse) ---
+normalize_mood(Mood, Key) :-
+    atom(Mood), !,
+    downcase_atom(Mood, Key).
+normalize_mood(Mood, Key) :-
+    string(Mood), !,
+    string_lower(Mood, Lower),
+    atom_string(Key, Lower).
+normalize_mood(Mood, Mood).
+
 % --- Accessori base ---
 has_mood(Track, Mood) :-
-    track(Track, _, _, _, _, _, _, MoodString),
-    string(MoodString),
-    string_lower(MoodString, MoodLower),
-    atom_string(Mood, MoodLower).
+    normalize_mood(Mood, Key),
+    track(Track, _, _, _, _, _, _, Key).
 
 has_genre(Track, Genre) :-
     track(Track, _, _, _, _, _, Genre, _).
@@ -37,33 +58,116 @@ has_mood_limited(Track, Mood) :-
 % --- Regole simboliche con artista ---
 
 recommend_by_mood(Mood, Track, Artist) :-
-    track(Track, Artist, _, _, _, _, _, MoodString),
-    string(MoodString),
-    string_lower(MoodString, MoodLower),
-    atom_string(Mood, MoodLower).
+    normalize_mood(Mood, Key),
+    mood_track(Key, Track, Artist).
 
+% Energia ≤ 0.5
 is_relaxing(Track, Artist) :-
-    track(Track, Artist, _, _, EVal, _, _, _),
-    number(EVal),
-    EVal =< 0.5.
+    energy_band(low, Track, Artist).
 
+% Energia ≥ 0.75
 is_energetic(Track, Artist) :-
-    track(Track, Artist, _, _, EVal, _, _, _),
-    number(EVal),
-    EVal >= 0.75.
+    energy_band(high, Track, Artist).
 
+% Danceability ≥ 0.7
 is_danceable(Track, Artist) :-
-    track(Track, Artist, _, Dance, _, _, _, _),
-    number(Dance),
-    Dance >= 0.7.
+    danceability_band(high, Track, Artist).
 
+% Mood felice e valence > 0.8, verificati sullo stesso fatto track/8: un join tra fatti
+% ausiliari su titolo e artista duplicherebbe le soluzioni e abbinerebbe la valence di
+% una copia al mood di un'altra. Con il mood legato, SWI-Prolog indicizza track/8
+% sull'ottavo argomento e scorre solo le tracce felici.
 happy_track_with_high_valence(Track, Artist) :-
-    track(Track, Artist, _, Valence, _, _, _, MoodString),
-    string(MoodString),
-    string_lower(MoodString, 'felice'),
+    track(Track, Artist, _, _, _, Valence, _, felice),
     number(Valence),
     Valence > 0.8.
 
+% --- Similarità per feature su tutta la KB ---
+feature_value(danceability, Track, Value) :-
+    track(Track, _, _, Value, _, _, _, _), number(Value).
+feature_value(energy, Track, Value) :-
+    track(Track, _, _, _, Value, _, _, _), number(Value).
+feature_value(valence, Track, Value) :-
+    track(Track, _, _, _, _, Value, _, _), number(Value).
+feature_value(tempo, Track, Value) :-
+    track(Track, _, _, _, _, _, Value, _), number(Value).
+
+% similar_tracks_by_feature(+Feature, +MaxDiff, +MaxPerTrack, -Track1, -Track2)
+% Coppie di tracce con |Valore1 - Valore2| =< MaxDiff sulla feature indicata.
+% Le tracce vengono ordinate per valore (O(n log n)) e ogni traccia viene confrontata
+% solo con le successive nella finestra scorrevole, fino a MaxPerTrack vicini:
+% ogni coppia compare una sola volta, con Track1 di valore minore o uguale.
+similar_tracks_by_feature(Feature, MaxDiff, MaxPerTrack, Track1, Track2) :-
+    findall(Value-Track, feature_value(Feature, Track, Value), Pairs),
+    msort(Pairs, Sorted),
+    append(_, [Value1-Track1|Rest], Sorted),
+    window_neighbours(Rest, Value1, MaxDiff, MaxPerTrack, Track1, Neighbours),
+    member(Track2, Neighbours).
+
+window_neighbours([Value-Track|Rest], Value1, MaxDiff, Max, Track1, Neighbours) :-
+    Max > 0,
+    Value - Value1 =< MaxDiff, !,
+    (   Track == Track1
+    ->  window_neighbours(Rest, Value1, MaxDiff, Max, Track1, Neighbours)
+    ;   Neighbours = [Track|Others],
+        Max1 is Max - 1,
+        window_neighbours(Rest, Value1, MaxDiff, Max1, Track1, Others)
+    ).
+window_neighbours(_, _, _, _, _, []).
+
+% track_with_similar(+Feature, +MaxDiff, -Track, -Artist)
+% Tracce che hanno almeno un'altra traccia con |Valore1 - Valore2| =< MaxDiff sulla
+% feature, da entrambi i lati della coppia. Titolo e artista provengono dallo stesso fatto
+% track/8 (due tracce con lo stesso titolo e artisti diversi sono tracce distinte).
+% Dopo l'ordinamento per valore basta confrontare le tracce adiacenti (a meno di fatti
+% ripetuti con lo stesso titolo e artista): se una traccia ha una traccia simile, lo è
+% anche la sua adiacente dallo stesso lato.
+track_with_similar(Feature, MaxDiff, Track, Artist) :-
+    findall(Value-(T-A), feature_fact(Feature, T, A, Value), Pairs),
+    msort(Pairs, Sorted),
+    distinct(Track-Artist, adjacent_similar(Sorted, MaxDiff, Track, Artist)).
+
+adjacent_similar(Sorted, MaxDiff, Track, Artist) :-
+    nextto(Value1-Key1, Value2-Key2, Sorted),
+    Key1 \== Key2,
+    Value2 - Value1 =< MaxDiff,
+    (   Track-Artist = Key1 ; Track-Artist = Key2 ).
+
+feature_fact(danceability, Track, Artist, Value) :-
+    track(Track, Artist, _, Value, _, _, _, _), number(Value).
+feature_fact(energy, Track, Artist, Value) :-
+    track(Track, Artist, _, _, Value, _, _, _), number(Value).
+feature_fact(valence, Track, Artist, Value) :-
+    track(Track, Artist, _, _, _, Value, _, _), number(Value).
+feature_fact(tempo, Track, Artist, Value) :-
+    track(Track, Artist, _, _, _, _, Value, _), number(Value).
+
+similar_tracks_by_energy(Track1, Track2) :-
+    similar_tracks_by_feature(energy, 0.1, 5, Track1, Track2).
+
+% --- Campionamento casuale delle soluzioni ---
+% sample_solutions(+Template, :Goal, +K, +Seed, -Sample)
+% Sample è un campione uniforme (in ordine casuale) di al più K istanze di Template
+% tra le soluzioni di Goal, senza materializzarle tutte: le soluzioni vengono contate,
+% si estraggono K posizioni distinte e la seconda enumerazione si ferma all'ultima
+% posizione estratta. Seed è un intero per risultati riproducibili, oppure `none`.
+sample_solutions(Template, Goal, K, Seed, Sample) :-
+    (   Seed == none -> true ; set_random(seed(Seed)) ),
+    aggregate_all(count, Goal, N),
+    M is min(K, N),
+    (   M =:= 0
+    ->  Sample = []
+    ;   randset(M, N, Indices),
+        last(Indices, Max),
+        findall(Template,
+                ( call_nth(Goal, Nth),
+                  ( Nth =:= Max -> ! ; true ),
+                  ord_memberchk(Nth, Indices)
+                ),
+                Picked),
+        random_permutation(Picked, Sample)
+    ).
+
 % --- Compatibilità tra generi ---
 compatible_genre(rock, alternative).
 compatible_genre(alternative, rock).
@@ -0,0 +1,292 @@
+"""
+Catalogo compatto delle tracce per i raccomandatori.
+
+Sostituisce il DataFrame con tipi predefiniti (float64 e stringhe object) con array a tipo
+ridotto:
+- feature audio in un'unica matrice float32 (una riga per traccia),
+- durata in int32,
+- artista, genere e mood come codici int32, con le etichette memorizzate una sola volta
+  (i codici seguono l'ordine lessicografico, come `LabelEncoder`),
+- titoli come categorie (i titoli ripetuti non vengono duplicati),
+- `track_id` come array di byte a larghezza fissa.
+
+I risultati sono restituiti come `TracciaRecord`, un record con `__slots__` che punta alla
+riga del catalogo senza copiarne i valori.
+
+Esempio:
+    python recommender/catalogo.py   # confronta i byte per traccia con il DataFrame
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+
+# Percorso predefinito del catalogo
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+
+# Feature numeriche memorizzate nella matrice float32
+FEATURES = [
+    "valence", "energy", "danceability", "tempo",
+    "acousticness", "instrumentalness", "speechiness",
+]
+
+# Colonne categoriali codificate in int32 (colonna del CSV → attributo)
+CODED_COLUMNS = {"artists": "artist", "track_genre": "genre", "mood": "mood"}
+
+# Righe lette per blocco quando si carica solo una parte del CSV
+CHUNK_SIZE = 65536
+
+class TracciaRecord:
+    """
+    Vista in sola lettura su una traccia del catalogo.
+
+    Supporta l'accesso per chiave con i nomi delle colonne di `clean_tracks.csv`:
+    `artists` e `track_genre` restituiscono i codici int32 (come nel DataFrame codificato),
+    `artists_name` e `genre_name` le etichette originali.
+
+    Args:
+        catalogo (Catalogo): Catalogo di appartenenza.
+        pos (int): Posizione della traccia nel catalogo.
+    """
+
+    __slots__ = ("catalogo", "pos")
+
+    def __init__(self, catalogo, pos):
+        self.catalogo = catalogo
+        self.pos = int(pos)
+
+    def __getitem__(self, key):
+        if isinstance(key, list):
+            return np.array([self[k] for k in key])
+        return self.catalogo.valore(self.pos, key)
+
+    def __repr__(self):
+        return f"TracciaRecord({self['track_id']!r}, {self['track_name']!r})"
+
+class Catalogo:
+    """
+    Catalogo compatto delle tracce, con colonne in array numpy a tipo ridotto.
+
+    Args:
+        df (pd.DataFrame): Tracce con le colonne di `clean_tracks.csv` usate dai
+            raccomandatori (`track_id`, `track_name`, `artists`, `track_genre`, `mood`,
+            `duration_ms` e `FEATURES`).
+        etichette (dict[str, np.ndarray] | None): Etichette di artista, genere e mood
+            (attributo → etichette ordinate) con cui codificare le colonne; se None
+            vengono ricavate da `df`. Servono a condividere i codici tra cataloghi
+            costruiti su parti diverse dello stesso CSV.
+    """
+
+    def __init__(self, df, etichette=None):
+        self.track_ids = np.char.encode(df["track_id"].astype(str).to_numpy(dtype=str), "utf-8")
+        names = pd.Categorical(df["track_name"].astype(str))
+        self.name_codes = names.codes.astype(np.int32)
+        self.names = np.asarray(names.categories, dtype=object)
+        self.features = np.ascontiguousarray(df[FEATURES].to_numpy(dtype=np.float32))
+        self.duration_ms = df["duration_ms"].to_numpy(dtype=np.int32)
+        self.feature_pos = {feat: i for i, feat in enumerate(FEATURES)}
+        self.posizioni = None
+
+        for column, attr in CODED_COLUMNS.items():
+            categories = None if etichette is None else etichette[attr]
+            values = pd.Categorical(df[column].astype(str), categories=categories)
+            setattr(self, f"{attr}_codes", values.codes.astype(np.int32))
+            setattr(self, f"{attr}_labels", np.asarray(values.categories, dtype=object))
+
+    @classmethod
+    def da_csv(cls, path=CATALOG_PATH, righe=None, etichette=None):
+        """
+        Carica il catalogo da CSV leggendo solo le colonne necessarie.
+
+        Con `righe` il file viene letto a blocchi di `CHUNK_SIZE` righe e di ciascun blocco
+        vengono mantenute solo le righe richieste: in memoria non viene mai costruito il
+        DataFrame dell'intero catalogo.
+
+        Args:
+            path (str): Percorso di `clean_tracks.csv`.
+            righe (np.ndarray | None): Posizioni (ordinate) delle righe da caricare; None
+                carica tutto il catalogo. Diventano le `posizioni` del catalogo.
+            etichette (dict[str, np.ndarray] | None): Etichette con cui codificare le
+                colonne categoriali (vedi `Catalogo`).
+
+        Returns:
+            Catalogo: Catalogo caricato.
+        """
+        columns = ["track_id", "track_name", *CODED_COLUMNS, "duration_ms", *FEATURES]
+        dtypes = {feat: np.float32 for feat in FEATURES}
+        if righe is None:
+            return cls(pd.read_csv(path, usecols=columns, dtype=dtypes), etichette)
+
+        righe = np.asarray(righe)
+        parts = []
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=CHUNK_SIZE):
+            start = chunk.index[0]
+            lo, hi = np.searchsorted(righe, [start, start + len(chunk)])
+            parts.append(chunk.iloc[righe[lo:hi] - start])
+        catalogo = cls(pd.concat(parts), etichette)
+        catalogo.posizioni = righe.astype(np.int32)
+        return catalogo
+
+    def sottoinsieme(self, positions):
+        """
+        Restituisce un catalogo con le sole tracce indicate (es. uno shard).
+
+        Le etichette sono condivise con il catalogo di origine, quindi i codici restano
+        validi; `posizioni` riporta la posizione di ciascuna traccia nel catalogo completo.
+
+        Args:
+            positions (np.ndarray): Posizioni delle tracce da mantenere.
+
+        Returns:
+            Catalogo: Catalogo ridotto.
+        """
+        positions = np.asarray(positions)
+        subset = Catalogo.__new__(Catalogo)
+        subset.__dict__.update(self.__dict__)
+        for attr in ("track_ids", "name_codes", "features", "duration_ms",
+                     *(f"{a}_codes" for a in CODED_COLUMNS.values())):
+            setattr(subset, attr, np.ascontiguousarray(getattr(self, attr)[positions]))
+        base = self.posizioni if self.posizioni is not None else np.arange(len(self))
+        subset.posizioni = base[positions].astype(np.int32)
+        return subset
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def codice(self, attr, label):
+        """
+        Restituisce il codice di un'etichetta (artista, genere o mood).
+
+        Args:
+            attr (str): "artist", "genre" o "mood".
+            label (str): Etichetta da codificare.
+
+        Returns:
+            int: Codice, o -1 se l'etichetta non è presente nel catalogo.
+        """
+        labels = getattr(self, f"{attr}_labels")
+        pos = np.searchsorted(labels, label)
+        return int(pos) if pos < len(labels) and labels[pos] == label else -1
+
+    def valore(self, pos, key):
+        """
+        Restituisce il valore di una colonna per la traccia in posizione `pos`.
+
+        Args:
+            pos (int): Posizione della traccia.
+            key (str): Nome della colonna (vedi `TracciaRecord`).
+
+        Returns:
+            object: Valore della colonna.
+
+        Raises:
+            KeyError: Se la colonna non è disponibile.
+        """
+        if key in self.feature_pos:
+            return float(self.features[pos, self.feature_pos[key]])
+        if key == "track_id":
+            return self.track_ids[pos].decode("utf-8")
+        if key == "track_name":
+            return self.names[self.name_codes[pos]]
+        if key == "duration_ms":
+            return int(self.duration_ms[pos])
+        if key == "artists":
+            return int(self.artist_codes[pos])
+        if key == "artists_name":
+            return self.artist_labels[self.artist_codes[pos]]
+        if key == "track_genre":
+            return int(self.genre_codes[pos])
+        if key == "genre_name":
+            return self.genre_labels[self.genre_codes[pos]]
+        if key == "mood":
+            return self.mood_labels[self.mood_codes[pos]]
+        raise KeyError(key)
+
+    def vettore(self, pos, features):
+        """
+        Restituisce le feature richieste di una traccia come vettore float32.
+
+        Args:
+            pos (int): Posizione della traccia.
+            features (list[str]): Nomi delle feature (sottoinsieme di `FEATURES`).
+
+        Returns:
+            np.ndarray: Valori delle feature.
+        """
+        return self.features[pos, [self.feature_pos[feat] for feat in features]]
+
+    def traccia(self, pos):
+        """Restituisce il record della traccia in posizione `pos`."""
+        return TracciaRecord(self, pos)
+
+    def cerca_nome(self, nome):
+        """
+        Cerca le tracce il cui titolo contiene `nome` (senza distinzione di maiuscole).
+
+        Il confronto avviene sui titoli distinti, non su ciascuna traccia.
+
+        Args:
+            nome (str): Nome (o parte del nome) da cercare.
+
+        Returns:
+            np.ndarray: Posizioni delle tracce corrispondenti.
+        """
+        matches = pd.Series(self.names).str.contains(nome, case=False, na=False)
+        return np.flatnonzero(np.isin(self.name_codes, np.flatnonzero(matches.to_numpy())))
+
+    def matrice(self, columns, positions):
+        """
+        Costruisce la matrice delle colonne richieste per un insieme di tracce.
+
+        Args:
+            columns (list[str]): Feature, `duration_ms`, `artists` o `track_genre` (codici).
+            positions (np.ndarray): Posizioni delle tracce.
+
+        Returns:
+            pd.DataFrame: Una riga per traccia, con le colonne nell'ordine richiesto.
+        """
+        data = {}
+        for column in columns:
+            if column in self.feature_pos:
+                data[column] = self.features[positions, self.feature_pos[column]]
+            elif column == "duration_ms":
+                data[column] = self.duration_ms[positions]
+            elif column == "artists":
+                data[column] = self.artist_codes[positions]
+            elif column == "track_genre":
+                data[column] = self.genre_codes[positions]
+            else:
+                raise KeyError(column)
+        return pd.DataFrame(data, columns=columns)
+
+    def nbytes(self):
+        """
+        Stima la memoria occupata dal catalogo, incluse le etichette memorizzate una volta.
+
+        Returns:
+            int: Numero di byte.
+        """
+        arrays = [self.track_ids, self.name_codes, self.features, self.duration_ms]
+        if self.posizioni is not None:
+            arrays.append(self.posizioni)
+        total = sum(a.nbytes for a in arrays)
+        for labels in (self.names, self.artist_labels, self.genre_labels, self.mood_labels):
+            total += labels.nbytes + sum(sys.getsizeof(label) for label in labels)
+        for attr in CODED_COLUMNS.values():
+            total += getattr(self, f"{attr}_codes").nbytes
+        return total
+
+    def bytes_per_traccia(self):
+        """Restituisce la memoria media occupata per traccia, in byte."""
+        return self.nbytes() / max(1, len(self))
+
+if __name__ == "__main__":
+    df = pd.read_csv(CATALOG_PATH)
+    df["artists_name"] = df["artists"]
+    pandas_bytes = df.memory_usage(deep=True).sum()
+    catalogo = Catalogo(df)
+    print(f"Tracce: {len(catalogo)}")
+    print(f"DataFrame : {pandas_bytes / len(df):8.1f} byte/traccia "
+          f"({pandas_bytes / 2**20:.1f} MB)")
+    print(f"Catalogo  : {catalogo.bytes_per_traccia():8.1f} byte/traccia "
+          f"({catalogo.nbytes() / 2**20:.1f} MB)")
@@ -0,0 +1,431 @@
+"""
+Grafo dei K vicini più prossimi delle tracce, precalcolato offline per ciascun mood.
+
+Per ogni traccia vengono calcolati i K vicini più prossimi tra le tracce dello stesso mood,
+con la stessa distanza pesata di `raccomanda_simili` (`similarita.feature_weights` sulle
+feature secondarie). Il calcolo è a blocchi: per un blocco di tracce le distanze verso
+tutte le tracce del mood vengono stimate con un prodotto matriciale float32 (su feature
+centrate), si selezionano i candidati migliori con un margine e li si riordina con la
+distanza esatta. I blocchi vengono distribuiti su più processi.
+
+Il risultato è salvato in `recommender/knn_graph.npz`: indici dei vicini (int32) e
+distanze (float32), una riga per traccia, più i `track_id` per verificare l'allineamento
+con il catalogo. Su questo grafo `GrafoVicini` offre:
+- la ricerca istantanea dei vicini di una traccia,
+- playlist a traiettoria di mood (es. da "triste" a "felice"), costruite percorrendo il
+  grafo verso punti intermedi interpolati tra la traccia di partenza e il mood di arrivo.
+
+Esempio:
+    python recommender/knn_graph.py --k 20 --jobs 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from catalogo import Catalogo
+from similarita import feature_weights, secondary_features
+
+# Percorsi
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+GRAPH_PATH = "recommender/knn_graph.npz"
+
+# Numero di vicini per traccia
+K = 20
+
+# Numero massimo di distanze stimate per blocco (righe del blocco × tracce del mood)
+BLOCK_ELEMENTS = 8_000_000
+
+# Candidati aggiuntivi riordinati con la distanza esatta, oltre ai K richiesti
+RERANK_MARGIN = 16
+
+# Stato dei processi worker: feature pesate, mood e matrici per mood già preparate
+_features = None
+_moods = None
+_per_mood = {}
+
+def feature_pesate(catalogo):
+    """
+    Restituisce le feature secondarie moltiplicate per la radice dei pesi.
+
+    La distanza euclidea tra queste righe coincide con la distanza pesata di
+    `similarita.distanze_pesate`.
+
+    Args:
+        catalogo (Catalogo): Catalogo delle tracce.
+
+    Returns:
+        np.ndarray: Matrice float32 (tracce × feature secondarie).
+    """
+    cols = [catalogo.feature_pos[feat] for feat in secondary_features]
+    weights = np.array([feature_weights[feat] for feat in secondary_features], dtype=np.float32)
+    return np.ascontiguousarray(catalogo.features[:, cols] * np.sqrt(weights))
+
+def _init_worker(features, moods):
+    """Inizializza un worker con le feature pesate e i codici di mood."""
+    global _features, _moods
+    _features, _moods = features, moods
+    _per_mood.clear()
+
+def _mood_data(mood_code):
+    """Posizioni, feature centrate e norme al quadrato delle tracce di un mood."""
+    if mood_code not in _per_mood:
+        positions = np.flatnonzero(_moods == mood_code)
+        centered = _features[positions] - _features[positions].mean(axis=0)
+        norms = (centered.astype(np.float64) ** 2).sum(axis=1).astype(np.float32)
+        _per_mood[mood_code] = (positions, centered, norms)
+    return _per_mood[mood_code]
+
+def _blocco(mood_code, start, end, k):
+    """
+    Calcola i K vicini delle tracce `start:end` del mood indicato.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Posizioni delle tracce del blocco,
+        indici dei vicini (int32) e distanze (float32), con -1 e inf dove mancano vicini.
+    """
+    positions, centered, norms = _mood_data(mood_code)
+    query = centered[start:end]
+    rows = np.arange(end - start)
+
+    # Stima delle distanze al quadrato e selezione dei candidati
+    approx = norms[start:end, None] + norms[None, :] - 2.0 * (query @ centered.T)
+    approx[rows, rows + start] = np.inf
+    n_candidates = min(k + RERANK_MARGIN, len(positions) - 1)
+    neighbours = np.full((end - start, k), -1, dtype=np.int32)
+    distances = np.full((end - start, k), np.inf, dtype=np.float32)
+    if n_candidates <= 0:
+        return positions[start:end], neighbours, distances
+    candidates = np.argpartition(approx, n_candidates - 1, axis=1)[:, :n_candidates]
+
+    # Distanza esatta sui candidati e ordinamento per (distanza, posizione)
+    diff = centered[candidates] - query[:, None, :]
+    exact = np.sqrt((diff ** 2).sum(axis=2))
+    exact[candidates == (rows + start)[:, None]] = np.inf
+    cand_pos = positions[candidates]
+    order = np.lexsort((cand_pos, exact), axis=1)[:, :k]
+    n = order.shape[1]
+    neighbours[:, :n] = np.take_along_axis(cand_pos, order, axis=1)
+    distances[:, :n] = np.take_along_axis(exact, order, axis=1)
+    invalid = ~np.isfinite(distances)
+    neighbours[invalid] = -1
+    return positions[start:end], neighbours, distances
+
+def build_knn_graph(df=None, k=K, n_jobs=None, output=GRAPH_PATH):
+    """
+    Calcola il grafo dei K vicini per mood e lo salva in `output`.
+
+    Args:
+        df (pd.DataFrame | None): Tracce già caricate in memoria; se None viene letto
+            `CATALOG_PATH`. Il DataFrame non viene modificato.
+        k (int): Numero di vicini per traccia.
+        n_jobs (int | None): Processi paralleli (default: numero di CPU; 1 = nessun pool).
+        output (str): Percorso del file `.npz`.
+
+    Returns:
+        GrafoVicini: Grafo calcolato.
+    """
+    catalogo = Catalogo(df) if df is not None else Catalogo.da_csv(CATALOG_PATH)
+    features = feature_pesate(catalogo)
+    moods = catalogo.mood_codes
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    tasks = []
+    for mood_code in np.unique(moods):
+        size = int((moods == mood_code).sum())
+        block = max(1, BLOCK_ELEMENTS // max(size, 1))
+        tasks += [(int(mood_code), s, min(s + block, size), k) for s in range(0, size, block)]
+
+    neighbours = np.full((len(catalogo), k), -1, dtype=np.int32)
+    distances = np.full((len(catalogo), k), np.inf, dtype=np.float32)
+    start = time.perf_counter()
+    if n_jobs == 1:
+        _init_worker(features, moods)
+        results = (_blocco(*task) for task in tasks)
+        for positions, nb, dist in results:
+            neighbours[positions], distances[positions] = nb, dist
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(features, moods)) as executor:
+            for positions, nb, dist in executor.map(_blocco, *zip(*tasks)):
+                neighbours[positions], distances[positions] = nb, dist
+
+    grafo = GrafoVicini(neighbours, distances, catalogo.track_ids, catalogo)
+    grafo.salva(output)
+    print(f"Grafo dei {k} vicini ({len(catalogo)} tracce, {len(tasks)} blocchi) calcolato "
+          f"in {time.perf_counter() - start:.1f}s e salvato in '{output}'")
+    return grafo
+
+def _vicini_esatti(features, moods, rows, k):
+    """
+    Calcola con la distanza esatta i K vicini delle tracce `rows` (nel proprio mood).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Indici dei vicini (int32) e distanze (float32),
+        con -1 e inf dove mancano vicini.
+    """
+    neighbours = np.full((len(rows), k), -1, dtype=np.int32)
+    distances = np.full((len(rows), k), np.inf, dtype=np.float32)
+    for mood_code in np.unique(moods[rows]):
+        selected = np.flatnonzero(moods[rows] == mood_code)
+        positions = np.flatnonzero(moods == mood_code)
+        block = max(1, BLOCK_ELEMENTS // (len(positions) * features.shape[1]))
+        for start in range(0, len(selected), block):
+            idx = selected[start:start + block]
+            diff = features[positions][None, :, :] - features[rows[idx]][:, None, :]
+            exact = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            exact[positions[None, :] == rows[idx][:, None]] = np.inf
+            n_candidates = min(k + RERANK_MARGIN, len(positions))
+            candidates = np.argpartition(exact, n_candidates - 1, axis=1)[:, :n_candidates]
+            cand_dist = np.take_along_axis(exact, candidates, axis=1)
+            cand_pos = positions[candidates]
+            order = np.lexsort((cand_pos, cand_dist), axis=1)[:, :k]
+            n = order.shape[1]
+            neighbours[idx, :n] = np.take_along_axis(cand_pos, order, axis=1)
+            distances[idx, :n] = np.take_along_axis(cand_dist, order, axis=1)
+    neighbours[~np.isfinite(distances)] = -1
+    return neighbours, distances
+
+def aggiorna_knn_graph(catalogo, modificate, path=GRAPH_PATH):
+    """
+    Aggiorna il grafo salvato dopo una modifica del catalogo, senza ricalcolarlo tutto.
+
+    Le righe delle tracce invariate vengono rimappate sulle nuove posizioni; vengono
+    ricalcolate da zero solo le righe delle tracce aggiunte o modificate e quelle che
+    avevano tra i vicini una traccia rimossa o modificata. Nelle altre righe dei mood
+    interessati le tracce aggiunte o modificate vengono inserite se più vicine del K-esimo
+    vicino attuale. Il risultato coincide con quello di `build_knn_graph`.
+
+    Args:
+        catalogo (Catalogo): Catalogo aggiornato.
+        modificate (iterable[str]): `track_id` aggiunti, modificati o rimossi.
+        path (str): File `.npz` del grafo, sovrascritto con il grafo aggiornato.
+
+    Returns:
+        tuple[GrafoVicini, int]: Grafo aggiornato e numero di righe ricalcolate.
+    """
+    with np.load(path) as data:
+        old_neighbours, old_distances = data["neighbours"], data["distances"]
+        old_ids = data["track_ids"]
+    k = old_neighbours.shape[1]
+    features = feature_pesate(catalogo)
+    moods = catalogo.mood_codes
+    modificate = np.char.encode(np.asarray(list(modificate), dtype=str), "utf-8")
+
+    # Posizione nel nuovo catalogo di ciascuna traccia del vecchio grafo (-1 se rimossa)
+    new_index = {tid: pos for pos, tid in enumerate(catalogo.track_ids.tolist())}
+    old_to_new = np.array([new_index.get(tid, -1) for tid in old_ids.tolist()], dtype=np.int64)
+    valid = np.where(np.isin(old_ids, modificate), -1, old_to_new)
+    dirty = np.flatnonzero(np.isin(catalogo.track_ids, modificate)
+                           | ~np.isin(catalogo.track_ids, old_ids))
+
+    neighbours = np.full((len(catalogo), k), -1, dtype=np.int32)
+    distances = np.full((len(catalogo), k), np.inf, dtype=np.float32)
+    kept = np.flatnonzero(valid >= 0)
+    remapped = np.where(old_neighbours[kept] >= 0, valid[old_neighbours[kept]], -1)
+    neighbours[valid[kept]] = remapped
+    distances[valid[kept]] = np.where(remapped >= 0, old_distances[kept], np.inf)
+
+    # Righe da ricalcolare: tracce nuove o modificate e righe che hanno perso un vicino
+    lost = ((old_neighbours[kept] >= 0) & (remapped < 0)).any(axis=1)
+    recompute = np.union1d(dirty, valid[kept][lost]).astype(np.int64)
+    if len(recompute):
+        neighbours[recompute], distances[recompute] = _vicini_esatti(features, moods,
+                                                                     recompute, k)
+
+    # Inserimento delle tracce nuove o modificate nelle altre righe dello stesso mood
+    for mood_code in np.unique(moods[dirty]):
+        inserted = dirty[moods[dirty] == mood_code]
+        rows = np.setdiff1d(np.flatnonzero(moods == mood_code), recompute)
+        block = max(1, BLOCK_ELEMENTS // (len(inserted) * features.shape[1]))
+        for start in range(0, len(rows), block):
+            idx = rows[start:start + block]
+            diff = features[inserted][None, :, :] - features[idx][:, None, :]
+            new_dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            cand_pos = np.hstack([neighbours[idx], np.broadcast_to(inserted, new_dist.shape)])
+            cand_dist = np.hstack([distances[idx], new_dist])
+            order = np.lexsort((cand_pos, cand_dist), axis=1)[:, :k]
+            neighbours[idx] = np.take_along_axis(cand_pos, order, axis=1)
+            distances[idx] = np.take_along_axis(cand_dist, order, axis=1)
+    neighbours[~np.isfinite(distances)] = -1
+
+    grafo = GrafoVicini(neighbours, distances, catalogo.track_ids, catalogo)
+    grafo.salva(path)
+    return grafo, len(recompute)
+
+class GrafoVicini:
+    """
+    Grafo dei K vicini per mood, con ricerca dei vicini e playlist a traiettoria di mood.
+
+    Args:
+        neighbours (np.ndarray): Indici dei vicini (tracce × K, -1 se assenti).
+        distances (np.ndarray): Distanze pesate corrispondenti.
+        track_ids (np.ndarray): `track_id` delle tracce, nell'ordine del catalogo.
+        catalogo (Catalogo | None): Catalogo allineato, necessario per le playlist.
+    """
+
+    def __init__(self, neighbours, distances, track_ids, catalogo=None):
+        self.neighbours = neighbours
+        self.distances = distances
+        self.track_ids = track_ids
+        self.catalogo = catalogo
+        self._features = feature_pesate(catalogo) if catalogo is not None else None
+
+    @classmethod
+    def carica(cls, path=GRAPH_PATH, catalogo=None):
+        """
+        Carica il grafo salvato, verificandone l'allineamento con il catalogo.
+
+        Args:
+            path (str): File `.npz` del grafo.
+            catalogo (Catalogo | None): Catalogo con cui usare il grafo.
+
+        Returns:
+            GrafoVicini: Grafo caricato.
+
+        Raises:
+            ValueError: Se il grafo non corrisponde al catalogo (va ricalcolato).
+        """
+        with np.load(path) as data:
+            neighbours, distances = data["neighbours"], data["distances"]
+            track_ids = data["track_ids"]
+        if catalogo is not None and not np.array_equal(track_ids, catalogo.track_ids):
+            raise ValueError(f"Il grafo '{path}' non corrisponde al catalogo: ricalcolarlo.")
+        return cls(neighbours, distances, track_ids, catalogo)
+
+    def salva(self, path=GRAPH_PATH):
+        """
+        Salva il grafo in formato `.npz` (scrittura atomica).
+
+        Args:
+            path (str): File di destinazione.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, neighbours=self.neighbours, distances=self.distances,
+                 track_ids=self.track_ids)
+        os.replace(tmp_path, path)
+
+    @property
+    def k(self):
+        """Numero di vicini memorizzati per traccia."""
+        return self.neighbours.shape[1]
+
+    def posizione(self, track_id):
+        """
+        Restituisce la posizione nel catalogo di un `track_id`.
+
+        Raises:
+            KeyError: Se la traccia non esiste.
+        """
+        matches = np.flatnonzero(self.track_ids == track_id.encode("utf-8"))
+        if len(matches) == 0:
+            raise KeyError(track_id)
+        return int(matches[0])
+
+    def vicini(self, pos, n=None):
+        """
+        Restituisce i vicini di una traccia, dal più vicino.
+
+        Args:
+            pos (int | str): Posizione nel catalogo o `track_id`.
+            n (int | None): Numero di vicini (default: tutti i K memorizzati).
+
+        Returns:
+            list[tuple[int, float]]: Coppie (posizione del vicino, distanza).
+        """
+        if isinstance(pos, str):
+            pos = self.posizione(pos)
+        row, dist = self.neighbours[pos, :n], self.distances[pos, :n]
+        valid = row >= 0
+        return list(zip(row[valid].tolist(), dist[valid].tolist()))
+
+    def _piu_vicina(self, point, mood_code, exclude):
+        """Traccia del mood più vicina a un punto, esclusi i già usati (ricerca esatta)."""
+        positions = np.flatnonzero(self.catalogo.mood_codes == mood_code)
+        positions = positions[~np.isin(positions, list(exclude))]
+        if len(positions) == 0:
+            return None
+        distances = ((self._features[positions] - point) ** 2).sum(axis=1)
+        return int(positions[distances.argmin()])
+
+    def playlist(self, start, moods, length=10):
+        """
+        Costruisce una playlist che passa gradualmente dal mood della traccia iniziale
+        ai mood indicati.
+
+        Le tappe della playlist seguono punti interpolati linearmente tra le feature della
+        traccia iniziale e il baricentro dell'ultimo mood; la playlist è divisa in tratti
+        uguali, uno per mood della sequenza. Dentro un tratto si avanza sul grafo, scegliendo
+        tra i vicini non ancora usati quello più vicino al punto della tappa; al cambio di
+        mood (o se i vicini sono esauriti) si passa alla traccia del nuovo mood più vicina
+        al punto della tappa.
+
+        Args:
+            start (int | str): Traccia iniziale (posizione o `track_id`).
+            moods (list[str]): Mood da attraversare dopo quello iniziale, in ordine
+                (es. ["altro", "felice"]).
+            length (int): Numero di tracce della playlist, inclusa quella iniziale.
+
+        Returns:
+            list[int]: Posizioni delle tracce della playlist.
+
+        Raises:
+            ValueError: Se manca il catalogo o un mood non esiste.
+        """
+        if self.catalogo is None:
+            raise ValueError("Per le playlist serve il catalogo allineato al grafo.")
+        if isinstance(start, str):
+            start = self.posizione(start)
+        codes = [self.catalogo.codice("mood", mood) for mood in moods]
+        if -1 in codes:
+            raise ValueError(f"Mood non presente nel catalogo: {moods}")
+
+        sequence = [int(self.catalogo.mood_codes[start]), *codes]
+        target = self._features[self.catalogo.mood_codes == codes[-1]].mean(axis=0)
+        origin = self._features[start]
+
+        playlist, used = [start], {start}
+        for step in range(1, length):
+            t = step / max(length - 1, 1)
+            point = origin + t * (target - origin)
+            mood_code = sequence[min(int(t * len(sequence)), len(sequence) - 1)]
+            current = playlist[-1]
+
+            choice = None
+            if self.catalogo.mood_codes[current] == mood_code:
+                options = [p for p, _ in self.vicini(current) if p not in used]
+                if options:
+                    distances = ((self._features[options] - point) ** 2).sum(axis=1)
+                    choice = options[int(distances.argmin())]
+            if choice is None:
+                choice = self._piu_vicina(point, mood_code, used)
+            if choice is None:
+                break
+            playlist.append(choice)
+            used.add(choice)
+        return playlist
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grafo dei K vicini per mood")
+    parser.add_argument("--k", type=int, default=K, help=f"vicini per traccia (default: {K})")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="processi paralleli (default: numero di CPU)")
+    parser.add_argument("--output", default=GRAPH_PATH, help="percorso del file .npz")
+    parser.add_argument("--demo", nargs="+", metavar="MOOD", default=None,
+                        help="stampa una playlist di prova verso i mood indicati")
+    args = parser.parse_args()
+    grafo = build_knn_graph(k=args.k, n_jobs=args.jobs, output=args.output)
+
+    if args.demo:
+        catalogo = grafo.catalogo
+        target_code = catalogo.codice("mood", args.demo[-1])
+        start = int(np.flatnonzero(catalogo.mood_codes != target_code)[0])
+        print(f"\nPlaylist verso {' → '.join(args.demo)}:")
+        for pos in grafo.playlist(start, args.demo, length=10):
+            row = catalogo.traccia(pos)
+            print(f"- {row['track_name']} di {row['artists_name']} [{row['mood']}]")
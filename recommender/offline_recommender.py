@@ -2,54 +2,84 @@
 Modulo per la raccomandazione musicale basata su similarità audio e predizione del mood.
 
 Funzionalità principali:
-- Caricamento del dataset pulito e del classificatore preaddestrato
+- Caricamento del dataset pulito (catalogo compatto, vedi `catalogo.py`) e del
+  classificatore preaddestrato
 - Predizione del mood tramite modello supervisionato
 - Raccomandazione di tracce simili secondo mood, genere e durata
-- Calcolo della distanza pesata su feature audio
+- Calcolo della distanza pesata su feature audio (esatta, o con passo grossolano su
+  feature quantizzate uint8 e riordino esatto, vedi `quantizzazione.py`)
+- Ordinamento "morbido" senza inferenza a richiesta: distanza audio combinata con la
+  distanza tra le probabilità del mood precalcolate (vedi `probabilita_mood.py`)
 - Generazione di spiegazioni per ogni raccomandazione
 """
 
 import pickle
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
 from dotenv import load_dotenv
 import numpy as np
+from catalogo import Catalogo
+from probabilita_mood import PROBA_PATH, ProbabilitaMood, calcola_probabilita
+from quantizzazione import FeatureQuantizzate
+from similarita import (
+    distanze_miste, distanze_pesate, features_model, genera_spiegazione, secondary_features,
+)
+try:
+    from instrumentation import incrementa, span, traccia
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+    def incrementa(name, value=1):
+        pass
+
+    def traccia(name):
+        return lambda func: func
 
 # Caricamento risorse
 load_dotenv()
 
-with open("classificator/mood_classifier.pkl", "rb") as f:
-    model, mood_encoder = pickle.load(f)
-
-df = pd.read_csv("dataset/data/clean_tracks.csv")
-df["artists_name"] = df["artists"]  # salva nome originale
-
-# Label encoding
-artist_encoder = LabelEncoder()
-df["artists"] = artist_encoder.fit_transform(df["artists"].astype(str))
-
-genre_encoder = LabelEncoder()
-df["track_genre"] = genre_encoder.fit_transform(df["track_genre"].astype(str))
-
-# Feature e pesi
-primary_filters = ["mood", "duration_ms", "track_genre"]
-secondary_features = [
-    "valence", "energy", "danceability", "tempo",
-    "acousticness", "instrumentalness", "speechiness"
-]
-feature_weights = {
-    "valence": 2.0,
-    "energy": 2.0,
-    "danceability": 1.0,
-    "tempo": 1.0,
-    "acousticness": 1.0,
-    "instrumentalness": 1.0,
-    "speechiness": 1.0,
-}
-features_model = [
-    "valence", "energy", "danceability", "tempo", "acousticness",
-    "instrumentalness", "speechiness", "artists", "duration_ms", "track_genre"
-]
+with span("offline.carica_modello"):
+    with open("classificator/mood_classifier.pkl", "rb") as f:
+        model, mood_encoder = pickle.load(f)
+
+# Catalogo compatto: feature float32 e artista/genere già codificati in int32
+# (stessi codici di `LabelEncoder`), etichette originali memorizzate una sola volta
+with span("offline.carica_csv"):
+    catalogo = Catalogo.da_csv("dataset/data/clean_tracks.csv")
+
+# Copia uint8 delle feature, costruita al primo uso del punteggio quantizzato
+_quantizzate = None
+
+def feature_quantizzate():
+    """Restituisce (costruendola una sola volta) la copia quantizzata delle feature."""
+    global _quantizzate
+    if _quantizzate is None:
+        with span("offline.quantizza"):
+            _quantizzate = FeatureQuantizzate(catalogo)
+    return _quantizzate
+
+# Probabilità del mood di tutte le tracce, caricate al primo uso dell'ordinamento morbido
+_probabilita = None
+
+def probabilita_mood():
+    """
+    Restituisce (caricandola una sola volta) la matrice delle probabilità del mood.
+
+    Se il file precalcolato manca o non è allineato al catalogo (es. dopo un delta), la
+    matrice viene calcolata in memoria con un'unica chiamata a `predict_proba`.
+    """
+    global _probabilita
+    if _probabilita is None:
+        with span("offline.carica_probabilita"):
+            try:
+                _probabilita = ProbabilitaMood.carica(PROBA_PATH, catalogo)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"Probabilità del mood non disponibili ({e}): le calcolo in memoria.")
+                _probabilita = calcola_probabilita(catalogo, model, mood_encoder)
+    return _probabilita
 
 # Trova traccia
 def trova_traccia(nome):
@@ -64,141 +94,134 @@ def trova_traccia(nome):
         nome (str): Nome (o parte del nome) della traccia da cercare.
 
     Returns:
-        pd.Series | None: Traccia selezionata o None.
+        TracciaRecord | None: Traccia selezionata o None.
     """
-    risultati = df[df["track_name"].str.contains(nome, case=False, na=False)]
-    if risultati.empty:
+    risultati = catalogo.cerca_nome(nome)
+    if len(risultati) == 0:
         print("Nessuna traccia trovata.")
         return None
     if len(risultati) == 1:
-        return risultati.iloc[0]
+        return catalogo.traccia(risultati[0])
     print("\nTrovate più tracce:")
-    for i, row in risultati.iterrows():
+    for i in risultati:
+        row = catalogo.traccia(i)
         print(f"[{i}] {row['track_name']} di {row['artists_name']}")
     try:
         scelta = int(input("Seleziona l'indice della traccia: "))
-        return risultati.loc[scelta]
+        if scelta not in risultati:
+            raise KeyError(scelta)
+        return catalogo.traccia(scelta)
     except:
         print("Selezione non valida.")
         return None
 
 # Predizione mood
+@traccia("offline.predici_mood")
 def predici_mood(traccia_originale):
     """
     Predice il mood di una traccia usando il classificatore supervisionato.
 
-    Codifica le feature categoriali e applica il modello addestrato per stimare il mood.
+    Artista e genere sono già codificati nel catalogo; il modello viene applicato
+    alla riga delle feature costruita dagli array del catalogo.
 
     Args:
-        traccia_originale (pd.Series): Rappresentazione della traccia.
+        traccia_originale (TracciaRecord): Traccia del catalogo.
 
     Returns:
-        str: Etichetta del mood predetto.
+        int: Codice del mood predetto (decodificabile con `mood_encoder`).
     """
-    traccia = traccia_originale.copy()
-    if isinstance(traccia["artists"], str):
-        traccia["artists"] = artist_encoder.transform([traccia["artists"]])[0]
-    if isinstance(traccia["track_genre"], str):
-        traccia["track_genre"] = genre_encoder.transform([traccia["track_genre"]])[0]
-    features_df = pd.DataFrame([traccia[features_model]])
+    features_df = catalogo.matrice(features_model, [traccia_originale.pos])
     return model.predict(features_df)[0]
 
-# Spiegazione
-def genera_spiegazione(base_row, candidate_row):
-    """
-    Genera una spiegazione testuale della raccomandazione basata sulla similarità tra tracce.
-
-    La spiegazione include fattori come mood, genere, durata e la feature audio più simile
-    secondo distanza pesata.
-
-    Args:
-        base_row (pd.Series): Traccia di riferimento.
-        candidate_row (pd.Series): Traccia raccomandata.
-
-    Returns:
-        str: Motivazione testuale.
-    """
-    motivazioni = []
-
-    if base_row["mood"] == candidate_row["mood"]:
-        motivazioni.append("stesso mood")
-    if base_row["track_genre"] == candidate_row["track_genre"]:
-        motivazioni.append("genere musicale identico")
-    if abs(base_row["duration_ms"] - candidate_row["duration_ms"]) <= 0.1 * base_row["duration_ms"]:
-        motivazioni.append(
-    f"durata simile ({abs(base_row['duration_ms'] - candidate_row['duration_ms']) / 1000:.1f}s)"
-)
-
-
-    # Similarità feature più forte
-    differenze = {
-        feat: abs(base_row[feat] - candidate_row[feat]) * feature_weights[feat]
-        for feat in secondary_features
-    }
-    best_feat = min(differenze, key=differenze.get)
-    motivazioni.append(f"{best_feat} simile (Δ={differenze[best_feat]:.3f})")
-
-    return (
-    "Motivazione principale: " + motivazioni[-1] + ". Altri fattori: " +
-    ", ".join(motivazioni[:-1])
-)
-
-
 # Raccomandazione
-def raccomanda_simili(traccia_originale, top_n=5):
+def raccomanda_simili(traccia_originale, top_n=5, quantizzato=False, morbido=False,
+                      peso_mood=1.0):
     """
     Raccomanda le tracce più simili a quella data, utilizzando un filtro per mood,
     genere e durata, e una distanza pesata sulle feature audio secondarie.
 
     Se il filtro stretto restituisce zero risultati, esegue un fallback rilassando i vincoli.
 
+    Con `morbido=True` il mood non viene predetto a richiesta né usato come filtro: le
+    candidate sono tutte le tracce con genere e durata compatibili (fallback: tutte le
+    tracce) e la distanza audio viene combinata con la distanza tra i vettori di
+    probabilità del mood precalcolati (`similarita.distanze_miste`). Le tracce di confine
+    ricevono così raccomandazioni stabili anche dai mood vicini.
+
+    Con `quantizzato=True` le candidate vengono prima valutate sulla copia uint8 delle
+    feature e solo una lista ridotta viene riordinata con la distanza esatta: più veloce
+    sul fallback (tutto il mood), con una piccola perdita di recall (vedi
+    `quantizzazione.report_recall`).
+
     Args:
-        traccia_originale (pd.Series): Traccia da cui partire.
+        traccia_originale (TracciaRecord): Traccia da cui partire.
         top_n (int): Numero di raccomandazioni da restituire (default: 5).
+        quantizzato (bool): Usa il punteggio quantizzato (default: False).
+        morbido (bool): Usa l'ordinamento morbido sul mood (default: False).
+        peso_mood (float): Peso della distanza di mood nell'ordinamento morbido.
 
     Returns:
         None
+
+    Raises:
+        ValueError: Se sono richiesti insieme il punteggio quantizzato e quello morbido.
     """
-    traccia = traccia_originale.copy()
-    mood_pred = predici_mood(traccia)
-    mood_label = mood_encoder.inverse_transform([mood_pred])[0]
+    if quantizzato and morbido:
+        raise ValueError("Punteggio quantizzato e ordinamento morbido non sono combinabili")
+    traccia = traccia_originale
+    if morbido:
+        mood_label = probabilita_mood().mood(traccia.pos)
+    else:
+        mood_pred = predici_mood(traccia)
+        mood_label = mood_encoder.inverse_transform([mood_pred])[0]
+    mood_code = catalogo.codice("mood", mood_label)
     base_durata = traccia["duration_ms"]
     base_genere = traccia["track_genre"]
 
     # Primo filtro
-    df_filtrato = df[
-        (df["mood"] == mood_label) &
-        (df["track_genre"] == base_genere) &
-        (df["duration_ms"].between(base_durata * 0.9, base_durata * 1.1)) &
-        (df["track_id"] != traccia["track_id"])
-    ].copy()
-
-    # Fallback se vuoto
-    if df_filtrato.empty:
-        print("Nessuna raccomandazione stretta trovata, rilasso i filtri (solo stesso mood)...")
-        df_filtrato = df[
-            (df["mood"] == mood_label) &
-            (df["track_id"] != traccia["track_id"])
-        ].copy()
-        if df_filtrato.empty:
-            print("Nessuna raccomandazione possibile.")
-            return
+    with span("offline.filtro"):
+        altre = np.arange(len(catalogo)) != traccia.pos
+        stesso_mood = altre if morbido else (catalogo.mood_codes == mood_code) & altre
+        candidati = np.flatnonzero(
+            stesso_mood &
+            (catalogo.genre_codes == base_genere) &
+            (catalogo.duration_ms >= base_durata * 0.9) &
+            (catalogo.duration_ms <= base_durata * 1.1)
+        )
+
+        # Fallback se vuoto
+        if len(candidati) == 0:
+            incrementa("offline.fallback")
+            print("Nessuna raccomandazione stretta trovata, rilasso i filtri "
+                  f"({'tutte le tracce' if morbido else 'solo stesso mood'})...")
+            candidati = np.flatnonzero(stesso_mood)
+            if len(candidati) == 0:
+                print("Nessuna raccomandazione possibile.")
+                return
+    incrementa("offline.candidati", len(candidati))
 
     # Calcolo distanza pesata
-    x_input = traccia[secondary_features].values.reshape(1, -1)
-    x_candidati = df_filtrato[secondary_features].values
-    weights = np.array([feature_weights[feat] for feat in secondary_features])
-    df_filtrato["distanza"] = ((x_candidati - x_input) ** 2 * weights).sum(axis=1) ** 0.5
-
-    raccomandazioni = df_filtrato.sort_values(by="distanza").head(top_n)
+    with span("offline.distanza"):
+        x_input = catalogo.vettore(traccia.pos, secondary_features)
+        if quantizzato:
+            candidati, distanze = feature_quantizzate().top_n(candidati, x_input, top_n)
+            ordine = np.arange(len(candidati))
+        elif morbido:
+            distanze = distanze_miste(catalogo, candidati, x_input, probabilita_mood(),
+                                      traccia.pos, peso_mood)
+            ordine = np.argsort(distanze, kind="stable")[:top_n]
+        else:
+            distanze = distanze_pesate(catalogo, candidati, x_input)
+            ordine = np.argsort(distanze, kind="stable")[:top_n]
 
     print(
     f"\nTracce consigliate simili a '{traccia['track_name']}' di "
     f"{traccia['artists_name']}' (mood: {mood_label}):\n"
 )
 
-    for _, row in raccomandazioni.iterrows():
-        print(f"- {row['track_name']} di {row['artists_name']} [distanza: {row['distanza']:.3f}]")
+    for i in ordine:
+        row = catalogo.traccia(candidati[i])
+        print(f"- {row['track_name']} di {row['artists_name']} [distanza: {distanze[i]:.3f}]")
         print(f"  {genera_spiegazione(traccia, row)}")
 
 def main():
@@ -0,0 +1,169 @@
+"""
+Vettori di probabilità del mood precalcolati per tutte le tracce del catalogo.
+
+`predici_mood` usa solo l'etichetta di `model.predict` e il raccomandatore filtra in modo
+stretto su di essa: per le tracce di confine tra due mood l'insieme delle raccomandazioni
+cambia bruscamente. Qui `predict_proba` viene eseguito una sola volta, offline, su tutto il
+catalogo e salvato in `recommender/mood_proba.npz` come matrice float32 (tracce × mood),
+insieme alle etichette dei mood (ordine delle colonne) e ai `track_id` per verificare
+l'allineamento con il catalogo.
+
+A richiesta non serve alcuna inferenza: il mood della traccia è l'argmax della sua riga e
+la somiglianza di mood tra due tracce è la distanza di Hellinger tra le distribuzioni
+(0 = stessa distribuzione, 1 = supporti disgiunti), calcolata come prodotto scalare delle
+radici delle probabilità. `similarita.distanze_miste` la combina con la distanza pesata
+sulle feature audio in un unico passaggio vettoriale.
+
+Esempio:
+    python recommender/probabilita_mood.py   # ricalcola la matrice e ne stampa un riepilogo
+"""
+
+import os
+import pickle
+import time
+import numpy as np
+from catalogo import Catalogo
+from similarita import features_model
+try:
+    from instrumentation import span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+# Percorsi
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+MODEL_PATH = "classificator/mood_classifier.pkl"
+PROBA_PATH = "recommender/mood_proba.npz"
+
+# Tracce classificate per chiamata a `predict_proba`
+BLOCK_SIZE = 65536
+
+# Probabilità massima sotto la quale una traccia è considerata di confine (solo riepilogo)
+BORDERLINE = 0.6
+
+class ProbabilitaMood:
+    """
+    Matrice delle probabilità del mood, allineata al catalogo.
+
+    Args:
+        proba (np.ndarray): Probabilità (tracce × mood), float32.
+        labels (np.ndarray): Etichetta del mood di ciascuna colonna.
+        track_ids (np.ndarray): `track_id` delle tracce, nell'ordine del catalogo.
+    """
+
+    def __init__(self, proba, labels, track_ids):
+        self.proba = np.ascontiguousarray(proba, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=object)
+        self.track_ids = track_ids
+        self.radici = np.sqrt(self.proba)
+
+    @classmethod
+    def carica(cls, path=PROBA_PATH, catalogo=None):
+        """
+        Carica la matrice salvata, verificandone l'allineamento con il catalogo.
+
+        Args:
+            path (str): File `.npz` della matrice.
+            catalogo (Catalogo | None): Catalogo con cui usare la matrice.
+
+        Returns:
+            ProbabilitaMood: Matrice caricata.
+
+        Raises:
+            ValueError: Se la matrice non corrisponde al catalogo (va ricalcolata).
+        """
+        with np.load(path) as data:
+            proba, labels, track_ids = data["proba"], data["labels"], data["track_ids"]
+        if catalogo is not None and not np.array_equal(track_ids, catalogo.track_ids):
+            raise ValueError(f"La matrice '{path}' non corrisponde al catalogo: ricalcolarla.")
+        return cls(proba, labels, track_ids)
+
+    def salva(self, path=PROBA_PATH):
+        """
+        Salva la matrice in formato `.npz` (scrittura atomica).
+
+        Args:
+            path (str): File di destinazione.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, proba=self.proba, labels=self.labels.astype(str),
+                 track_ids=self.track_ids)
+        os.replace(tmp_path, path)
+
+    def mood(self, pos):
+        """Mood più probabile della traccia in posizione `pos` (come `model.predict`)."""
+        return self.labels[int(np.argmax(self.proba[pos]))]
+
+    def distanze_hellinger(self, pos, positions):
+        """
+        Distanza di Hellinger tra la distribuzione del mood di una traccia e quelle delle
+        candidate.
+
+        Args:
+            pos (int): Posizione della traccia di riferimento.
+            positions (np.ndarray): Posizioni delle candidate.
+
+        Returns:
+            np.ndarray: Distanze in [0, 1] (float32), una per candidata.
+        """
+        bc = self.radici[positions] @ self.radici[pos]
+        return np.sqrt(np.clip(1 - bc, 0, 1))
+
+def calcola_probabilita(catalogo, model, mood_encoder):
+    """
+    Calcola le probabilità del mood di tutte le tracce con `predict_proba`, a blocchi.
+
+    Args:
+        catalogo (Catalogo): Catalogo delle tracce.
+        model: Classificatore con `predict_proba` (es. RandomForest).
+        mood_encoder (LabelEncoder): Codifica dei mood usata in addestramento.
+
+    Returns:
+        ProbabilitaMood: Matrice calcolata.
+    """
+    proba = np.empty((len(catalogo), len(model.classes_)), dtype=np.float32)
+    for start in range(0, len(catalogo), BLOCK_SIZE):
+        positions = np.arange(start, min(start + BLOCK_SIZE, len(catalogo)))
+        proba[positions] = model.predict_proba(catalogo.matrice(features_model, positions))
+    labels = mood_encoder.inverse_transform(model.classes_)
+    return ProbabilitaMood(proba, labels, catalogo.track_ids)
+
+def build_mood_probabilities(df=None, model_path=MODEL_PATH, output=PROBA_PATH):
+    """
+    Calcola le probabilità del mood per tutto il catalogo e le salva in `output`.
+
+    Args:
+        df (pd.DataFrame | None): Tracce già caricate in memoria; se None viene letto
+            `CATALOG_PATH`. Il DataFrame non viene modificato.
+        model_path (str): Percorso del classificatore (modello, LabelEncoder del mood).
+        output (str): Percorso del file `.npz`.
+
+    Returns:
+        ProbabilitaMood: Matrice calcolata.
+    """
+    catalogo = Catalogo(df) if df is not None else Catalogo.da_csv(CATALOG_PATH)
+    with open(model_path, "rb") as f:
+        model, mood_encoder = pickle.load(f)
+
+    start = time.perf_counter()
+    with span("probabilita.predict_proba"):
+        probabilita = calcola_probabilita(catalogo, model, mood_encoder)
+    elapsed = time.perf_counter() - start
+    probabilita.salva(output)
+
+    massime = probabilita.proba.max(axis=1)
+    print(f"Probabilità del mood salvate in: {output}")
+    print(f"Tracce: {len(catalogo)}, mood: {', '.join(probabilita.labels)}, "
+          f"{probabilita.proba.nbytes / 1e6:.1f} MB, calcolo in {elapsed:.1f}s")
+    print(f"Tracce di confine (probabilità massima < {BORDERLINE}): "
+          f"{int((massime < BORDERLINE).sum())}")
+    return probabilita
+
+# Test manuale
+if __name__ == "__main__":
+    build_mood_probabilities()
@@ -0,0 +1,197 @@
+"""
+Cache dei risultati delle query simboliche, legata alla versione della knowledge base.
+
+Le soluzioni decodificate di ciascun goal vengono memorizzate una sola volta e riutilizzate
+finché `knowledge_base.pl` e `rules.pl` non cambiano: la versione della cache è l'hash
+SHA-256 dei due file, e un cambio di versione invalida tutte le voci.
+
+Il motore Prolog tiene in memoria la KB consultata all'avvio, non quella su disco: la
+versione iniziale è quindi l'hash registrato al momento del consult e, quando i file
+cambiano, la cache ricarica la KB nel motore (callback `ricarica`) prima di servire o
+memorizzare nuove soluzioni.
+
+Funzionalità principali:
+- Eviction LRU con limite sulla memoria stimata occupata dalle soluzioni
+- Persistenza opzionale su disco (un file pickle per goal, in una cartella per versione)
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+def hash_files(paths):
+    """
+    Calcola un hash SHA-256 complessivo del contenuto di più file.
+
+    Args:
+        paths (list[str]): Percorsi dei file (quelli mancanti vengono ignorati).
+
+    Returns:
+        str: Hash esadecimale.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def stima_bytes(solutions):
+    """
+    Stima la memoria occupata da una lista di soluzioni (tuple di valori).
+
+    Args:
+        solutions (list[tuple]): Soluzioni decodificate.
+
+    Returns:
+        int: Numero di byte stimato.
+    """
+    total = sys.getsizeof(solutions)
+    for sol in solutions:
+        total += sys.getsizeof(sol) + sum(sys.getsizeof(val) for val in sol)
+    return total
+
+class CacheRisultati:
+    """
+    Cache LRU delle soluzioni dei goal Prolog, invalidata al cambio della KB.
+
+    Args:
+        source_paths (list[str]): File da cui dipendono i risultati (KB e regole).
+        max_bytes (int): Memoria massima stimata per le voci in memoria.
+        cache_dir (str | None): Cartella per la persistenza su disco; None la disabilita.
+        versione_caricata (str | None): Hash dei file registrato quando sono stati
+            caricati nel motore; None lo calcola alla prima richiesta.
+        ricarica (callable | None): Ricarica i file nel motore quando cambiano e
+            restituisce l'hash di ciò che ha caricato.
+    """
+
+    def __init__(self, source_paths, max_bytes=256 * 1024 * 1024, cache_dir=None,
+                 versione_caricata=None, ricarica=None):
+        self.source_paths = list(source_paths)
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.ricarica = ricarica
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._version = versione_caricata
+        self.hits = 0
+        self.misses = 0
+
+    def versione(self):
+        """
+        Restituisce la versione della KB caricata nel motore, ricalcolando l'hash solo se
+        dimensione o data di modifica dei file sono cambiate.
+
+        Se l'hash su disco differisce da quello caricato, le voci in memoria vengono
+        invalidate e i file ricaricati con `ricarica` (se presente): la versione
+        restituita corrisponde sempre alla KB su cui verranno eseguite le query.
+
+        Returns:
+            str: Hash della KB e delle regole.
+        """
+        stamp = tuple(
+            (os.path.getsize(p), os.path.getmtime(p)) if os.path.exists(p) else None
+            for p in self.source_paths
+        )
+        with self._lock:
+            if stamp != self._stamp:
+                version = hash_files(self.source_paths)
+                if version != self._version:
+                    self._entries.clear()
+                    self._bytes = 0
+                    if self._version is not None and self.ricarica is not None:
+                        version = self.ricarica()
+                self._stamp, self._version = stamp, version
+            return self._version
+
+    def _disk_path(self, version, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".pkl"
+        return os.path.join(self.cache_dir, version[:16], name)
+
+    def get(self, key):
+        """
+        Restituisce le soluzioni memorizzate per una chiave, o None se assenti.
+
+        Args:
+            key (tuple): Chiave del goal (es. testo del goal e variabili).
+
+        Returns:
+            list[tuple] | None: Soluzioni memorizzate.
+        """
+        version = self.versione()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+        if self.cache_dir is not None:
+            path = self._disk_path(version, key)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    solutions = pickle.load(f)
+                self._store(key, solutions)
+                with self._lock:
+                    self.hits += 1
+                return solutions
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, solutions, version=None):
+        """
+        Memorizza le soluzioni di una chiave (e le salva su disco se abilitato).
+
+        Args:
+            key (tuple): Chiave del goal.
+            solutions (list[tuple]): Soluzioni decodificate.
+            version (str | None): Versione della KB su cui sono state calcolate le
+                soluzioni; se nel frattempo è cambiata, le soluzioni non vengono memorizzate.
+        """
+        current = self.versione()
+        if version is not None and version != current:
+            return
+        version = current
+        self._store(key, solutions)
+        if self.cache_dir is not None:
+            path = self._disk_path(version, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(solutions, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def _store(self, key, solutions):
+        """Inserisce una voce in memoria ed esegue l'eviction LRU oltre `max_bytes`."""
+        size = stima_bytes(solutions)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (solutions, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stato(self):
+        """
+        Restituisce le statistiche della cache.
+
+        Returns:
+            dict: Voci, memoria stimata, hit e miss.
+        """
+        with self._lock:
+            return {
+                "voci": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,192 @@
+"""
+Pool di worker Prolog precaricati per servire raccomandazioni simboliche in concorrenza.
+
+Ogni worker è un processo separato che, all'avvio, importa `prolog_recommender` e quindi
+carica una sola volta la knowledge base (preferendo la versione precompilata `.qlf`) e le
+regole. Le query successive non pagano più il caricamento della KB.
+
+Funzionalità principali:
+- Invio delle query ai worker tramite `ProcessPoolExecutor`
+- Timeout per query applicato lato Prolog (`call_with_time_limit/2`): è l'unico limite che
+  interrompe davvero una query e libera il worker; lato Python il chiamante smette solo di
+  attendere (una query già inviata a un processo non può essere annullata)
+- Monitoraggio della coda (query inviate e non ancora concluse)
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Funzioni di `prolog_recommender` invocabili tramite il pool
+QUERY_FUNCTIONS = (
+    "recommend_by_mood", "relaxing_tracks", "energetic_tracks",
+    "danceable_tracks", "happy_tracks_high_valence", "similar_tracks",
+)
+
+# Margine (secondi) concesso al worker oltre il timeout Prolog prima di abbandonare l'attesa
+TIMEOUT_MARGIN = 1.0
+
+def _init_worker():
+    """Inizializza un worker importando `prolog_recommender` (che carica KB e regole)."""
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    if module_dir not in sys.path:
+        sys.path.insert(0, module_dir)
+    import prolog_recommender
+
+def _run_query(name, args, kwargs, timeout):
+    """
+    Esegue una funzione di `prolog_recommender` nel worker.
+
+    Raises:
+        TimeoutError: Se la query supera il limite di tempo lato Prolog.
+    """
+    import prolog_recommender
+    prolog_recommender.QUERY_TIMEOUT = timeout
+    try:
+        return getattr(prolog_recommender, name)(*args, **kwargs)
+    except Exception as e:
+        if "time_limit_exceeded" in str(e):
+            raise TimeoutError(f"Query '{name}' oltre il limite di {timeout}s") from None
+        raise
+
+class PrologPool:
+    """
+    Front end per un pool di worker Prolog con la knowledge base già caricata.
+
+    Args:
+        n_workers (int): Numero di processi worker (default: numero di CPU).
+        timeout (float | None): Timeout predefinito per query, in secondi.
+    """
+
+    def __init__(self, n_workers=None, timeout=10.0):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.chiudi()
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def invia(self, name, *args, timeout=None, **kwargs):
+        """
+        Accoda una query e restituisce subito il relativo Future.
+
+        Args:
+            name (str): Nome della funzione di `prolog_recommender` (vedi `QUERY_FUNCTIONS`).
+            *args: Argomenti posizionali della funzione.
+            timeout (float | None): Timeout della query (default: quello del pool).
+            **kwargs: Argomenti nominali della funzione.
+
+        Returns:
+            concurrent.futures.Future: Risultato futuro della query.
+
+        Raises:
+            ValueError: Se la funzione richiesta non è tra quelle ammesse.
+        """
+        if name not in QUERY_FUNCTIONS:
+            raise ValueError(f"Query non supportata: {name}")
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(_run_query, name, args, kwargs, timeout)
+        future.add_done_callback(self._done)
+        return future
+
+    def esegui(self, name, *args, timeout=None, **kwargs):
+        """
+        Esegue una query e ne attende il risultato.
+
+        Il limite che interrompe la query è quello applicato lato Prolog nel worker. Il
+        chiamante smette comunque di attendere dopo `timeout + TIMEOUT_MARGIN` secondi
+        dall'invio (tempo in coda incluso): la query non viene annullata, termina (al più
+        entro il limite Prolog dal suo avvio) e resta conteggiata in `stato` fino ad allora.
+
+        Raises:
+            TimeoutError: Se la query non termina entro il limite.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = self.invia(name, *args, timeout=timeout, **kwargs)
+        try:
+            return future.result(None if timeout is None else timeout + TIMEOUT_MARGIN)
+        except FutureTimeoutError:
+            raise TimeoutError(f"Query '{name}' oltre il limite di {timeout}s") from None
+
+    def stato(self):
+        """
+        Restituisce lo stato della coda.
+
+        Il conteggio esatto è quello delle query inviate e non ancora concluse (comprese
+        quelle il cui chiamante ha smesso di attendere): la suddivisione tra query in
+        esecuzione e in attesa è stimata, assumendo che ogni worker esegua una query
+        finché ce ne sono.
+
+        Returns:
+            dict: Numero di worker, query non concluse, query stimate in esecuzione e in
+            attesa.
+        """
+        with self._lock:
+            pending = self._pending
+        return {
+            "workers": self.n_workers,
+            "inviate": pending,
+            "in_corso": min(pending, self.n_workers),
+            "in_coda": max(0, pending - self.n_workers),
+        }
+
+    def chiudi(self):
+        """Termina i worker dopo il completamento delle query accodate."""
+        self._executor.shutdown(wait=True)
+
+def main():
+    """
+    Demo: invia in concorrenza un blocco di query per mood e stampa tempi e stato della coda.
+    """
+    parser = argparse.ArgumentParser(description="Pool di worker Prolog")
+    parser.add_argument("--workers", type=int, default=None, help="numero di worker")
+    parser.add_argument("--queries", type=int, default=100, help="numero di query da inviare")
+    parser.add_argument("--timeout", type=float, default=10.0, help="timeout per query (s)")
+    args = parser.parse_args()
+
+    moods = ["felice", "triste", "energetico", "aggressivo", "altro"]
+    with PrologPool(args.workers, timeout=args.timeout) as pool:
+        # Attende il caricamento della KB in tutti i worker
+        start = time.perf_counter()
+        warmup = [pool.invia("recommend_by_mood", "felice", limit=1) for _ in range(pool.n_workers)]
+        for future in warmup:
+            future.result()
+        print(f"Worker pronti in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        futures = [
+            pool.invia("recommend_by_mood", moods[i % len(moods)])
+            for i in range(args.queries)
+        ]
+        print(f"Stato dopo l'invio: {pool.stato()}")
+        errors = 0
+        for future in futures:
+            try:
+                future.result()
+            except TimeoutError:
+                errors += 1
+        elapsed = time.perf_counter() - start
+        print(f"{args.queries} query in {elapsed:.2f}s "
+              f"({args.queries / elapsed:.1f} query/s, {errors} in timeout)")
+
+if __name__ == "__main__":
+    main()
@@ -9,96 +9,255 @@ Funzionalità principali:
     - energia (alta/bassa)
     - valence
     - danceability
+    - similarità tra tracce per feature (join a finestra su tutta la KB)
+- Campionamento casuale uniforme dei risultati lato Prolog, riproducibile tramite seed
+- Cache opzionale dei risultati per goal, legata alla versione di KB e regole
 - Stampa dei risultati in forma leggibile
 """
 
 from pyswip import Prolog
 import os
 import random
+from prolog_cache import CacheRisultati, hash_files
+try:
+    from instrumentation import incrementa, span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+    def incrementa(name, value=1):
+        pass
 
 # Inizializzazione motore Prolog
 prolog = Prolog()
 
 # Caricamento della knowledge base e delle regole
 kb_path = os.path.abspath("prolog/knowledge_base.pl").replace("\\", "/")
+qlf_path = os.path.abspath("prolog/knowledge_base.qlf").replace("\\", "/")
 rules_path = os.path.abspath("prolog/rules.pl").replace("\\", "/")
 
-list(prolog.query(f"consult('{kb_path}')"))
-list(prolog.query(f"consult('{rules_path}')"))
+def carica_knowledge_base(engine):
+    """
+    Carica la knowledge base nel motore Prolog.
+
+    Se esiste una versione precompilata (`.qlf`) più recente del sorgente `.pl`,
+    viene caricata quella; in caso di errore (es. versione di SWI-Prolog diversa)
+    si ripiega sul consult del sorgente.
+
+    Args:
+        engine (pyswip.Prolog): Motore Prolog in cui caricare la KB.
+    """
+    if os.path.exists(qlf_path) and os.path.getmtime(qlf_path) >= os.path.getmtime(kb_path):
+        try:
+            with span("prolog.carica_kb", formato="qlf"):
+                list(engine.query(f"load_files('{qlf_path}', [])"))
+            return
+        except Exception as e:
+            print(f"Caricamento di {qlf_path} fallito ({e}), uso il sorgente .pl")
+    with span("prolog.carica_kb", formato="pl"):
+        list(engine.query(f"consult('{kb_path}')"))
+
+def carica_sorgenti():
+    """
+    Carica (o ricarica) knowledge base e regole nel motore Prolog.
+
+    L'hash dei file viene calcolato prima del caricamento, così corrisponde a ciò che il
+    motore ha in memoria: se i file cambiano durante il consult, la versione successiva
+    risulterà diversa e la KB verrà ricaricata di nuovo.
+
+    Returns:
+        str: Hash di KB e regole caricate.
+    """
+    version = hash_files([kb_path, rules_path])
+    carica_knowledge_base(prolog)
+    with span("prolog.carica_regole"):
+        list(prolog.query(f"consult('{rules_path}')"))
+    return version
+
+# Versione di KB e regole attualmente caricate nel motore
+versione_caricata = carica_sorgenti()
+
+# Limite di tempo (secondi) applicato a ogni query da `campiona`; None = nessun limite
+QUERY_TIMEOUT = None
+
+# Cache dei risultati per goal (disattivata finché non viene chiamata `abilita_cache`)
+cache = None
+
+def abilita_cache(max_bytes=256 * 1024 * 1024, cache_dir=None):
+    """
+    Abilita la cache dei risultati delle query, legata alla versione di KB e regole.
+
+    Con la cache attiva, `campiona` recupera una sola volta tutte le soluzioni di un goal
+    e ne estrae i campioni in Python dall'insieme memorizzato. Se KB o regole cambiano su
+    disco, vengono ricaricate nel motore prima di servire o memorizzare nuove soluzioni.
+
+    Args:
+        max_bytes (int): Memoria massima stimata della cache (default: 256 MB).
+        cache_dir (str | None): Cartella per la persistenza su disco (default: nessuna).
+
+    Returns:
+        CacheRisultati: Cache abilitata.
+    """
+    global cache
+    cache = CacheRisultati([kb_path, rules_path], max_bytes=max_bytes, cache_dir=cache_dir,
+                           versione_caricata=versione_caricata, ricarica=ricarica_sorgenti)
+    return cache
+
+def ricarica_sorgenti():
+    """Ricarica KB e regole nel motore e aggiorna `versione_caricata`."""
+    global versione_caricata
+    versione_caricata = carica_sorgenti()
+    return versione_caricata
 
 # --- Utility per decodifica ---
 def decode_if_bytes(val):
     """Converte valori in stringa se in formato bytes."""
     return val.decode("utf-8") if isinstance(val, bytes) else val
 
+def campiona(goal, limit=10, seed=None, variables=("Track", "Artist"), timeout=None):
+    """
+    Restituisce un campione casuale uniforme di `limit` soluzioni di un goal.
+
+    Senza cache il campionamento avviene lato Prolog tramite `sample_solutions/5`
+    (vedi `rules.pl`): le soluzioni non vengono materializzate né convertite in Python,
+    ad eccezione di quelle estratte. Con la cache abilitata il campione viene estratto
+    dall'insieme di soluzioni memorizzato per il goal.
+
+    Args:
+        goal (str): Goal Prolog con le variabili indicate in `variables`.
+        limit (int): Dimensione massima del campione.
+        seed (int | None): Seme per un campionamento riproducibile.
+        variables (tuple[str, ...]): Variabili del goal da restituire
+            (default: `Track` e `Artist`).
+        timeout (float | None): Limite di tempo in secondi, applicato lato Prolog con
+            `call_with_time_limit/2` (default: `QUERY_TIMEOUT`).
+
+    Returns:
+        list[tuple]: Una tupla di valori per ciascuna soluzione estratta.
+    """
+    template = "[" + ", ".join(variables) + "]"
+    timeout = QUERY_TIMEOUT if timeout is None else timeout
+
+    if cache is not None:
+        key = (goal, tuple(variables))
+        version = cache.versione()
+        solutions = cache.get(key)
+        incrementa("prolog.cache_hit" if solutions is not None else "prolog.cache_miss")
+        if solutions is None:
+            solutions = esegui_query(f"findall({template}, ({goal}), Sample)", timeout)
+            cache.put(key, solutions, version)
+        return random.Random(seed).sample(solutions, min(int(limit), len(solutions)))
+
+    seed_term = "none" if seed is None else int(seed)
+    return esegui_query(
+        f"sample_solutions({template}, ({goal}), {int(limit)}, {seed_term}, Sample)", timeout
+    )
+
+def esegui_query(query, timeout=None):
+    """
+    Esegue una query che lega `Sample` a una lista di soluzioni e le decodifica.
+
+    Args:
+        query (str): Query Prolog con la variabile di output `Sample`.
+        timeout (float | None): Limite di tempo in secondi (`call_with_time_limit/2`).
+
+    Returns:
+        list[tuple]: Una tupla di valori per ciascuna soluzione.
+    """
+    if timeout is not None:
+        query = f"call_with_time_limit({float(timeout)}, {query})"
+    with span("prolog.query"):
+        solutions = list(prolog.query(query, maxresult=1))
+    incrementa("prolog.query")
+    if not solutions:
+        return []
+    with span("prolog.decodifica"):
+        rows = [
+            tuple(decode_if_bytes(val) for val in sol)
+            for sol in solutions[0]["Sample"]
+        ]
+    incrementa("prolog.soluzioni", len(rows))
+    return rows
+
+def atomo_mood(mood):
+    """Converte il mood inserito dall'utente in un atomo Prolog quotato."""
+    return "'" + mood.strip().lower().replace("\\", "").replace("'", "") + "'"
+
 # --- Raccomandazioni simboliche (Track, Artist) ---
 
-def recommend_by_mood(mood, limit=10):
+def recommend_by_mood(mood, limit=10, seed=None):
     """
     Restituisce tracce con artista per il mood specificato.
 
     Args:
         mood (str): Mood richiesto (es. 'felice', 'triste').
         limit (int): Numero massimo di tracce (default: 10).
+        seed (int | None): Seme per un campionamento riproducibile.
 
     Returns:
         list[tuple[str, str]]: Lista di (Track, Artist)
     """
-    query = f'recommend_by_mood({mood}, Track, Artist)'
-    results = [
-        (decode_if_bytes(sol['Track']), decode_if_bytes(sol['Artist']))
-        for sol in prolog.query(query)
-    ]
-    random.shuffle(results)
-    return results[:limit]
+    return campiona(f"recommend_by_mood({atomo_mood(mood)}, Track, Artist)", limit, seed)
 
-def relaxing_tracks(limit=10):
+def relaxing_tracks(limit=10, seed=None):
     """
     Restituisce tracce rilassanti (energia ≤ 0.5) con artista.
     """
-    query = 'is_relaxing(Track, Artist)'
-    results = [
-        (decode_if_bytes(sol['Track']), decode_if_bytes(sol['Artist']))
-        for sol in prolog.query(query)
-    ]
-    random.shuffle(results)
-    return results[:limit]
+    return campiona("is_relaxing(Track, Artist)", limit, seed)
 
-def energetic_tracks(limit=10):
+def energetic_tracks(limit=10, seed=None):
     """
     Restituisce tracce energetiche (energia ≥ 0.75) con artista.
     """
-    query = 'is_energetic(Track, Artist)'
-    results = [
-        (decode_if_bytes(sol['Track']), decode_if_bytes(sol['Artist']))
-        for sol in prolog.query(query)
-    ]
-    random.shuffle(results)
-    return results[:limit]
+    return campiona("is_energetic(Track, Artist)", limit, seed)
 
-def danceable_tracks(limit=10):
+def danceable_tracks(limit=10, seed=None):
     """
     Restituisce tracce danceable (danceability ≥ 0.7) con artista.
     """
-    query = 'is_danceable(Track, Artist)'
-    results = [
-        (decode_if_bytes(sol['Track']), decode_if_bytes(sol['Artist']))
-        for sol in prolog.query(query)
-    ]
-    random.shuffle(results)
-    return results[:limit]
+    return campiona("is_danceable(Track, Artist)", limit, seed)
 
-def happy_tracks_high_valence(limit=10):
+def happy_tracks_high_valence(limit=10, seed=None):
     """
     Restituisce tracce felici con valence > 0.8 e artista.
     """
-    query = 'happy_track_with_high_valence(Track, Artist)'
-    results = [
-        (decode_if_bytes(sol['Track']), decode_if_bytes(sol['Artist']))
-        for sol in prolog.query(query)
-    ]
-    random.shuffle(results)
-    return results[:limit]
+    return campiona("happy_track_with_high_valence(Track, Artist)", limit, seed)
+
+# Feature numeriche confrontabili da `similar_tracks_by_feature/5`
+SIMILARITY_FEATURES = ("danceability", "energy", "valence", "tempo")
+
+def similar_tracks(feature="energy", max_diff=0.1, max_per_track=3, limit=10, seed=None):
+    """
+    Restituisce coppie di tracce simili per una feature, calcolate su tutta la KB.
+
+    Usa il join a finestra scorrevole di `similar_tracks_by_feature/5`: le tracce sono
+    ordinate per valore e ciascuna è confrontata solo con le successive entro `max_diff`,
+    fino a `max_per_track` vicini.
+
+    Args:
+        feature (str): Feature da confrontare (una di `SIMILARITY_FEATURES`).
+        max_diff (float): Differenza massima tra i valori (default: 0.1).
+        max_per_track (int): Numero massimo di coppie per traccia (default: 3).
+        limit (int): Numero massimo di coppie restituite (default: 10).
+        seed (int | None): Seme per un campionamento riproducibile.
+
+    Returns:
+        list[tuple[str, str]]: Lista di (Track1, Track2)
+
+    Raises:
+        ValueError: Se la feature non è supportata.
+    """
+    if feature not in SIMILARITY_FEATURES:
+        raise ValueError(f"Feature non supportata: {feature}")
+    goal = (
+        f"similar_tracks_by_feature({feature}, {float(max_diff)}, {int(max_per_track)}, "
+        "Track1, Track2)"
+    )
+    return campiona(goal, limit, seed, variables=("Track1", "Track2"))
 
 # --- Stampa ordinata dei risultati ---
 
@@ -124,7 +283,9 @@ def main():
     Interfaccia a riga di comando per l'utente.
 
     Consente di interrogare il sistema simbolico su base mood, energia, valence, danceability.
+    I risultati delle query vengono memorizzati in cache finché KB e regole non cambiano.
     """
+    abilita_cache()
     while True:
         print("\n=== Menu Raccomandatore Simbolico ===")
         print("1. Raccomanda per mood")
@@ -132,6 +293,7 @@ def main():
         print("3. Tracce energetiche (energia ≥ 0.75)")
         print("4. Tracce danceable (danceability ≥ 0.7)")
         print("5. Tracce felici con valence > 0.8")
+        print("6. Coppie di tracce simili per feature")
         print("0. Esci")
         choice = input("Scegli un'opzione: ")
 
@@ -146,6 +308,12 @@ def main():
             stampa_elenco("Tracce danceable", danceable_tracks())
         elif choice == "5":
             stampa_elenco("Tracce felici con valence alto", happy_tracks_high_valence())
+        elif choice == "6":
+            feature = input(f"Feature ({', '.join(SIMILARITY_FEATURES)}): ").strip() or "energy"
+            if feature in SIMILARITY_FEATURES:
+                stampa_elenco(f"Coppie simili per {feature}", similar_tracks(feature))
+            else:
+                print("Feature non valida.")
         elif choice == "0":
             break
         else:
@@ -0,0 +1,176 @@
+"""
+Punteggio approssimato delle candidate su una copia quantizzata a 8 bit delle feature.
+
+Le feature secondarie, moltiplicate per la radice dei pesi di `similarita.feature_weights`,
+vengono scalate per colonna sull'intervallo [min, max] e memorizzate in uint8 (7 byte per
+traccia invece di 28 in float32). La ricerca avviene in due passi:
+1. passo grossolano sui codici uint8: la distanza è stimata tra il vettore della traccia di
+   partenza (non quantizzato) e i codici delle candidate, leggendo solo la copia compatta;
+2. le migliori `shortlist` candidate vengono riordinate con la distanza pesata esatta
+   (`similarita.distanze_pesate`), con lo stesso ordinamento di `raccomanda_simili`.
+
+Il passo grossolano è utile soprattutto nel ripiego sul solo mood, che valuta una grande
+parte del catalogo ed è limitato dalla banda di memoria.
+
+Esempio:
+    python recommender/quantizzazione.py --queries 200 --top-n 5
+    # riporta recall@N rispetto alla ricerca esatta e i tempi dei due metodi
+"""
+
+import argparse
+import time
+import numpy as np
+from catalogo import Catalogo
+from similarita import distanze_pesate, feature_weights, secondary_features
+
+# Percorso predefinito del catalogo
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+
+# Candidate minime riordinate con la distanza esatta (e multiplo del top-N richiesto)
+SHORTLIST_MIN = 64
+SHORTLIST_FACTOR = 10
+
+class FeatureQuantizzate:
+    """
+    Copia uint8 delle feature secondarie pesate del catalogo.
+
+    Args:
+        catalogo (Catalogo): Catalogo delle tracce.
+    """
+
+    def __init__(self, catalogo):
+        self.catalogo = catalogo
+        cols = [catalogo.feature_pos[feat] for feat in secondary_features]
+        weights = np.array([feature_weights[feat] for feat in secondary_features],
+                           dtype=np.float32)
+        self.scale = np.sqrt(weights)
+        weighted = catalogo.features[:, cols] * self.scale
+        self.minimum = weighted.min(axis=0)
+        span = weighted.max(axis=0) - self.minimum
+        self.step = np.where(span > 0, span / 255, 1).astype(np.float32)
+        self.codes = np.ascontiguousarray(
+            np.rint((weighted - self.minimum) / self.step).clip(0, 255).astype(np.uint8)
+        )
+
+    @property
+    def nbytes(self):
+        """Memoria occupata dai codici, in byte."""
+        return self.codes.nbytes
+
+    def distanze_approssimate(self, positions, x_input):
+        """
+        Stima la distanza pesata tra una traccia e le candidate usando i codici uint8.
+
+        Args:
+            positions (np.ndarray): Posizioni delle candidate nel catalogo.
+            x_input (np.ndarray): Feature secondarie della traccia di riferimento.
+
+        Returns:
+            np.ndarray: Distanze al quadrato stimate, in unità di quantizzazione.
+        """
+        query = (np.asarray(x_input, dtype=np.float32) * self.scale - self.minimum) / self.step
+        diff = self.codes[positions] - query
+        return np.einsum("ij,ij->i", diff * self.step, diff * self.step)
+
+    def top_n(self, positions, x_input, top_n, shortlist=None):
+        """
+        Restituisce le `top_n` candidate più vicine: passo grossolano e riordino esatto.
+
+        Args:
+            positions (np.ndarray): Posizioni delle candidate nel catalogo (crescenti).
+            x_input (np.ndarray): Feature secondarie della traccia di riferimento.
+            top_n (int): Numero di risultati.
+            shortlist (int | None): Candidate riordinate con la distanza esatta
+                (default: max(`SHORTLIST_MIN`, `SHORTLIST_FACTOR` × top_n)).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Posizioni e distanze esatte dei risultati,
+            ordinate per (distanza, posizione).
+        """
+        positions = np.asarray(positions)
+        shortlist = shortlist or max(SHORTLIST_MIN, SHORTLIST_FACTOR * top_n)
+        if len(positions) > shortlist:
+            coarse = self.distanze_approssimate(positions, x_input)
+            positions = np.sort(positions[np.argpartition(coarse, shortlist - 1)[:shortlist]])
+        distances = distanze_pesate(self.catalogo, positions, x_input)
+        order = np.lexsort((positions, distances))[:top_n]
+        return positions[order], distances[order]
+
+def top_n_esatto(catalogo, positions, x_input, top_n):
+    """
+    Restituisce le `top_n` candidate più vicine con la sola distanza esatta.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Posizioni e distanze, ordinate per (distanza, posizione).
+    """
+    distances = distanze_pesate(catalogo, positions, x_input)
+    order = np.lexsort((positions, distances))[:top_n]
+    return positions[order], distances[order]
+
+def report_recall(catalogo, n_queries=200, top_n=5, shortlist=None, seed=42):
+    """
+    Misura recall@N e tempi del punteggio quantizzato rispetto a quello esatto.
+
+    Le query usano come candidate tutte le tracce dello stesso mood (il caso del ripiego
+    di `raccomanda_simili`, il più costoso).
+
+    Args:
+        catalogo (Catalogo): Catalogo delle tracce.
+        n_queries (int): Numero di tracce di partenza estratte a caso.
+        top_n (int): Numero di risultati confrontati.
+        shortlist (int | None): Candidate riordinate con la distanza esatta.
+        seed (int): Seme per l'estrazione delle query.
+
+    Returns:
+        dict: recall@N medio e minimo, tempi medi (ms) e memoria delle due rappresentazioni.
+    """
+    quantized = FeatureQuantizzate(catalogo)
+    rng = np.random.default_rng(seed)
+    by_mood = {code: np.flatnonzero(catalogo.mood_codes == code)
+               for code in np.unique(catalogo.mood_codes)}
+
+    recalls, exact_s, approx_s = [], 0.0, 0.0
+    for pos in rng.integers(0, len(catalogo), n_queries):
+        candidates = by_mood[catalogo.mood_codes[pos]]
+        candidates = candidates[candidates != pos]
+        x_input = catalogo.vettore(pos, secondary_features)
+
+        start = time.perf_counter()
+        exact, _ = top_n_esatto(catalogo, candidates, x_input, top_n)
+        exact_s += time.perf_counter() - start
+        start = time.perf_counter()
+        approx, _ = quantized.top_n(candidates, x_input, top_n, shortlist)
+        approx_s += time.perf_counter() - start
+
+        if len(exact):
+            recalls.append(len(np.intersect1d(exact, approx)) / len(exact))
+
+    cols = [catalogo.feature_pos[feat] for feat in secondary_features]
+    return {
+        "query": n_queries,
+        "top_n": top_n,
+        "recall_medio": float(np.mean(recalls)) if recalls else None,
+        "recall_minimo": float(np.min(recalls)) if recalls else None,
+        "esatto_ms": exact_s * 1000 / n_queries,
+        "quantizzato_ms": approx_s * 1000 / n_queries,
+        "byte_float32": int(catalogo.features[:, cols].nbytes),
+        "byte_uint8": quantized.nbytes,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@N del punteggio quantizzato")
+    parser.add_argument("--queries", type=int, default=200, help="tracce di partenza")
+    parser.add_argument("--top-n", type=int, default=5, help="risultati confrontati")
+    parser.add_argument("--shortlist", type=int, default=None,
+                        help="candidate riordinate con la distanza esatta")
+    args = parser.parse_args()
+
+    report = report_recall(Catalogo.da_csv(CATALOG_PATH), args.queries, args.top_n,
+                           args.shortlist)
+    print(f"=== Punteggio quantizzato uint8 ({report['query']} query, mood intero) ===")
+    print(f"Recall@{report['top_n']}: medio {report['recall_medio']:.4f}, "
+          f"minimo {report['recall_minimo']:.4f}")
+    print(f"Tempo per query: esatto {report['esatto_ms']:.3f} ms, "
+          f"quantizzato {report['quantizzato_ms']:.3f} ms")
+    print(f"Feature: float32 {report['byte_float32'] / 2**20:.1f} MB, "
+          f"uint8 {report['byte_uint8'] / 2**20:.1f} MB")
@@ -0,0 +1,728 @@
+"""
+API di interrogazione unificata sui tre motori del progetto, con un piccolo pianificatore.
+
+La stessa richiesta logica (es. "tracce energetiche e felici") può essere risolta da:
+- `numpy`: maschere vettoriali sul catalogo compatto (`catalogo.py`);
+- `sparql`: `cerca_tracce` sull'ontologia, con l'indice degli intervalli se presente;
+- `prolog`: goal sulla knowledge base (`prolog_recommender.campiona`).
+
+Una richiesta è composta da filtri (mood, genere, intervalli numerici) e da regole. Le regole
+a soglia di `rules.pl` (`RULE_RANGES`) vengono tradotte in intervalli sulle feature, quindi
+sono eseguibili sul percorso vettoriale; le regole senza equivalente numerico
+(`SYMBOLIC_RULES`, es. il join di similarità) richiedono il motore Prolog.
+
+Il pianificatore elenca i piani capaci di rispondere e sceglie quello con il costo stimato
+minore, a partire dalle latenze registrate per backend e forma della richiesta (mediana
+delle ultime esecuzioni, con valori a priori `PRIOR_MS` finché non ci sono misure):
+- senza regole simboliche: un unico backend tra numpy, sparql (solo senza campionamento)
+  e prolog;
+- con regole simboliche: tutto in Prolog, oppure solo le regole in Prolog e i filtri
+  spinti sul percorso vettoriale.
+
+Le soluzioni Prolog (titolo e artista) vengono ricondotte alle tracce del catalogo e
+selezionate e formattate dal percorso vettoriale: a parità di richiesta ogni backend
+restituisce le stesse tracce (le prime per `track_id`, o lo stesso campione con un seme)
+con le stesse colonne.
+
+Un backend che non si riesce a caricare (es. `pyswip` o lo store mancanti) viene escluso e
+la richiesta passa al piano successivo.
+
+Esempio:
+    python recommender/query_planner.py --mood felice --rule energetic --explain
+    python recommender/query_planner.py --calibrate   # misura tutti i piani e salva le statistiche
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import deque
+from urllib.parse import unquote
+import numpy as np
+from catalogo import Catalogo
+try:
+    from instrumentation import incrementa, span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+    def incrementa(name, value=1):
+        pass
+
+# Radice del progetto (cartelle `prolog/` e `sparql/` dei backend simbolici)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Percorsi
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+STATS_PATH = "recommender/planner_stats.json"
+
+# Feature filtrabili per intervallo (comuni ai tre backend)
+RANGE_FEATURES = ("valence", "energy", "danceability", "tempo")
+
+# Regole a soglia di `rules.pl`: intervalli (sui valori arrotondati a 3 decimali della KB,
+# vedi le fasce di `regenerate_kb_prolog.py`) ed eventuale mood richiesto
+RULE_RANGES = {
+    "relaxing": ({"energy": (None, 0.5)}, None),
+    "energetic": ({"energy": (0.75, None)}, None),
+    "danceable": ({"danceability": (0.7, None)}, None),
+    "happy_high_valence": ({"valence": (0.801, None)}, "felice"),
+}
+
+# Goal Prolog delle regole (variabili Track e Artist)
+PROLOG_RULES = {
+    "relaxing": "is_relaxing(Track, Artist)",
+    "energetic": "is_energetic(Track, Artist)",
+    "danceable": "is_danceable(Track, Artist)",
+    "happy_high_valence": "happy_track_with_high_valence(Track, Artist)",
+}
+
+# Regole senza equivalente vettoriale: tracce con almeno un'altra traccia simile per la
+# feature (`track_with_similar/4`, differenza massima 0.1)
+SYMBOLIC_RULES = {
+    f"similar_{feat}": f"track_with_similar({feat}, 0.1, Track, Artist)"
+    for feat in RANGE_FEATURES
+}
+
+# Mezzo passo dell'arrotondamento della KB: round(x, 3) ≥ a  ⇔  x ≥ a - HALF_STEP
+HALF_STEP = 0.0005
+
+# Latenze a priori (ms) usate finché un backend non ha misure registrate
+PRIOR_MS = {"numpy": 5.0, "prolog": 50.0, "sparql": 100.0}
+
+# Misure conservate per (backend, forma della richiesta)
+STATS_WINDOW = 50
+
+# Soluzioni massime recuperate da Prolog quando i filtri vengono applicati dopo
+MAX_SYMBOLIC_SOLUTIONS = 1_000_000
+
+def richiesta(mood=None, genre=None, ranges=None, regole=(), limit=10, seed=None):
+    """
+    Costruisce e valida una richiesta per il pianificatore.
+
+    Args:
+        mood (str | None): Mood richiesto (es. 'felice').
+        genre (str | None): Genere richiesto.
+        ranges (dict[str, tuple[float | None, float | None]] | None): Intervalli inclusivi
+            per feature (chiavi di `RANGE_FEATURES`); un estremo None non viene filtrato.
+        regole (iterable[str]): Regole di `RULE_RANGES` o `SYMBOLIC_RULES`.
+        limit (int): Numero massimo di tracce (default: 10).
+        seed (int | None): Seme per un campione casuale riproducibile; None restituisce le
+            prime tracce in ordine di `track_id`.
+
+    Returns:
+        dict: Richiesta normalizzata.
+
+    Raises:
+        ValueError: Se una feature o una regola non è supportata.
+    """
+    ranges = dict(ranges or {})
+    for name in ranges:
+        if name not in RANGE_FEATURES:
+            raise ValueError(f"Feature non filtrabile: {name} (attese: {', '.join(RANGE_FEATURES)})")
+    regole = tuple(sorted(set(regole)))
+    for rule in regole:
+        if rule not in RULE_RANGES and rule not in SYMBOLIC_RULES:
+            raise ValueError(f"Regola non supportata: {rule}")
+    return {"mood": mood, "genre": genre, "ranges": ranges, "regole": regole,
+            "limit": int(limit), "seed": seed}
+
+def forma(req):
+    """
+    Forma della richiesta, chiave delle statistiche di latenza (filtri senza valori).
+
+    Args:
+        req (dict): Richiesta (vedi `richiesta`).
+
+    Returns:
+        str: Es. "mood,energy,regola:energetic".
+    """
+    parts = [key for key in ("mood", "genre") if req[key] is not None]
+    parts += sorted(req["ranges"])
+    parts += [f"regola:{rule}" for rule in req["regole"]]
+    if req["seed"] is not None:
+        parts.append("campione")
+    return ",".join(parts) or "tutte"
+
+def filtri_effettivi(req):
+    """
+    Traduce le regole a soglia in filtri: mood e intervalli sui valori originali.
+
+    Gli intervalli delle regole sono allargati di `HALF_STEP` per tenere conto
+    dell'arrotondamento della KB e intersecati con quelli espliciti.
+
+    Args:
+        req (dict): Richiesta (vedi `richiesta`).
+
+    Returns:
+        tuple[str | None, dict] | None: Mood e intervalli risultanti, o None se i vincoli
+        sono incompatibili (nessuna traccia può soddisfarli).
+    """
+    mood = req["mood"]
+    ranges = dict(req["ranges"])
+    for rule in req["regole"]:
+        if rule not in RULE_RANGES:
+            continue
+        bounds, rule_mood = RULE_RANGES[rule]
+        if rule_mood is not None:
+            if mood is not None and mood != rule_mood:
+                return None
+            mood = rule_mood
+        for name, (low, high) in bounds.items():
+            low = None if low is None else low - HALF_STEP
+            high = None if high is None else high + HALF_STEP
+            old_low, old_high = ranges.get(name, (None, None))
+            low = old_low if low is None else low if old_low is None else max(low, old_low)
+            high = old_high if high is None else high if old_high is None else min(high, old_high)
+            ranges[name] = (low, high)
+    return mood, ranges
+
+def solo_filtri(req):
+    """Copia della richiesta senza regole simboliche (la parte eseguibile in modo vettoriale)."""
+    regole = tuple(rule for rule in req["regole"] if rule not in SYMBOLIC_RULES)
+    return {**req, "regole": regole}
+
+def solo_simboliche(req):
+    """Copia della richiesta con le sole regole simboliche, senza filtri né campionamento."""
+    regole = tuple(rule for rule in req["regole"] if rule in SYMBOLIC_RULES)
+    return {"mood": None, "genre": None, "ranges": {}, "regole": regole,
+            "limit": MAX_SYMBOLIC_SOLUTIONS, "seed": None}
+
+class StatisticheLatenza:
+    """
+    Latenze registrate per (backend, forma della richiesta), con stima per mediana.
+
+    Args:
+        window (int): Misure conservate per chiave (default: `STATS_WINDOW`).
+    """
+
+    def __init__(self, window=STATS_WINDOW):
+        self.window = window
+        self.misure = {}
+
+    def registra(self, backend, forma_req, ms):
+        """Registra la latenza (ms) di un'esecuzione."""
+        key = f"{backend}|{forma_req}"
+        self.misure.setdefault(key, deque(maxlen=self.window)).append(float(ms))
+
+    def stima(self, backend, forma_req):
+        """
+        Stima la latenza (ms) di un backend per una forma di richiesta.
+
+        Usa la mediana delle misure della stessa forma; in mancanza, la mediana di tutte le
+        misure del backend; in mancanza anche di queste, `PRIOR_MS`.
+
+        Args:
+            backend (str): Nome del backend.
+            forma_req (str): Forma della richiesta (vedi `forma`).
+
+        Returns:
+            float: Latenza stimata in millisecondi.
+        """
+        samples = self.misure.get(f"{backend}|{forma_req}")
+        if samples:
+            return statistics.median(samples)
+        pooled = [ms for key, values in self.misure.items()
+                  if key.split("|", 1)[0] == backend for ms in values]
+        return statistics.median(pooled) if pooled else PRIOR_MS[backend]
+
+    def salva(self, path=STATS_PATH):
+        """Salva le misure in JSON (scrittura atomica)."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({key: list(values) for key, values in self.misure.items()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def carica(cls, path=STATS_PATH, window=STATS_WINDOW):
+        """Carica le misure salvate con `salva`; senza file restituisce statistiche vuote."""
+        stats = cls(window)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for key, values in json.load(f).items():
+                    stats.misure[key] = deque(values, maxlen=window)
+        return stats
+
+class BackendNumpy:
+    """
+    Percorso vettoriale: maschere booleane sul catalogo compatto.
+
+    Args:
+        path (str): Percorso di `clean_tracks.csv`.
+    """
+
+    nome = "numpy"
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._catalogo = None
+        self._chiavi_kb = None
+
+    def carica(self):
+        """Carica il catalogo al primo uso."""
+        if self._catalogo is None:
+            with span("planner.carica_catalogo"):
+                self._catalogo = Catalogo.da_csv(self.path)
+
+    @property
+    def catalogo(self):
+        """Catalogo compatto, caricato al primo uso."""
+        self.carica()
+        return self._catalogo
+
+    def supporta(self, req):
+        """Vero se la richiesta non contiene regole simboliche."""
+        return not any(rule in SYMBOLIC_RULES for rule in req["regole"])
+
+    def maschera(self, req):
+        """
+        Calcola le tracce che soddisfano i filtri della richiesta.
+
+        Args:
+            req (dict): Richiesta senza regole simboliche.
+
+        Returns:
+            np.ndarray: Maschera booleana sulle posizioni del catalogo.
+        """
+        c = self.catalogo
+        filtri = filtri_effettivi(req)
+        if filtri is None:
+            return np.zeros(len(c), dtype=bool)
+        mood, ranges = filtri
+        mask = np.ones(len(c), dtype=bool)
+        if mood is not None:
+            mask &= c.mood_codes == c.codice("mood", mood)
+        if req["genre"] is not None:
+            mask &= c.genre_codes == c.codice("genre", req["genre"])
+        for name, (low, high) in ranges.items():
+            column = c.features[:, c.feature_pos[name]]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        return mask
+
+    def seleziona(self, positions, limit, seed):
+        """Prime `limit` posizioni in ordine di `track_id`, o un campione casuale con `seed`."""
+        if seed is not None:
+            rng = np.random.default_rng(seed)
+            return np.sort(rng.choice(positions, min(limit, len(positions)), replace=False))
+        order = np.argsort(self.catalogo.track_ids[positions], kind="stable")
+        return positions[order[:limit]]
+
+    def righe(self, positions):
+        """
+        Converte posizioni del catalogo in righe del formato unificato.
+
+        Le feature float32 vengono riportate alle 6 cifre significative di `clean_tracks.csv`,
+        gli stessi valori esportati nell'ontologia.
+        """
+        c = self.catalogo
+        return [
+            {
+                "track_id": c.valore(pos, "track_id"),
+                "name": c.valore(pos, "track_name"),
+                "artist": c.valore(pos, "artists_name"),
+                "genre": c.valore(pos, "genre_name"),
+                "mood": c.valore(pos, "mood"),
+                **{feat: float(f"{c.valore(pos, feat):.6g}") for feat in RANGE_FEATURES},
+            }
+            for pos in positions
+        ]
+
+    def esegui(self, req):
+        """Esegue la richiesta con le maschere vettoriali."""
+        positions = np.flatnonzero(self.maschera(req))
+        incrementa("planner.numpy_candidati", len(positions))
+        return self.righe(self.seleziona(positions, req["limit"], req["seed"]))
+
+    def chiavi_kb(self):
+        """
+        Indice (titolo, artista) → posizioni, con le stringhe sanificate come nella KB.
+
+        Returns:
+            dict[tuple[str, str], list[int]]: Posizioni del catalogo per ciascuna coppia.
+        """
+        if self._chiavi_kb is None:
+            prolog_dir = os.path.join(ROOT_DIR, "prolog")
+            if prolog_dir not in sys.path:
+                sys.path.insert(0, prolog_dir)
+            from regenerate_kb_prolog import sanitize_column
+            import pandas as pd
+
+            c = self.catalogo
+            names = sanitize_column(pd.Series(c.names[c.name_codes]))
+            artists = sanitize_column(pd.Series(c.artist_labels[c.artist_codes]))
+            self._chiavi_kb = {}
+            for pos, key in enumerate(zip(names, artists)):
+                self._chiavi_kb.setdefault(key, []).append(pos)
+        return self._chiavi_kb
+
+    def posizioni_kb(self, soluzioni):
+        """
+        Riconduce soluzioni Prolog (titolo, artista) alle posizioni del catalogo.
+
+        Una coppia condivisa da più tracce le restituisce tutte: i filtri vanno quindi
+        riapplicati sul catalogo (vedi `BackendProlog.esegui`).
+
+        Args:
+            soluzioni (list[tuple[str, str]]): Coppie (Track, Artist).
+
+        Returns:
+            np.ndarray: Posizioni distinte, in ordine crescente.
+        """
+        chiavi = self.chiavi_kb()
+        positions = [pos for key in set(soluzioni) for pos in chiavi.get(key, ())]
+        return np.unique(np.array(positions, dtype=np.int64))
+
+class BackendSparql:
+    """Ontologia RDF interrogata con `cerca_tracce` (e l'indice degli intervalli, se presente)."""
+
+    nome = "sparql"
+
+    def __init__(self):
+        self._graph = None
+        self._index = None
+        self._cerca = None
+        self._prefix = None
+
+    def carica(self):
+        """Carica ontologia e indice al primo uso."""
+        if self._graph is None:
+            sparql_dir = os.path.join(ROOT_DIR, "sparql")
+            if sparql_dir not in sys.path:
+                sys.path.insert(0, sparql_dir)
+            from ontology_module import PREFIX, cerca_tracce, load_ontology
+            from range_index import load_range_index
+
+            with span("planner.carica_ontologia"):
+                self._graph = load_ontology()
+                self._index = load_range_index()
+            self._cerca, self._prefix = cerca_tracce, PREFIX
+
+    def supporta(self, req):
+        """Vero senza regole simboliche e senza campionamento (l'ordine SPARQL è per URI)."""
+        return req["seed"] is None and not any(rule in SYMBOLIC_RULES for rule in req["regole"])
+
+    def esegui(self, req):
+        """Esegue la richiesta come ricerca SPARQL con intervalli."""
+        self.carica()
+        filtri = filtri_effettivi(req)
+        if filtri is None:
+            return []
+        mood, ranges = filtri
+        rows = self._cerca(self._graph, mood=mood, genre=req["genre"], limit=req["limit"],
+                           index=self._index, **ranges)
+        prefix = len(f"{self._prefix}Track_")
+        return [
+            {"track_id": unquote(row["track"][prefix:]),
+             **{key: row[key] for key in ("name", "artist", "genre", "mood", *RANGE_FEATURES)}}
+            for row in rows
+        ]
+
+class BackendProlog:
+    """
+    Knowledge base Prolog interrogata con `campiona`.
+
+    Args:
+        numpy_backend (BackendNumpy): Percorso vettoriale usato per ricondurre le soluzioni
+            al catalogo, selezionarle e formattarle.
+    """
+
+    nome = "prolog"
+
+    def __init__(self, numpy_backend):
+        self.numpy_backend = numpy_backend
+        self._campiona = None
+        self._atomo_mood = None
+
+    def carica(self):
+        """Importa `prolog_recommender` (che carica KB e regole) al primo uso."""
+        self.numpy_backend.carica()
+        self.numpy_backend.chiavi_kb()
+        if self._campiona is None:
+            with span("planner.carica_prolog"):
+                from prolog_recommender import atomo_mood, campiona
+            self._campiona, self._atomo_mood = campiona, atomo_mood
+
+    def supporta(self, req):
+        """Prolog risolve qualsiasi richiesta."""
+        return True
+
+    def goal(self, req):
+        """
+        Traduce la richiesta in un goal Prolog con le variabili Track e Artist.
+
+        Le regole precedono i filtri: i fatti di fascia e i `mood_track` sono indicizzati
+        sul primo argomento, mentre gli intervalli richiedono una scansione di `track/8`.
+
+        Args:
+            req (dict): Richiesta (vedi `richiesta`).
+
+        Returns:
+            str: Goal Prolog.
+        """
+        parts = [PROLOG_RULES.get(rule) or SYMBOLIC_RULES[rule] for rule in req["regole"]]
+        if req["mood"] is not None:
+            parts.append(f"mood_track({self._atomo_mood(req['mood'])}, Track, Artist)")
+        if req["genre"] is not None or req["ranges"]:
+            genre = "_" if req["genre"] is None else \
+                '"' + req["genre"].replace("\\", "").replace('"', "") + '"'
+            parts.append(f"track(Track, Artist, {genre}, Danceability, Energy, Valence, Tempo, _)")
+            for name, (low, high) in sorted(req["ranges"].items()):
+                var = name.capitalize()
+                if low is not None:
+                    parts.append(f"{var} >= {float(low)}")
+                if high is not None:
+                    parts.append(f"{var} =< {float(high)}")
+        return ", ".join(parts) or "track(Track, Artist, _, _, _, _, _, _)"
+
+    def posizioni(self, req):
+        """
+        Risolve il goal della richiesta e ne restituisce le tracce nel catalogo.
+
+        Args:
+            req (dict): Richiesta (vedi `richiesta`).
+
+        Returns:
+            np.ndarray: Posizioni del catalogo delle soluzioni.
+        """
+        self.carica()
+        soluzioni = self._campiona(self.goal(req), MAX_SYMBOLIC_SOLUTIONS)
+        return self.numpy_backend.posizioni_kb(soluzioni)
+
+    def esegui(self, req):
+        """
+        Esegue la richiesta come goal Prolog; selezione e formato delle righe sono quelli del
+        percorso vettoriale. I filtri vengono ricontrollati sul catalogo per escludere le
+        tracce che condividono titolo e artista con una soluzione.
+        """
+        positions = self.posizioni(req)
+        positions = positions[self.numpy_backend.maschera(solo_filtri(req))[positions]]
+        numpy_backend = self.numpy_backend
+        return numpy_backend.righe(numpy_backend.seleziona(positions, req["limit"], req["seed"]))
+
+class PianificatoreQuery:
+    """
+    Sceglie ed esegue il piano più economico per ciascuna richiesta.
+
+    Args:
+        backends (list | None): Backend disponibili (default: numpy, prolog e sparql).
+        statistiche (StatisticheLatenza | None): Latenze registrate (default: quelle
+            salvate in `STATS_PATH`, se presenti).
+    """
+
+    def __init__(self, backends=None, statistiche=None):
+        if backends is None:
+            numpy_backend = BackendNumpy()
+            backends = [numpy_backend, BackendProlog(numpy_backend), BackendSparql()]
+        self.backends = {backend.nome: backend for backend in backends}
+        self.statistiche = statistiche if statistiche is not None else StatisticheLatenza.carica()
+        self.non_disponibili = {}
+
+    def piani(self, req):
+        """
+        Elenca i piani capaci di rispondere alla richiesta, con il costo stimato.
+
+        Un piano è una lista di passi (backend, richiesta parziale); il costo è la somma
+        delle latenze stimate dei passi.
+
+        Args:
+            req (dict): Richiesta (vedi `richiesta`).
+
+        Returns:
+            list[tuple[float, list[tuple[str, dict]]]]: Piani in ordine di costo crescente.
+        """
+        candidati = [[(nome, req)] for nome, backend in self.backends.items()
+                     if backend.supporta(req)]
+        if any(rule in SYMBOLIC_RULES for rule in req["regole"]) and "numpy" in self.backends:
+            candidati.append([("prolog", solo_simboliche(req)), ("numpy", solo_filtri(req))])
+
+        piani = []
+        for passi in candidati:
+            if any(nome in self.non_disponibili or nome not in self.backends for nome, _ in passi):
+                continue
+            costo = sum(self.statistiche.stima(nome, forma(parte)) for nome, parte in passi)
+            piani.append((costo, passi))
+        return sorted(piani, key=lambda piano: piano[0])
+
+    def spiega(self, req):
+        """
+        Descrive i piani considerati per la richiesta, dal più economico.
+
+        Args:
+            req (dict): Richiesta (vedi `richiesta`).
+
+        Returns:
+            str: Un piano per riga, con costo stimato e forma di ciascun passo.
+        """
+        lines = [f"Richiesta: {forma(req)}"]
+        for i, (costo, passi) in enumerate(self.piani(req)):
+            steps = " → ".join(f"{nome}[{forma(parte)}]" for nome, parte in passi)
+            lines.append(f"{'*' if i == 0 else ' '} {costo:8.1f} ms  {steps}")
+        for nome, motivo in self.non_disponibili.items():
+            lines.append(f"  (non disponibile: {nome}, {motivo})")
+        return "\n".join(lines)
+
+    def _passo(self, nome, parte, metodo="esegui"):
+        """Esegue un passo registrandone la latenza (escluso il caricamento del backend)."""
+        self.backends[nome].carica()
+        start = time.perf_counter()
+        with span("planner.passo", backend=nome):
+            rows = getattr(self.backends[nome], metodo)(parte)
+        self.statistiche.registra(nome, forma(parte), (time.perf_counter() - start) * 1000)
+        incrementa(f"planner.{nome}")
+        return rows
+
+    def _esegui_piano(self, req, passi):
+        """Esegue un piano a uno o due passi (regole in Prolog, filtri vettoriali)."""
+        if len(passi) == 1:
+            nome, parte = passi[0]
+            return self._passo(nome, parte)
+
+        (_, simboliche), (_, filtri) = passi
+        positions = self._passo("prolog", simboliche, "posizioni")
+        numpy_backend = self.backends["numpy"]
+        numpy_backend.carica()
+        start = time.perf_counter()
+        with span("planner.passo", backend="numpy"):
+            positions = positions[numpy_backend.maschera(filtri)[positions]]
+            rows = numpy_backend.righe(numpy_backend.seleziona(positions, req["limit"], req["seed"]))
+        self.statistiche.registra("numpy", forma(filtri), (time.perf_counter() - start) * 1000)
+        return rows
+
+    def esegui(self, req, backend=None):
+        """
+        Esegue la richiesta con il piano più economico (o con il backend indicato).
+
+        Se un backend non si carica (dipendenza o artefatto mancante) viene escluso e si
+        passa al piano successivo.
+
+        Args:
+            req (dict): Richiesta (vedi `richiesta`).
+            backend (str | None): Forza un backend a passo singolo.
+
+        Returns:
+            tuple[list[dict], str]: Righe (stesse colonne per tutti i backend) e
+            descrizione del piano eseguito.
+
+        Raises:
+            ValueError: Se nessun piano disponibile può rispondere alla richiesta.
+        """
+        piani = self.piani(req)
+        if backend is not None:
+            piani = [(costo, passi) for costo, passi in piani
+                     if len(passi) == 1 and passi[0][0] == backend]
+        for _, passi in piani:
+            try:
+                rows = self._esegui_piano(req, passi)
+            except (ImportError, FileNotFoundError) as e:
+                self.non_disponibili[passi[0][0] if len(passi) == 1 else "prolog"] = str(e)
+                incrementa("planner.backend_non_disponibile")
+                continue
+            return rows, " → ".join(nome for nome, _ in passi)
+        raise ValueError(f"Nessun backend disponibile per la richiesta: {forma(req)}")
+
+    def calibra(self, richieste, ripetizioni=3):
+        """
+        Esegue ogni richiesta con tutti i piani capaci, per registrarne le latenze.
+
+        Args:
+            richieste (list[dict]): Richieste rappresentative del carico.
+            ripetizioni (int): Esecuzioni per piano (default: 3).
+
+        Returns:
+            StatisticheLatenza: Statistiche aggiornate.
+        """
+        for req in richieste:
+            for _ in range(ripetizioni):
+                for _, passi in self.piani(req):
+                    try:
+                        self._esegui_piano(req, passi)
+                    except (ImportError, FileNotFoundError) as e:
+                        self.non_disponibili[passi[0][0]] = str(e)
+        return self.statistiche
+
+# Pianificatore condiviso, creato al primo uso di `interroga`
+_pianificatore = None
+
+def interroga(mood=None, genre=None, ranges=None, regole=(), limit=10, seed=None, backend=None):
+    """
+    Interroga il catalogo scegliendo automaticamente il backend più economico.
+
+    Args:
+        mood, genre, ranges, regole, limit, seed: Vedi `richiesta`.
+        backend (str | None): Forza "numpy", "sparql" o "prolog".
+
+    Returns:
+        list[dict]: Righe con `track_id`, `name`, `artist`, `genre`, `mood` e le feature di
+        `RANGE_FEATURES`.
+    """
+    global _pianificatore
+    if _pianificatore is None:
+        _pianificatore = PianificatoreQuery()
+    rows, _ = _pianificatore.esegui(richiesta(mood, genre, ranges, regole, limit, seed), backend)
+    return rows
+
+# Richieste usate da `--calibrate`
+CALIBRATION_QUERIES = [
+    {"mood": "felice"},
+    {"regole": ["energetic"]},
+    {"mood": "felice", "regole": ["energetic"]},
+    {"regole": ["happy_high_valence"]},
+    {"ranges": {"energy": (0.6, 0.8), "danceability": (0.5, None)}},
+    {"mood": "triste", "ranges": {"tempo": (None, 90.0)}},
+    {"regole": ["danceable"], "seed": 42},
+    {"regole": ["similar_energy"], "mood": "felice"},
+]
+
+def _intervallo(text):
+    """Converte "nome:min:max" (estremi vuoti ammessi) in (nome, (min, max))."""
+    name, low, high = text.split(":")
+    return name, (float(low) if low else None, float(high) if high else None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interrogazione unificata con pianificatore")
+    parser.add_argument("--mood", help="mood richiesto")
+    parser.add_argument("--genre", help="genere richiesto")
+    parser.add_argument("--range", action="append", default=[], type=_intervallo,
+                        help="intervallo nome:min:max (es. energy:0.7:), ripetibile")
+    parser.add_argument("--rule", action="append", default=[],
+                        choices=sorted([*RULE_RANGES, *SYMBOLIC_RULES]), help="regola, ripetibile")
+    parser.add_argument("--limit", type=int, default=10, help="numero massimo di tracce")
+    parser.add_argument("--seed", type=int, help="seme per un campione casuale")
+    parser.add_argument("--backend", choices=sorted(PRIOR_MS), help="forza un backend")
+    parser.add_argument("--explain", action="store_true", help="mostra i piani considerati")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="misura tutti i piani sulle richieste di esempio e salva le statistiche")
+    args = parser.parse_args()
+
+    planner = PianificatoreQuery()
+    if args.calibrate:
+        richieste = [richiesta(**params) for params in CALIBRATION_QUERIES]
+        planner.calibra(richieste).salva()
+        for req in richieste:
+            print(planner.spiega(req), end="\n\n")
+        print(f"Statistiche salvate in: {STATS_PATH}")
+        sys.exit(0)
+
+    req = richiesta(args.mood, args.genre, dict(args.range), args.rule, args.limit, args.seed)
+    if args.explain:
+        print(planner.spiega(req), end="\n\n")
+    start = time.perf_counter()
+    try:
+        rows, piano = planner.esegui(req, args.backend)
+    except ValueError as e:
+        print(e)
+        print(planner.spiega(req))
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    for row in rows:
+        print(f"- {row['name']} di {row['artist']}")
+    print(f"\n{len(rows)} tracce con il piano {piano} in {elapsed * 1000:.1f} ms")
+    planner.statistiche.salva()
@@ -0,0 +1,152 @@
+"""
+Raccomandazioni a partire da una sessione di ascolto (più tracce di partenza).
+
+Invece di ripetere `raccomanda_simili` per ogni traccia e unire i risultati in Python:
+1. i mood delle tracce della sessione vengono predetti con un'unica chiamata al modello;
+2. per ogni mood presente nella sessione si costruisce un profilo pesato:
+   - "centroide": media pesata delle feature delle tracce con quel mood,
+   - "minimo": le tracce stesse; una candidata vale la minima distanza (divisa per il
+     peso) dalle tracce della sessione con il suo stesso mood;
+3. le candidate (tutte le tracce dei mood della sessione, escluse quelle della sessione)
+   vengono valutate con la distanza pesata di `similarita.py` in un passaggio vettoriale
+   per ciascuna partizione di mood, confrontando ciascuna con il profilo del proprio mood.
+
+I risultati sono ordinati per (distanza, posizione nel catalogo).
+
+Esempio:
+    python recommender/sessione.py --seeds 30 --top-n 10 --profile minimo
+"""
+
+import argparse
+import time
+import numpy as np
+from offline_recommender import catalogo, genera_spiegazione, model, mood_encoder
+from similarita import feature_weights, features_model, secondary_features
+
+# Profili della sessione supportati
+PROFILES = ("centroide", "minimo")
+
+# Elementi (candidate × tracce della sessione) elaborati per blocco nel profilo "minimo"
+BLOCK_ELEMENTS = 1 << 20
+
+def catalogo_cols():
+    """Colonne della matrice delle feature corrispondenti a `secondary_features`."""
+    return [catalogo.feature_pos[feat] for feat in secondary_features]
+
+def predici_mood_sessione(positions):
+    """
+    Predice il mood di più tracce con un'unica chiamata al classificatore.
+
+    Args:
+        positions (np.ndarray): Posizioni delle tracce nel catalogo.
+
+    Returns:
+        np.ndarray: Codici dei mood nel catalogo (vedi `Catalogo.codice`).
+    """
+    labels = mood_encoder.inverse_transform(
+        model.predict(catalogo.matrice(features_model, positions))
+    )
+    return np.array([catalogo.codice("mood", label) for label in labels], dtype=np.int32)
+
+def _distanze_centroide(candidati, cand_moods, x_seeds, seed_moods, pesi, weights):
+    """Distanza pesata di ogni candidata dal centroide pesato del proprio mood."""
+    moods = np.unique(seed_moods)
+    profili = np.stack([
+        np.average(x_seeds[seed_moods == mood], axis=0, weights=pesi[seed_moods == mood])
+        for mood in moods
+    ]).astype(np.float32)
+    x_cand = catalogo.features[candidati][:, catalogo_cols()]
+    diff = x_cand - profili[np.searchsorted(moods, cand_moods)]
+    return (diff ** 2 * weights).sum(axis=1) ** 0.5
+
+def _distanze_minime(candidati, cand_moods, x_seeds, seed_moods, pesi, weights):
+    """Minima distanza pesata (divisa per il peso) dalle tracce della sessione dello stesso mood."""
+    scale = np.sqrt(weights)
+    x_cand = catalogo.features[candidati][:, catalogo_cols()] * scale
+    distanze = np.empty(len(candidati), dtype=np.float32)
+    for mood in np.unique(seed_moods):
+        seeds = x_seeds[seed_moods == mood] * scale
+        pesi_mood = pesi[seed_moods == mood]
+        rows = np.flatnonzero(cand_moods == mood)
+        block = max(1, BLOCK_ELEMENTS // len(seeds))
+        for start in range(0, len(rows), block):
+            idx = rows[start:start + block]
+            diff = x_cand[idx, None, :] - seeds[None, :, :]
+            d = np.einsum("ijk,ijk->ij", diff, diff) ** 0.5 / pesi_mood
+            distanze[idx] = d.min(axis=1)
+    return distanze
+
+def raccomanda_sessione(semi, top_n=10, profilo="centroide", pesi=None):
+    """
+    Raccomanda tracce simili a un'intera sessione di ascolto.
+
+    Args:
+        semi (list[TracciaRecord | int]): Tracce della sessione (record o posizioni).
+        top_n (int): Numero di raccomandazioni (default: 10).
+        profilo (str): "centroide" o "minimo" (vedi docstring del modulo).
+        pesi (list[float] | None): Peso di ciascuna traccia della sessione (default: 1).
+
+    Returns:
+        dict: `mood` (etichetta → numero di tracce della sessione) e `righe`, lista di
+        (TracciaRecord, distanza) ordinata per distanza.
+
+    Raises:
+        ValueError: Se la sessione è vuota, il profilo non è supportato o i pesi non
+            corrispondono alle tracce.
+    """
+    if profilo not in PROFILES:
+        raise ValueError(f"Profilo non supportato: {profilo} (attesi: {', '.join(PROFILES)})")
+    positions = np.array([getattr(s, "pos", s) for s in semi], dtype=np.int64)
+    if len(positions) == 0:
+        raise ValueError("La sessione non contiene tracce")
+    pesi = np.ones(len(positions), dtype=np.float32) if pesi is None \
+        else np.asarray(pesi, dtype=np.float32)
+    if pesi.shape != positions.shape or (pesi <= 0).any():
+        raise ValueError("Serve un peso positivo per ciascuna traccia della sessione")
+
+    seed_moods = predici_mood_sessione(positions)
+    candidati = np.flatnonzero(np.isin(catalogo.mood_codes, seed_moods))
+    candidati = candidati[~np.isin(candidati, positions)]
+    cand_moods = catalogo.mood_codes[candidati]
+
+    weights = np.array([feature_weights[feat] for feat in secondary_features], dtype=np.float32)
+    x_seeds = catalogo.features[positions][:, catalogo_cols()]
+    score = _distanze_centroide if profilo == "centroide" else _distanze_minime
+    distanze = score(candidati, cand_moods, x_seeds, seed_moods, pesi / pesi.mean(), weights)
+
+    ordine = np.lexsort((candidati, distanze))[:top_n]
+    moods, counts = np.unique(catalogo.mood_labels[seed_moods], return_counts=True)
+    return {
+        "mood": dict(zip(moods, counts.tolist())),
+        "righe": [(catalogo.traccia(candidati[i]), float(distanze[i])) for i in ordine],
+    }
+
+def stampa_sessione(semi, result):
+    """Stampa le raccomandazioni della sessione con la spiegazione rispetto alla traccia più vicina."""
+    mood = ", ".join(f"{label} ×{n}" for label, n in result["mood"].items())
+    print(f"\nTracce consigliate per la sessione di {len(semi)} tracce (mood: {mood}):\n")
+    x_seeds = catalogo.features[[getattr(s, "pos", s) for s in semi]][:, catalogo_cols()]
+    weights = np.array([feature_weights[feat] for feat in secondary_features], dtype=np.float32)
+    for row, distanza in result["righe"]:
+        diff = x_seeds - catalogo.features[row.pos, catalogo_cols()]
+        vicina = semi[int(np.argmin((diff ** 2 * weights).sum(axis=1)))]
+        vicina = vicina if hasattr(vicina, "pos") else catalogo.traccia(vicina)
+        print(f"- {row['track_name']} di {row['artists_name']} [distanza: {distanza:.3f}]")
+        print(f"  vicina a '{vicina['track_name']}': {genera_spiegazione(vicina, row)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raccomandazioni da una sessione di ascolto")
+    parser.add_argument("--seeds", type=int, default=20, help="tracce casuali della sessione")
+    parser.add_argument("--top-n", type=int, default=10, help="numero di raccomandazioni")
+    parser.add_argument("--profile", choices=PROFILES, default="centroide",
+                        help="profilo della sessione (default: centroide)")
+    parser.add_argument("--seed", type=int, default=42, help="seme per la sessione casuale")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    semi = [catalogo.traccia(p) for p in rng.choice(len(catalogo), args.seeds, replace=False)]
+    start = time.perf_counter()
+    result = raccomanda_sessione(semi, args.top_n, args.profile)
+    elapsed = time.perf_counter() - start
+    stampa_sessione(semi, result)
+    print(f"\nTempo: {elapsed * 1000:.1f} ms")
@@ -0,0 +1,417 @@
+"""
+Modalità distribuita del raccomandatore per similarità: catalogo partizionato tra processi.
+
+Il catalogo viene suddiviso in shard, per hash di `track_id` o per genere (generi interi
+assegnati agli shard bilanciando il numero di tracce). Ogni shard è servito da un processo
+dedicato che mantiene in memoria solo la propria parte del catalogo compatto: il
+coordinatore calcola una volta le righe di ciascuno shard (leggendo solo le colonne del
+partizionamento) e ogni worker legge dal CSV, a blocchi, solo le proprie righe.
+
+Per ciascuna richiesta il coordinatore:
+1. chiede allo shard proprietario le feature della traccia di partenza e ne predice il mood;
+2. invia la query agli shard, che calcolano il top-k locale con gli stessi filtri di
+   `raccomanda_simili` (mood, genere e durata ±10%, con ripiego sul solo mood);
+3. unisce i risultati parziali nel top-N globale esatto, ordinando per (distanza,
+   posizione nel catalogo) come la versione a processo singolo.
+
+Se un worker termina in modo anomalo, il suo processo viene ricreato e la richiesta
+ripetuta una volta; se fallisce ancora, il risultato riporta gli shard mancanti.
+Per ogni shard vengono registrate le latenze (calcolo nel worker e andata/ritorno).
+
+Esempio:
+    python recommender/sharded_recommender.py --shards 4 --mode genre --queries 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+
+# Percorsi
+CATALOG_PATH = "dataset/data/clean_tracks.csv"
+MODEL_PATH = "classificator/mood_classifier.pkl"
+
+# Modalità di partizionamento supportate
+SHARD_MODES = ("hash", "genre")
+
+# Stato del processo worker: catalogo dello shard
+_shard = None
+
+def shard_per_hash(track_ids, n_shards):
+    """
+    Assegna le tracce agli shard con un hash stabile (CRC32) di `track_id`.
+
+    Args:
+        track_ids (np.ndarray): Identificativi delle tracce (bytes).
+        n_shards (int): Numero di shard.
+
+    Returns:
+        np.ndarray: Shard di ciascuna traccia.
+    """
+    return np.array([zlib.crc32(tid) % n_shards for tid in track_ids], dtype=np.int32)
+
+def shard_per_genere(genre_codes, n_shards):
+    """
+    Assegna interi generi agli shard, bilanciando il numero di tracce (greedy).
+
+    Args:
+        genre_codes (np.ndarray): Codice del genere di ciascuna traccia.
+        n_shards (int): Numero di shard.
+
+    Returns:
+        np.ndarray: Shard di ciascuna traccia.
+    """
+    counts = np.bincount(genre_codes)
+    loads = np.zeros(n_shards, dtype=np.int64)
+    genre_shard = np.zeros(len(counts), dtype=np.int32)
+    for genre in np.argsort(-counts, kind="stable"):
+        target = int(loads.argmin())
+        genre_shard[genre] = target
+        loads[target] += counts[genre]
+    return genre_shard[genre_codes]
+
+def partiziona(path, n_shards, mode):
+    """
+    Calcola le righe del CSV assegnate a ciascuno shard e le etichette comuni.
+
+    Vengono lette solo le colonne che servono al partizionamento e alla codifica di
+    artista, genere e mood; le etichette sono condivise da tutti gli shard, così i codici
+    (es. il genere della traccia di partenza) restano confrontabili tra processi.
+
+    Args:
+        path (str): Percorso di `clean_tracks.csv`.
+        n_shards (int): Numero di shard.
+        mode (str): "hash" o "genre".
+
+    Returns:
+        tuple[list[np.ndarray], dict[str, np.ndarray]]: Righe (ordinate) di ciascuno shard
+        ed etichette per attributo.
+    """
+    from catalogo import CODED_COLUMNS
+
+    df = pd.read_csv(path, usecols=["track_id", *CODED_COLUMNS])
+    etichette = {
+        attr: np.asarray(pd.Categorical(df[column].astype(str)).categories, dtype=object)
+        for column, attr in CODED_COLUMNS.items()
+    }
+    if mode == "genre":
+        genres = pd.Categorical(df["track_genre"].astype(str), categories=etichette["genre"])
+        owner = shard_per_genere(genres.codes.astype(np.int32), n_shards)
+    else:
+        track_ids = np.char.encode(df["track_id"].astype(str).to_numpy(dtype=str), "utf-8")
+        owner = shard_per_hash(track_ids, n_shards)
+    return [np.flatnonzero(owner == i) for i in range(n_shards)], etichette
+
+# --- Funzioni eseguite nei worker ---
+
+def _init_shard(path, righe, etichette):
+    """Carica dal CSV solo le righe dello shard, codificate con le etichette comuni."""
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    if module_dir not in sys.path:
+        sys.path.insert(0, module_dir)
+    from catalogo import Catalogo
+
+    global _shard
+    _shard = Catalogo.da_csv(path, righe=righe, etichette=etichette)
+
+def _descrivi(track_id):
+    """
+    Restituisce i dati della traccia `track_id` se appartiene allo shard.
+
+    Returns:
+        dict | None: Campi usati per predizione, filtri e spiegazioni.
+    """
+    from similarita import features_model, secondary_features
+
+    matches = np.flatnonzero(_shard.track_ids == track_id.encode("utf-8"))
+    if len(matches) == 0:
+        return None
+    record = _shard.traccia(matches[0])
+    fields = ["track_id", "track_name", "artists_name", "mood", *features_model]
+    info = {key: record[key] for key in dict.fromkeys(fields)}
+    info["posizione"] = int(_shard.posizioni[matches[0]])
+    info["vettore"] = _shard.vettore(matches[0], secondary_features)
+    info["modello"] = _shard.matrice(features_model, [matches[0]])
+    return info
+
+def _top_k(positions, x_input, top_n):
+    """Top-k locale per (distanza, posizione globale)."""
+    from similarita import distanze_pesate
+
+    distances = distanze_pesate(_shard, positions, x_input)
+    order = np.lexsort((_shard.posizioni[positions], distances))[:top_n]
+    return positions[order], distances[order]
+
+def _cerca(base, mood_label, top_n):
+    """
+    Calcola il top-k locale per una traccia di partenza, con filtri stretti e di ripiego.
+
+    Il ripiego (solo stesso mood) viene calcolato solo se nello shard non ci sono
+    candidate per i filtri stretti: se ce ne sono, il ripiego non serve a livello globale.
+
+    Returns:
+        dict: Numero di candidate strette, righe del top-k e secondi di calcolo.
+    """
+    from similarita import genera_spiegazione
+
+    start = time.perf_counter()
+    mood_code = _shard.codice("mood", mood_label)
+    stesso_mood = (_shard.mood_codes == mood_code) & (_shard.posizioni != base["posizione"])
+    strict = np.flatnonzero(
+        stesso_mood &
+        (_shard.genre_codes == base["track_genre"]) &
+        (_shard.duration_ms >= base["duration_ms"] * 0.9) &
+        (_shard.duration_ms <= base["duration_ms"] * 1.1)
+    )
+    candidates = strict if len(strict) else np.flatnonzero(stesso_mood)
+    positions, distances = _top_k(candidates, base["vettore"], top_n)
+
+    rows = []
+    for pos, dist in zip(positions, distances):
+        record = _shard.traccia(pos)
+        rows.append({
+            "distanza": float(dist),
+            "posizione": int(_shard.posizioni[pos]),
+            "track_id": record["track_id"],
+            "track_name": record["track_name"],
+            "artists_name": record["artists_name"],
+            "spiegazione": genera_spiegazione(base, record),
+        })
+    return {"strette": len(strict), "righe": rows, "secondi": time.perf_counter() - start}
+
+def _conta():
+    """Restituisce il numero di tracce dello shard."""
+    return len(_shard)
+
+def _campione(n, seed):
+    """Restituisce `n` track_id casuali dello shard."""
+    rng = random.Random(seed)
+    picks = [rng.randrange(len(_shard)) for _ in range(min(n, len(_shard)))]
+    return [_shard.track_ids[i].decode("utf-8") for i in picks]
+
+# --- Coordinatore ---
+
+class ShardedRecommender:
+    """
+    Coordinatore del raccomandatore distribuito su shard.
+
+    Ogni shard è servito da un `ProcessPoolExecutor` con un solo worker, così le richieste
+    a uno shard vengono servite dal processo che ne possiede i dati.
+
+    Args:
+        n_shards (int): Numero di shard (default: numero di CPU).
+        mode (str): Partizionamento, "hash" (default) o "genre".
+        path (str): Percorso di `clean_tracks.csv`.
+        model_path (str): Percorso del classificatore del mood.
+    """
+
+    def __init__(self, n_shards=None, mode="hash", path=CATALOG_PATH, model_path=MODEL_PATH):
+        if mode not in SHARD_MODES:
+            raise ValueError(f"Modalità non supportata: {mode}")
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.mode = mode
+        self.path = path
+        self._righe, self._etichette = partiziona(path, self.n_shards, mode)
+        with open(model_path, "rb") as f:
+            self.model, self.mood_encoder = pickle.load(f)
+        self._context = multiprocessing.get_context("spawn")
+        self._executors = [self._avvia(i) for i in range(self.n_shards)]
+        self._latenze = {i: [] for i in range(self.n_shards)}
+        self.riavvii = [0] * self.n_shards
+        self.dimensioni = self._broadcast(_conta)[0]
+
+    def _avvia(self, shard_id):
+        """Crea il processo worker dello shard `shard_id`."""
+        return ProcessPoolExecutor(
+            max_workers=1, mp_context=self._context, initializer=_init_shard,
+            initargs=(self.path, self._righe[shard_id], self._etichette),
+        )
+
+    def _broadcast(self, func, *args, shards=None):
+        """
+        Esegue `func(*args)` sugli shard indicati, ricreando una volta i worker falliti.
+
+        Returns:
+            tuple[dict[int, object], list[int]]: Risultati per shard e shard falliti.
+        """
+        shards = range(self.n_shards) if shards is None else shards
+        results, failed, done = {}, [], {}
+
+        def submit(shard_id):
+            future = self._executors[shard_id].submit(func, *args)
+            future.add_done_callback(
+                lambda _, i=shard_id: done.__setitem__(i, time.perf_counter())
+            )
+            return time.perf_counter(), future
+
+        def restart(shard_id):
+            print(f"Worker dello shard {shard_id} terminato: riavvio e ripeto.")
+            self._executors[shard_id].shutdown(wait=False, cancel_futures=True)
+            self._executors[shard_id] = self._avvia(shard_id)
+            self.riavvii[shard_id] += 1
+
+        pending = {}
+        for shard_id in shards:
+            try:
+                pending[shard_id] = submit(shard_id)
+            except BrokenProcessPool:
+                restart(shard_id)
+                pending[shard_id] = submit(shard_id)
+
+        for shard_id, (start, future) in pending.items():
+            for attempt in range(2):
+                try:
+                    results[shard_id] = future.result()
+                    if func is _cerca:
+                        self._latenze[shard_id].append(
+                            (results[shard_id]["secondi"], done[shard_id] - start)
+                        )
+                    break
+                except BrokenProcessPool:
+                    restart(shard_id)
+                    if attempt == 0:
+                        start, future = submit(shard_id)
+                    else:
+                        failed.append(shard_id)
+        return results, failed
+
+    def _proprietari(self, track_id):
+        """Shard che possono contenere `track_id` (uno solo nella modalità hash)."""
+        if self.mode == "hash":
+            return [zlib.crc32(track_id.encode("utf-8")) % self.n_shards]
+        return None
+
+    def raccomanda(self, track_id, top_n=5):
+        """
+        Restituisce le `top_n` tracce più simili a `track_id` sull'intero catalogo.
+
+        Args:
+            track_id (str): Identificativo della traccia di partenza.
+            top_n (int): Numero di raccomandazioni (default: 5).
+
+        Returns:
+            dict | None: Traccia di partenza (`base`), mood predetto (`mood`), righe
+            raccomandate (`righe`), flag di ripiego (`ripiego`) e shard non disponibili
+            (`shard_falliti`); None se la traccia non esiste.
+        """
+        described, failed = self._broadcast(_descrivi, track_id,
+                                            shards=self._proprietari(track_id))
+        base = next((info for info in described.values() if info is not None), None)
+        if base is None:
+            if failed:
+                raise RuntimeError(f"Shard non disponibili: {failed}")
+            return None
+
+        mood_pred = self.model.predict(base.pop("modello"))[0]
+        mood_label = self.mood_encoder.inverse_transform([mood_pred])[0]
+
+        partials, failed = self._broadcast(_cerca, base, mood_label, top_n)
+        fallback = sum(p["strette"] for p in partials.values()) == 0
+        rows = [
+            row for p in partials.values()
+            if fallback or p["strette"] > 0
+            for row in p["righe"]
+        ]
+        rows.sort(key=lambda row: (row["distanza"], row["posizione"]))
+        return {"base": base, "mood": mood_label, "righe": rows[:top_n],
+                "ripiego": fallback, "shard_falliti": failed}
+
+    def campione(self, n, seed=None):
+        """
+        Restituisce `n` track_id casuali, estratti dagli shard in proporzione alla dimensione.
+
+        Args:
+            n (int): Numero di tracce.
+            seed (int | None): Seme per un campionamento riproducibile.
+
+        Returns:
+            list[str]: Identificativi delle tracce.
+        """
+        total = sum(self.dimensioni.values())
+        ids = []
+        for shard_id, size in self.dimensioni.items():
+            quota = round(n * size / total) if total else 0
+            part, _ = self._broadcast(_campione, quota, seed, shards=[shard_id])
+            ids += part.get(shard_id, [])
+        return ids[:n]
+
+    def latenze(self):
+        """
+        Riepiloga le latenze delle query per shard.
+
+        Returns:
+            pd.DataFrame: Per shard, tracce, query servite, media e p95 del calcolo nel
+            worker e dell'andata/ritorno (ms), riavvii del worker.
+        """
+        rows = []
+        for shard_id, samples in self._latenze.items():
+            compute = np.array([s[0] for s in samples]) * 1000
+            total = np.array([s[1] for s in samples]) * 1000
+            rows.append({
+                "shard": shard_id,
+                "tracce": self.dimensioni.get(shard_id),
+                "query": len(samples),
+                "calcolo_ms": round(compute.mean(), 3) if len(samples) else None,
+                "calcolo_p95_ms": round(np.percentile(compute, 95), 3) if len(samples) else None,
+                "totale_ms": round(total.mean(), 3) if len(samples) else None,
+                "totale_p95_ms": round(np.percentile(total, 95), 3) if len(samples) else None,
+                "riavvii": self.riavvii[shard_id],
+            })
+        return pd.DataFrame(rows)
+
+    def chiudi(self):
+        """Arresta i processi worker."""
+        for executor in self._executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.chiudi()
+
+def stampa_raccomandazioni(result):
+    """Stampa le raccomandazioni nello stesso formato di `raccomanda_simili`."""
+    base = result["base"]
+    if result["ripiego"]:
+        print("Nessuna raccomandazione stretta trovata, rilasso i filtri (solo stesso mood)...")
+    if result["shard_falliti"]:
+        print(f"Attenzione: risultati parziali, shard non disponibili {result['shard_falliti']}")
+    print(
+        f"\nTracce consigliate simili a '{base['track_name']}' di "
+        f"{base['artists_name']}' (mood: {result['mood']}):\n"
+    )
+    for row in result["righe"]:
+        print(f"- {row['track_name']} di {row['artists_name']} [distanza: {row['distanza']:.3f}]")
+        print(f"  {row['spiegazione']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raccomandatore per similarità distribuito")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="numero di shard (default: numero di CPU)")
+    parser.add_argument("--mode", choices=SHARD_MODES, default="hash",
+                        help="partizionamento del catalogo (default: hash)")
+    parser.add_argument("--track", default=None, help="track_id della traccia di partenza")
+    parser.add_argument("--queries", type=int, default=10,
+                        help="query su tracce casuali se --track non è indicato")
+    parser.add_argument("--top-n", type=int, default=5, help="raccomandazioni per query")
+    args = parser.parse_args()
+
+    with ShardedRecommender(args.shards, args.mode) as recommender:
+        track_ids = [args.track] if args.track else recommender.campione(args.queries, seed=42)
+        for track_id in track_ids:
+            result = recommender.raccomanda(track_id, args.top_n)
+            if result is None:
+                print(f"Traccia '{track_id}' non trovata.")
+            else:
+                stampa_raccomandazioni(result)
+        print("\n=== Latenze per shard ===")
+        print(recommender.latenze().to_string(index=False))
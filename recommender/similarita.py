@@ -0,0 +1,118 @@
+"""
+Feature, pesi e funzioni di similarità condivisi dai raccomandatori per similarità audio.
+
+Contiene la distanza euclidea pesata sulle feature audio secondarie (calcolata sugli array
+float32 del catalogo compatto), la sua combinazione con la distanza tra i vettori di
+probabilità del mood precalcolati e la generazione delle spiegazioni, usate sia da
+`offline_recommender.py` sia dai worker della modalità distribuita.
+"""
+
+import numpy as np
+try:
+    from instrumentation import traccia
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    def traccia(name):
+        return lambda func: func
+
+# Feature e pesi
+primary_filters = ["mood", "duration_ms", "track_genre"]
+secondary_features = [
+    "valence", "energy", "danceability", "tempo",
+    "acousticness", "instrumentalness", "speechiness"
+]
+feature_weights = {
+    "valence": 2.0,
+    "energy": 2.0,
+    "danceability": 1.0,
+    "tempo": 1.0,
+    "acousticness": 1.0,
+    "instrumentalness": 1.0,
+    "speechiness": 1.0,
+}
+features_model = [
+    "valence", "energy", "danceability", "tempo", "acousticness",
+    "instrumentalness", "speechiness", "artists", "duration_ms", "track_genre"
+]
+
+def distanze_pesate(catalogo, positions, x_input):
+    """
+    Calcola la distanza euclidea pesata tra una traccia e un insieme di candidate.
+
+    Args:
+        catalogo (Catalogo): Catalogo delle candidate.
+        positions (np.ndarray): Posizioni delle candidate nel catalogo.
+        x_input (np.ndarray): Feature secondarie della traccia di riferimento (float32).
+
+    Returns:
+        np.ndarray: Distanze (float32), una per candidata.
+    """
+    cols = [catalogo.feature_pos[feat] for feat in secondary_features]
+    x_candidati = catalogo.features[positions][:, cols]
+    weights = np.array([feature_weights[feat] for feat in secondary_features], dtype=np.float32)
+    return ((x_candidati - x_input) ** 2 * weights).sum(axis=1) ** 0.5
+
+def distanze_miste(catalogo, positions, x_input, probabilita, pos, peso_mood=1.0):
+    """
+    Combina la distanza pesata sulle feature audio con la somiglianza del mood.
+
+    La distanza audio viene moltiplicata per `1 + peso_mood * H`, dove H è la distanza di
+    Hellinger tra i vettori di probabilità del mood precalcolati (vedi `probabilita_mood.py`):
+    a parità di suono sono favorite le tracce con distribuzione di mood simile, senza
+    escludere quelle di un mood vicino. Il fattore non dipende dalla scala delle feature.
+
+    Args:
+        catalogo (Catalogo): Catalogo delle candidate.
+        positions (np.ndarray): Posizioni delle candidate nel catalogo.
+        x_input (np.ndarray): Feature secondarie della traccia di riferimento (float32).
+        probabilita (ProbabilitaMood): Probabilità del mood allineate al catalogo.
+        pos (int): Posizione della traccia di riferimento.
+        peso_mood (float): Peso della distanza di mood (0 = sola distanza audio).
+
+    Returns:
+        np.ndarray: Distanze combinate (float32), una per candidata.
+    """
+    audio = distanze_pesate(catalogo, positions, x_input)
+    return audio * (1 + np.float32(peso_mood) * probabilita.distanze_hellinger(pos, positions))
+
+# Spiegazione
+@traccia("offline.spiegazione")
+def genera_spiegazione(base_row, candidate_row):
+    """
+    Genera una spiegazione testuale della raccomandazione basata sulla similarità tra tracce.
+
+    La spiegazione include fattori come mood, genere, durata e la feature audio più simile
+    secondo distanza pesata.
+
+    Args:
+        base_row (TracciaRecord | dict): Traccia di riferimento.
+        candidate_row (TracciaRecord | dict): Traccia raccomandata.
+
+    Returns:
+        str: Motivazione testuale.
+    """
+    motivazioni = []
+
+    if base_row["mood"] == candidate_row["mood"]:
+        motivazioni.append("stesso mood")
+    if base_row["track_genre"] == candidate_row["track_genre"]:
+        motivazioni.append("genere musicale identico")
+    if abs(base_row["duration_ms"] - candidate_row["duration_ms"]) <= 0.1 * base_row["duration_ms"]:
+        motivazioni.append(
+    f"durata simile ({abs(base_row['duration_ms'] - candidate_row['duration_ms']) / 1000:.1f}s)"
+)
+
+
+    # Similarità feature più forte
+    differenze = {
+        feat: abs(base_row[feat] - candidate_row[feat]) * feature_weights[feat]
+        for feat in secondary_features
+    }
+    best_feat = min(differenze, key=differenze.get)
+    motivazioni.append(f"{best_feat} simile (Δ={differenze[best_feat]:.3f})")
+
+    return (
+    "Motivazione principale: " + motivazioni[-1] + ". Altri fattori: " +
+    ", ".join(motivazioni[:-1])
+)
@@ -2,23 +2,393 @@
 Modulo per il caricamento di un'ontologia OWL RDF e l'esecuzione di una query SPARQL
 che restituisce un insieme di tracce con mood 'felice'.
 
+Espone inoltre `cerca_tracce`, un'API di interrogazione con query compilate una sola volta
+e parametri (mood, genere, intervalli numerici, paginazione) legati a ogni chiamata.
+
 Utilizza `rdflib` per il parsing e l'interrogazione dell'ontologia.
+
+Se è presente il triple store persistente (Oxigraph su disco, tramite il plugin
+`oxrdflib`), costruito una sola volta dalla rigenerazione dell'ontologia, il grafo viene
+aperto direttamente dallo store senza ripetere il parsing: il tempo di apertura non
+dipende dalla dimensione dell'ontologia e lo store accetta aggiunte incrementali.
 """
 
-from rdflib import Graph
+import os
+import shutil
+from functools import lru_cache
+from itertools import islice
+from rdflib import Graph, Literal, URIRef
+from rdflib.plugin import PluginException
+from rdflib.plugins.sparql import prepareQuery
+try:
+    from oxrdflib import OxigraphStore
+except ImportError:
+    # Triple store persistente non disponibile: si usano solo grafi in memoria
+    OxigraphStore = None
+try:
+    from instrumentation import incrementa, span
+except ImportError:
+    # Script avviato direttamente, senza la radice del progetto in `sys.path`:
+    # la strumentazione resta disattivata (vedi `instrumentation.py`)
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+    def incrementa(name, value=1):
+        pass
+
+# Triple store persistente e identificativo del grafo delle tracce
+STORE_PATH = "sparql/triple_store"
+GRAPH_ID = URIRef("http://example.org/mood")
+
+# File dell'ontologia in ordine di preferenza (percorso, formato rdflib): l'export completo
+# prodotto da `regenerate_ontology.py` e, in sua assenza, l'ontologia RDF/XML storica
+ONTOLOGY_FILES = [
+    ("sparql/mood_ontology.nt", "nt"),
+    ("sparql/mood_ontology.ttl", "turtle"),
+    ("sparql/mood_ontology.owl", "xml"),
+]
+
+def open_store(path=STORE_PATH, create=False):
+    """
+    Apre il triple store persistente su disco (Oxigraph tramite `oxrdflib`).
+
+    Lo store può essere aperto da un solo processo alla volta.
+
+    Args:
+        path (str): Cartella dello store.
+        create (bool): Se True, crea uno store nuovo (la cartella non deve esistere).
+
+    Returns:
+        rdflib.Graph: Grafo delle tracce, da chiudere con `close()` dopo le scritture.
+
+    Raises:
+        rdflib.plugin.PluginException: Se il plugin `oxrdflib` non è installato.
+    """
+    g = Graph(store="Oxigraph", identifier=GRAPH_ID)
+    g.open(path, create=create)
+    return g
+
+def build_store(source, fmt="nt", path=STORE_PATH):
+    """
+    Costruisce da zero il triple store a partire da un file RDF, con caricamento bulk.
+
+    Il caricamento usa direttamente `pyoxigraph` (dipendenza di `oxrdflib`), che scrive
+    gli indici senza passare dal log delle transazioni. Lo store viene creato in una
+    cartella temporanea e sostituisce quello esistente solo a caricamento completato.
+
+    Args:
+        source (str): File RDF da caricare.
+        fmt (str): Formato del file ("nt" o "ttl").
+        path (str): Cartella dello store.
+
+    Returns:
+        str: Percorso dello store creato.
+
+    Raises:
+        ImportError: Se `pyoxigraph` non è installato.
+    """
+    import pyoxigraph as ox
+
+    formats = {"nt": ox.RdfFormat.N_TRIPLES, "ttl": ox.RdfFormat.TURTLE}
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    store = ox.Store(tmp_path)
+    store.bulk_load(path=source, format=formats[fmt], to_graph=ox.NamedNode(str(GRAPH_ID)))
+    store.flush()
+    del store
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def update_store(subjects, nt_text, path=STORE_PATH, batch=1000):
+    """
+    Aggiorna il triple store senza ricostruirlo: elimina tutte le triple dei soggetti
+    indicati e carica le nuove triple.
+
+    Args:
+        subjects (iterable[str]): URI dei soggetti da eliminare (tracce rimosse o modificate).
+        nt_text (str): Nuove triple in N-Triples.
+        path (str): Cartella dello store.
+        batch (int): Soggetti eliminati per ciascuna operazione di update SPARQL.
+
+    Raises:
+        ImportError: Se `pyoxigraph` non è installato.
+    """
+    import pyoxigraph as ox
+
+    store = ox.Store(path)
+    graph = ox.NamedNode(str(GRAPH_ID))
+    subjects = list(subjects)
+    for start in range(0, len(subjects), batch):
+        values = " ".join(f"<{s}>" for s in subjects[start:start + batch])
+        store.update(
+            f"DELETE {{ GRAPH <{GRAPH_ID}> {{ ?s ?p ?o }} }} "
+            f"WHERE {{ VALUES ?s {{ {values} }} GRAPH <{GRAPH_ID}> {{ ?s ?p ?o }} }}"
+        )
+    if nt_text:
+        store.load(input=nt_text, format=ox.RdfFormat.N_TRIPLES, to_graph=graph)
+    store.flush()
+
+def add_triples(graph, triples):
+    """
+    Aggiunge in modo incrementale delle triple al grafo (persistenti se è lo store).
+
+    Args:
+        graph (rdflib.Graph): Grafo aperto con `open_store` o `load_ontology`.
+        triples (iterable[tuple]): Triple (soggetto, predicato, oggetto) da aggiungere.
+    """
+    graph.addN((s, p, o, graph) for s, p, o in triples)
 
 def load_ontology():
     """
-    Carica l'ontologia musicale OWL dal file RDF/XML.
+    Carica l'ontologia musicale.
 
-    Il file `sparql/mood_ontology.owl` deve esistere ed essere conforme al vocabolario RDF previsto.
+    Apre il triple store persistente se presente (e se `oxrdflib` è installato);
+    altrimenti esegue il parsing del primo file disponibile tra quelli in `ONTOLOGY_FILES`.
+    Il file deve essere conforme al vocabolario RDF previsto.
 
     Returns:
         rdflib.Graph: Grafo RDF caricato.
+
+    Raises:
+        FileNotFoundError: Se né lo store né un file dell'ontologia sono presenti.
     """
-    g = Graph()
-    g.parse("sparql/mood_ontology.owl", format="xml")
-    return g
+    if os.path.isdir(STORE_PATH):
+        try:
+            with span("ontology.apri_store"):
+                return open_store()
+        except PluginException:
+            print("Plugin 'oxrdflib' non installato: eseguo il parsing del file.")
+    for path, fmt in ONTOLOGY_FILES:
+        if os.path.exists(path):
+            g = Graph()
+            with span("ontology.parsing", formato=fmt):
+                g.parse(path, format=fmt)
+            return g
+    raise FileNotFoundError("Nessun file dell'ontologia trovato in 'sparql/'.")
+
+# Proprietà numeriche filtrabili per intervallo (parametro → proprietà dell'ontologia)
+RANGE_PROPERTIES = {
+    "valence": "hasValence",
+    "energy": "hasEnergy",
+    "danceability": "hasDanceability",
+    "tempo": "hasTempo",
+}
+
+# Proprietà lette per ciascuna traccia (chiave del risultato → proprietà dell'ontologia)
+PREFIX = "http://example.org/mood#"
+TRACK_PROPERTIES = {
+    "name": "hasName",
+    "artist": "hasArtist",
+    "genre": "hasGenre",
+    "mood": "hasMood",
+    **RANGE_PROPERTIES,
+}
+
+@lru_cache(maxsize=256)
+def prepare_track_query(has_mood, has_genre, ranges, keyset, ordered):
+    """
+    Costruisce (una sola volta per forma) il testo della query parametrica sulle tracce.
+
+    La forma della query dipende solo da quali filtri sono presenti e dall'ordinamento;
+    i valori (mood, genere, estremi degli intervalli, chiave di paginazione) vengono
+    legati come variabili al momento dell'esecuzione. Le variabili dei parametri
+    compaiono anche nella proiezione, come richiesto dalle sostituzioni di Oxigraph.
+    LIMIT e OFFSET non fanno parte del testo in cache: `cerca_tracce` li aggiunge per
+    Oxigraph e taglia le righe lette in modo lazy per rdflib (vedi `compila_query`).
+
+    Args:
+        has_mood (bool): Filtro sul mood (variabile `?mood`).
+        has_genre (bool): Filtro sul genere (variabile `?genre`).
+        ranges (tuple[tuple[str, bool, bool], ...]): Per ciascuna proprietà numerica
+            filtrata, (nome, estremo minimo presente, estremo massimo presente).
+        keyset (bool): Paginazione per chiave (tracce con URI successivo a `?after`).
+        ordered (bool): Ordina per URI (necessario per paginare in modo stabile).
+
+    Returns:
+        str: Testo della query, senza LIMIT e OFFSET.
+    """
+    filters, params = [], []
+    for name, has_min, has_max in ranges:
+        if has_min:
+            filters.append(f"?{name} >= ?min_{name}")
+            params.append(f"?min_{name}")
+        if has_max:
+            filters.append(f"?{name} <= ?max_{name}")
+            params.append(f"?max_{name}")
+    if keyset:
+        filters.append("STR(?track) > ?after")
+        params.append("?after")
+
+    where = "\n".join(f"      FILTER({f})" for f in filters)
+    text = f"""
+    PREFIX : <http://example.org/mood#>
+
+    SELECT ?track ?name ?artist ?genre ?mood ?valence ?energy ?danceability ?tempo
+           {" ".join(params)}
+    WHERE {{
+      ?track a :Track ;
+             :hasName ?name ;
+             :hasArtist ?artist ;
+             :hasGenre ?genre ;
+             :hasMood ?mood ;
+             :hasValence ?valence ;
+             :hasEnergy ?energy ;
+             :hasDanceability ?danceability ;
+             :hasTempo ?tempo .
+{where}
+    }}
+    {"ORDER BY ?track" if ordered else ""}
+    """
+    return text
+
+@lru_cache(maxsize=256)
+def compila_query(text):
+    """
+    Compila con rdflib (una sola volta per testo) una query da eseguire su un grafo in
+    memoria. Oxigraph non accetta query compilate da rdflib: riceve sempre il testo.
+
+    Args:
+        text (str): Testo della query.
+
+    Returns:
+        rdflib.plugins.sparql.sparql.Query: Query compilata.
+    """
+    return prepareQuery(text)
+
+def cerca_tracce(graph, mood=None, genre=None, valence=None, energy=None,
+                 danceability=None, tempo=None, limit=20, offset=0, after=None, index=None,
+                 ordina=True):
+    """
+    Cerca tracce per mood, genere e intervalli numerici, con paginazione.
+
+    Le query vengono costruite una sola volta per ciascuna combinazione di filtri.
+    Sul triple store Oxigraph la query viene eseguita nativamente con i valori sostituiti
+    e con LIMIT e OFFSET nel testo, così il motore si ferma alle righe richieste; sui
+    grafi in memoria viene usata la query compilata da rdflib e le righe vengono tagliate
+    durante la lettura (rdflib ordina comunque tutte le righe prima del LIMIT).
+
+    Se viene passato l'indice degli intervalli (`range_index.load_range_index`) e sono
+    richiesti intervalli numerici, le tracce candidate vengono risolte con ricerca binaria
+    e solo per queste vengono lette le proprietà dal grafo, senza scansioni con FILTER.
+
+    Args:
+        graph (rdflib.Graph): Grafo RDF contenente l'ontologia caricata.
+        mood (str | None): Mood richiesto (es. 'felice').
+        genre (str | None): Genere richiesto.
+        valence, energy, danceability, tempo (tuple[float | None, float | None] | None):
+            Intervalli (minimo, massimo) inclusivi; un estremo None non viene filtrato.
+        limit (int): Numero massimo di righe (default: 20).
+        offset (int): Righe da saltare (paginazione per offset).
+        after (str | None): URI dell'ultima traccia della pagina precedente
+            (paginazione per chiave, da preferire all'offset per pagine profonde).
+        index (range_index.IndiceIntervalli | None): Indice degli intervalli numerici.
+        ordina (bool): Ordina i risultati per URI (default). Le ricerche a pagina singola
+            possono passare False per evitare l'ordinamento di tutte le righe; la
+            paginazione per chiave è sempre ordinata.
+
+    Returns:
+        list[dict]: Righe con le chiavi track, name, artist, genre, mood, valence,
+        energy, danceability e tempo.
+    """
+    bounds = {"valence": valence, "energy": energy,
+              "danceability": danceability, "tempo": tempo}
+    if index is not None and any(b is not None for b in bounds.values()):
+        with span("ontology.cerca_indice"):
+            candidates = index.candidati({n: b for n, b in bounds.items() if b is not None})
+            rows = cerca_candidati(graph, candidates, mood, genre, limit, offset, after)
+        incrementa("ontology.candidati_indice", len(candidates))
+        return rows
+
+    bindings = {}
+    if mood is not None:
+        bindings["mood"] = Literal(mood)
+    if genre is not None:
+        bindings["genre"] = Literal(genre)
+
+    ranges = []
+    for name, bound in bounds.items():
+        if bound is None:
+            continue
+        low, high = bound
+        if low is not None:
+            bindings[f"min_{name}"] = Literal(float(low))
+        if high is not None:
+            bindings[f"max_{name}"] = Literal(float(high))
+        ranges.append((name, low is not None, high is not None))
+    if after is not None:
+        bindings["after"] = Literal(str(after))
+
+    text = prepare_track_query(
+        mood is not None, genre is not None, tuple(ranges), after is not None,
+        ordina or after is not None
+    )
+    with span("ontology.cerca_sparql"):
+        if OxigraphStore is not None and isinstance(graph.store, OxigraphStore):
+            query = f"{text}LIMIT {int(limit)} OFFSET {int(offset)}\n"
+            results = list(graph.query(query, initBindings=bindings))
+        else:
+            results = list(islice(graph.query(compila_query(text), initBindings=bindings),
+                                  int(offset), int(offset) + int(limit)))
+
+    return [
+        {
+            "track": str(row.track),
+            "name": str(row.name),
+            "artist": str(row.artist),
+            "genre": str(row.genre),
+            "mood": str(row.mood),
+            "valence": float(row.valence),
+            "energy": float(row.energy),
+            "danceability": float(row.danceability),
+            "tempo": float(row.tempo),
+        }
+        for row in results
+    ]
+
+def cerca_candidati(graph, candidates, mood, genre, limit, offset, after):
+    """
+    Completa una ricerca a partire dalle tracce candidate risolte dall'indice.
+
+    Le proprietà di ciascuna candidata vengono lette dal grafo con una ricerca per
+    soggetto; mood, genere e paginazione hanno la stessa semantica della query SPARQL.
+
+    Args:
+        graph (rdflib.Graph): Grafo RDF contenente l'ontologia caricata.
+        candidates (np.ndarray): URI delle tracce candidate in ordine lessicografico.
+        mood, genre (str | None): Filtri su mood e genere.
+        limit, offset (int): Paginazione per offset.
+        after (str | None): Paginazione per chiave.
+
+    Returns:
+        list[dict]: Righe nello stesso formato di `cerca_tracce`.
+    """
+    if after is not None:
+        candidates = candidates[candidates.searchsorted(str(after), side="right"):]
+
+    properties = {URIRef(PREFIX + prop): key for key, prop in TRACK_PROPERTIES.items()}
+    rows = []
+    skipped = 0
+    for uri in candidates:
+        row = {"track": str(uri)}
+        for p, o in graph.predicate_objects(URIRef(uri)):
+            key = properties.get(p)
+            if key is not None:
+                row[key] = str(o) if key in ("name", "artist", "genre", "mood") else float(o)
+        if len(row) <= len(properties):
+            continue
+        if (mood is not None and row["mood"] != mood) or \
+           (genre is not None and row["genre"] != genre):
+            continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        rows.append({key: row[key] for key in ["track", *TRACK_PROPERTIES]})
+        if len(rows) >= limit:
+            break
+    return rows
 
 def run_query_felici(graph):
     """
@@ -38,20 +408,5 @@ def run_query_felici(graph):
     Returns:
         None
     """
-    query = """
-    PREFIX : <http://example.org/mood#>
-
-    SELECT ?name ?artist ?genre ?mood
-    WHERE {
-      ?track a :Track ;
-             :hasMood "felice" ;
-             :hasName ?name ;
-             :hasArtist ?artist ;
-             :hasGenre ?genre ;
-             :hasMood ?mood .
-    }
-    LIMIT 5
-    """
-    results = graph.query(query)
-    for row in results:
-        print(f"'{row.name}' di {row.artist} | Genere: {row.genre} | Mood: {row.mood}")
+    for row in cerca_tracce(graph, mood="felice", limit=5, ordina=False):
+        print(f"'{row['name']}' di {row['artist']} | Genere: {row['genre']} | Mood: {row['mood']}")
@@ -0,0 +1,198 @@
+"""
+Indice secondario ordinato sulle proprietà numeriche dell'ontologia musicale.
+
+Per ciascuna proprietà (hasValence, hasEnergy, hasDanceability, hasTempo) l'indice conserva
+i valori ordinati e gli URI delle tracce corrispondenti: una condizione di intervallo si
+risolve con due ricerche binarie, senza scandire tutte le triple della proprietà.
+Più intervalli vengono combinati intersecando gli insiemi di tracce candidate, a partire
+dal più piccolo.
+
+L'indice viene costruito da `regenerate_ontology.py` insieme all'export e salvato in
+`sparql/range_index.npz`; può anche essere ricostruito da un grafo già caricato.
+"""
+
+import os
+import numpy as np
+from rdflib import Namespace
+from ontology_module import RANGE_PROPERTIES
+
+# Percorso dell'indice salvato
+INDEX_PATH = "sparql/range_index.npz"
+
+EX = Namespace("http://example.org/mood#")
+
+class IndiceIntervalli:
+    """
+    Indice ordinato (valore → URI della traccia) per le proprietà numeriche.
+
+    Args:
+        columns (dict[str, tuple[np.ndarray, np.ndarray]]): Per ciascun nome di
+            `RANGE_PROPERTIES`, i valori e gli URI delle tracce (anche non ordinati).
+    """
+
+    def __init__(self, columns):
+        self.values = {}
+        self.tracks = {}
+        for name, (values, tracks) in columns.items():
+            values = np.asarray(values, dtype=np.float64)
+            tracks = np.asarray(tracks, dtype=str)
+            order = np.argsort(values, kind="stable")
+            self.values[name] = values[order]
+            self.tracks[name] = tracks[order]
+
+    @classmethod
+    def da_blocchi(cls, blocks):
+        """
+        Costruisce l'indice da blocchi di (URI, valori) prodotti durante l'export.
+
+        Args:
+            blocks (iterable[tuple[np.ndarray, dict[str, np.ndarray]]]): Per ciascun blocco,
+                gli URI delle tracce e i valori di ogni proprietà (NaN se mancante).
+
+        Returns:
+            IndiceIntervalli: Indice costruito.
+        """
+        parts = {name: ([], []) for name in RANGE_PROPERTIES}
+        for uris, values in blocks:
+            uris = np.asarray(uris, dtype=str)
+            for name in RANGE_PROPERTIES:
+                column = np.asarray(values[name], dtype=np.float64)
+                present = ~np.isnan(column)
+                parts[name][0].append(column[present])
+                parts[name][1].append(uris[present])
+        return cls({
+            name: (np.concatenate(vals) if vals else np.empty(0),
+                   np.concatenate(uris) if uris else np.empty(0, dtype=str))
+            for name, (vals, uris) in parts.items()
+        })
+
+    @classmethod
+    def da_grafo(cls, graph):
+        """
+        Costruisce l'indice scandendo una sola volta le triple numeriche di un grafo.
+
+        Args:
+            graph (rdflib.Graph): Grafo contenente l'ontologia.
+
+        Returns:
+            IndiceIntervalli: Indice costruito.
+        """
+        columns = {}
+        for name, prop in RANGE_PROPERTIES.items():
+            pairs = [(float(o), str(s)) for s, o in graph.subject_objects(EX[prop])]
+            values = np.array([v for v, _ in pairs], dtype=np.float64)
+            tracks = np.array([t for _, t in pairs], dtype=str)
+            columns[name] = (values, tracks)
+        return cls(columns)
+
+    @classmethod
+    def carica(cls, path=INDEX_PATH):
+        """
+        Carica l'indice salvato con `salva`.
+
+        Args:
+            path (str): File `.npz` dell'indice.
+
+        Returns:
+            IndiceIntervalli: Indice caricato.
+        """
+        index = cls.__new__(cls)
+        index.values, index.tracks = {}, {}
+        with np.load(path) as data:
+            for name in RANGE_PROPERTIES:
+                index.values[name] = data[f"{name}_values"]
+                index.tracks[name] = data[f"{name}_tracks"]
+        return index
+
+    def salva(self, path=INDEX_PATH):
+        """
+        Salva l'indice in formato `.npz` (scrittura atomica).
+
+        Args:
+            path (str): File di destinazione.
+        """
+        arrays = {}
+        for name in self.values:
+            arrays[f"{name}_values"] = self.values[name]
+            arrays[f"{name}_tracks"] = self.tracks[name]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def aggiorna(self, rimosse, blocks):
+        """
+        Aggiorna l'indice senza riordinarlo: rimuove delle tracce e ne inserisce altre.
+
+        Le nuove voci vengono inserite con una ricerca binaria dopo quelle di pari valore,
+        come se le tracce fossero state esportate in coda al catalogo.
+
+        Args:
+            rimosse (iterable[str]): URI delle tracce da rimuovere (anche quelle modificate).
+            blocks (iterable[tuple[np.ndarray, dict[str, np.ndarray]]]): Tracce da inserire,
+                nel formato di `da_blocchi`.
+        """
+        rimosse = np.asarray(list(rimosse), dtype=str)
+        nuove = IndiceIntervalli.da_blocchi(blocks)
+        for name in self.values:
+            keep = ~np.isin(self.tracks[name], rimosse)
+            values, tracks = self.values[name][keep], self.tracks[name][keep]
+            at = np.searchsorted(values, nuove.values[name], side="right")
+            self.values[name] = np.insert(values, at, nuove.values[name])
+            dtype = np.result_type(tracks.dtype, nuove.tracks[name].dtype)
+            self.tracks[name] = np.insert(tracks.astype(dtype), at, nuove.tracks[name])
+
+    def intervallo(self, name, low=None, high=None):
+        """
+        Restituisce le tracce il cui valore della proprietà cade nell'intervallo inclusivo.
+
+        Args:
+            name (str): Nome della proprietà (chiave di `RANGE_PROPERTIES`).
+            low (float | None): Estremo minimo (None = nessun limite).
+            high (float | None): Estremo massimo (None = nessun limite).
+
+        Returns:
+            np.ndarray: URI delle tracce, nell'ordine dei valori.
+        """
+        values = self.values[name]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return self.tracks[name][start:end]
+
+    def candidati(self, ranges):
+        """
+        Interseca le tracce che soddisfano tutti gli intervalli richiesti.
+
+        Args:
+            ranges (dict[str, tuple[float | None, float | None]]): Intervalli per proprietà.
+
+        Returns:
+            np.ndarray | None: URI delle tracce in ordine lessicografico (lo stesso
+            ordine di `ORDER BY ?track`), o None se non è richiesto alcun intervallo.
+        """
+        sets = sorted(
+            (self.intervallo(name, low, high) for name, (low, high) in ranges.items()),
+            key=len,
+        )
+        if not sets:
+            return None
+        result = np.sort(sets[0])
+        for tracks in sets[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, tracks, assume_unique=True)
+        return result
+
+def load_range_index(path=INDEX_PATH):
+    """
+    Carica l'indice degli intervalli, se presente.
+
+    Args:
+        path (str): File `.npz` dell'indice.
+
+    Returns:
+        IndiceIntervalli | None: Indice caricato, o None se il file non esiste.
+    """
+    if not os.path.exists(path):
+        return None
+    return IndiceIntervalli.carica(path)
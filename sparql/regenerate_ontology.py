@@ -1,37 +1,268 @@
 """
 Script per la generazione di un'ontologia OWL a partire dal dataset musicale `clean_tracks.csv`.
 
-Il file genera una rappresentazione RDF/XML contenente entità di tipo `Track`, con proprietà come:
+Il file genera una rappresentazione RDF contenente entità di tipo `Track`, con proprietà come:
 - Nome, artista, genere, mood
 - Valori numerici: valence, energy, danceability, tempo
 
-L'ontologia risultante viene salvata in `sparql/mood_ontology.owl`.
+L'esportazione è in streaming: il catalogo completo viene letto a blocchi e le triple
+vengono scritte direttamente in N-Triples (`sparql/mood_ontology.nt`, default) o Turtle
+(`sparql/mood_ontology.ttl`), senza costruire il grafo in memoria.
+Gli URI delle tracce sono stabili perché derivati da `track_id` e non dall'indice di riga.
+Al termine l'export viene caricato nel triple store persistente `sparql/triple_store`
+(se il plugin `oxrdflib` è installato), aperto poi da `ontology_module.load_ontology`,
+e viene salvato l'indice ordinato delle proprietà numeriche (`sparql/range_index.npz`).
+
+Con `aggiorna_ontologia` export, indice e triple store vengono invece aggiornati in modo
+incrementale per URI, a partire dalle sole tracce aggiunte, modificate o rimosse.
 """
+import argparse
 import os
+from urllib.parse import quote
 import pandas as pd
-from rdflib import Graph, Literal, RDF, Namespace, XSD
+from rdflib import RDF, Namespace, XSD
+from ontology_module import STORE_PATH, build_store, update_store
+from range_index import INDEX_PATH, IndiceIntervalli
+
+# Percorsi
+INPUT_CSV = "dataset/data/clean_tracks.csv"
+OUTPUT_PATHS = {
+    "nt": "sparql/mood_ontology.nt",
+    "ttl": "sparql/mood_ontology.ttl",
+}
 
-df = pd.read_csv("dataset/data/clean_tracks.csv")
-df.columns = df.columns.str.strip()
-df = df.head(1000)
+# Numero di tracce elaborate per blocco
+CHUNK_SIZE = 50_000
 
 EX = Namespace("http://example.org/mood#")
-g = Graph()
-g.bind("ex", EX)
-
-for i, row in df.iterrows():
-    track_uri = EX["Track" + str(i)]
-    g.add((track_uri, RDF.type, EX.Track))
-    g.add((track_uri, EX.hasName, Literal(row["track_name"])))
-    g.add((track_uri, EX.hasArtist, Literal(row["artists"])))
-    g.add((track_uri, EX.hasGenre, Literal(row["track_genre"])))
-    g.add((track_uri, EX.hasMood, Literal(row["mood"])))
-
-    g.add((track_uri, EX.hasValence, Literal(row["valence"], datatype=XSD.float)))
-    g.add((track_uri, EX.hasEnergy, Literal(row["energy"], datatype=XSD.float)))
-    g.add((track_uri, EX.hasDanceability, Literal(row["danceability"], datatype=XSD.float)))
-    g.add((track_uri, EX.hasTempo, Literal(row["tempo"], datatype=XSD.float)))
-
-os.makedirs("sparql", exist_ok=True)
-g.serialize(destination="sparql/mood_ontology.owl", format="xml")
-print("Ontologia salvata in 'sparql/mood_ontology.owl'")
+
+# Proprietà testuali e numeriche (proprietà, colonna del CSV)
+STRING_PROPERTIES = [
+    ("hasName", "track_name"),
+    ("hasArtist", "artists"),
+    ("hasGenre", "track_genre"),
+    ("hasMood", "mood"),
+]
+FLOAT_PROPERTIES = [
+    ("hasValence", "valence"),
+    ("hasEnergy", "energy"),
+    ("hasDanceability", "danceability"),
+    ("hasTempo", "tempo"),
+]
+
+def track_uri(track_id):
+    """
+    Restituisce l'URI stabile di una traccia a partire dal suo `track_id`.
+
+    Args:
+        track_id (str): Identificativo della traccia.
+
+    Returns:
+        str: URI della traccia.
+    """
+    return f"{EX}Track_{quote(str(track_id), safe='')}"
+
+def escape_literal(col):
+    """
+    Applica l'escape dei letterali stringa N-Triples/Turtle a una colonna.
+
+    Args:
+        col (pd.Series): Colonna di stringhe.
+
+    Returns:
+        pd.Series: Letterali tra virgolette, pronti per la serializzazione.
+    """
+    escaped = (
+        col.astype(str)
+        .str.replace("\\", "\\\\", regex=False)
+        .str.replace('"', '\\"', regex=False)
+        .str.replace("\n", "\\n", regex=False)
+        .str.replace("\r", "\\r", regex=False)
+    )
+    return '"' + escaped + '"'
+
+def object_terms(chunk):
+    """
+    Costruisce i termini oggetto di ciascuna proprietà per un blocco di tracce.
+
+    I valori mancanti producono stringhe vuote, che vengono omesse in serializzazione.
+
+    Args:
+        chunk (pd.DataFrame): Blocco di tracce.
+
+    Returns:
+        list[tuple[str, pd.Series]]: Coppie (nome della proprietà, termini oggetto).
+    """
+    terms = []
+    for prop, column in STRING_PROPERTIES:
+        values = chunk[column]
+        terms.append((prop, escape_literal(values).where(values.notna(), "")))
+    for prop, column in FLOAT_PROPERTIES:
+        values = chunk[column]
+        literal = '"' + values.astype(str) + f'"^^<{XSD.float}>'
+        terms.append((prop, literal.where(values.notna(), "")))
+    return terms
+
+def serialize_chunk(chunk, fmt):
+    """
+    Serializza un blocco di tracce in N-Triples o Turtle.
+
+    Args:
+        chunk (pd.DataFrame): Blocco di tracce.
+        fmt (str): Formato di output ("nt" o "ttl").
+
+    Returns:
+        str: Testo RDF del blocco.
+    """
+    subjects = "<" + chunk["track_id"].map(track_uri) + ">"
+
+    if fmt == "nt":
+        text = subjects + f" <{RDF.type}> <{EX.Track}> .\n"
+        for prop, obj in object_terms(chunk):
+            line = subjects + f" <{EX[prop]}> " + obj + " .\n"
+            text = text + line.where(obj != "", "")
+    else:
+        text = subjects + " a ex:Track"
+        for prop, obj in object_terms(chunk):
+            text = text + ((f" ;\n    ex:{prop} " + obj).where(obj != "", ""))
+        text = text + " .\n"
+    return "".join(text)
+
+def blocco_indice(chunk):
+    """
+    Estrae da un blocco di tracce gli URI e i valori numerici per `IndiceIntervalli`.
+
+    Args:
+        chunk (pd.DataFrame): Blocco di tracce.
+
+    Returns:
+        tuple[np.ndarray, dict[str, np.ndarray]]: URI e valori di ciascuna proprietà.
+    """
+    return (
+        chunk["track_id"].map(track_uri).to_numpy(dtype=str),
+        {column: pd.to_numeric(chunk[column], errors="coerce").to_numpy(dtype=float)
+         for _, column in FLOAT_PROPERTIES},
+    )
+
+def iter_chunks(df=None, chunk_size=CHUNK_SIZE):
+    """
+    Itera sulle tracce a blocchi, dal DataFrame fornito o leggendo `INPUT_CSV` in streaming.
+
+    Args:
+        df (pd.DataFrame | None): Tracce già caricate in memoria.
+        chunk_size (int): Numero di tracce per blocco.
+
+    Yields:
+        pd.DataFrame: Blocco di tracce.
+    """
+    if df is None:
+        yield from pd.read_csv(INPUT_CSV, chunksize=chunk_size)
+    else:
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+def export_ontology(df=None, fmt="nt", output=None, chunk_size=CHUNK_SIZE, store=True):
+    """
+    Esporta in streaming l'ontologia dell'intero catalogo in N-Triples o Turtle.
+
+    Args:
+        df (pd.DataFrame | None): Tracce già caricate in memoria; se None vengono
+            lette a blocchi da `INPUT_CSV`. Il DataFrame non viene modificato.
+        fmt (str): Formato di output, "nt" (default) o "ttl".
+        output (str | None): Percorso del file (default: `OUTPUT_PATHS[fmt]`).
+        chunk_size (int): Numero di tracce per blocco.
+        store (bool): Se True, ricostruisce il triple store persistente dall'export.
+
+    Returns:
+        int: Numero di tracce esportate.
+    """
+    output = output or OUTPUT_PATHS[fmt]
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp_path = output + ".tmp"
+    n_tracks = 0
+    index_blocks = []
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if fmt == "ttl":
+            f.write(f"@prefix ex: <{EX}> .\n\n")
+        for chunk in iter_chunks(df, chunk_size):
+            chunk = chunk.rename(columns=str.strip)
+            chunk = chunk[chunk["track_id"].notna()]
+            f.write(serialize_chunk(chunk, fmt))
+            n_tracks += len(chunk)
+            index_blocks.append(blocco_indice(chunk))
+    os.replace(tmp_path, output)
+
+    print(f"Ontologia ({n_tracks} tracce) salvata in '{output}'")
+
+    IndiceIntervalli.da_blocchi(index_blocks).salva(INDEX_PATH)
+    print(f"Indice degli intervalli numerici salvato in '{INDEX_PATH}'")
+
+    if store:
+        try:
+            build_store(output, fmt)
+            print(f"Triple store aggiornato in '{STORE_PATH}'")
+        except ImportError:
+            print("Plugin 'oxrdflib' non installato: triple store non aggiornato.")
+    return n_tracks
+
+def aggiorna_ontologia(aggiunte, rimosse, fmt="nt", output=None, store=True):
+    """
+    Aggiorna export, indice degli intervalli e triple store per le sole tracce cambiate.
+
+    Le triple delle tracce rimosse o modificate vengono eliminate (per URI) e quelle delle
+    tracce aggiunte o modificate vengono accodate all'export e caricate nello store.
+
+    Args:
+        aggiunte (pd.DataFrame): Tracce aggiunte o modificate, con le colonne del dataset
+            pulito.
+        rimosse (iterable[str]): `track_id` delle tracce rimosse.
+        fmt (str): Formato dell'export esistente, "nt" (default) o "ttl".
+        output (str | None): Percorso dell'export (default: `OUTPUT_PATHS[fmt]`).
+        store (bool): Se True, aggiorna anche il triple store persistente (se esiste).
+
+    Returns:
+        int: Numero di tracce le cui triple sono state eliminate o riscritte.
+    """
+    output = output or OUTPUT_PATHS[fmt]
+    aggiunte = aggiunte[aggiunte["track_id"].notna()]
+    uris = {track_uri(t) for t in [*rimosse, *aggiunte["track_id"]]}
+    subjects = {f"<{uri}>" for uri in uris}
+
+    if os.path.exists(output):
+        tmp_path = output + ".tmp"
+        skipping = False
+        with open(output, encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as f:
+            for line in src:
+                # In Turtle le righe di continuazione appartengono all'ultimo soggetto
+                if line.startswith("<"):
+                    skipping = line.split(" ", 1)[0] in subjects
+                if not skipping:
+                    f.write(line)
+            f.write(serialize_chunk(aggiunte, fmt))
+        os.replace(tmp_path, output)
+        print(f"Ontologia aggiornata in '{output}'")
+
+    if os.path.exists(INDEX_PATH):
+        index = IndiceIntervalli.carica(INDEX_PATH)
+        index.aggiorna(uris, [blocco_indice(aggiunte)])
+        index.salva(INDEX_PATH)
+        print(f"Indice degli intervalli numerici aggiornato in '{INDEX_PATH}'")
+
+    if store and os.path.isdir(STORE_PATH):
+        try:
+            update_store(uris, serialize_chunk(aggiunte, "nt"))
+            print(f"Triple store aggiornato in '{STORE_PATH}'")
+        except ImportError:
+            print("Plugin 'oxrdflib' non installato: triple store non aggiornato.")
+    return len(uris)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esportazione dell'ontologia musicale")
+    parser.add_argument("--format", choices=sorted(OUTPUT_PATHS), default="nt",
+                        help="formato di output (default: nt)")
+    parser.add_argument("--output", default=None, help="percorso del file di output")
+    parser.add_argument("--no-store", action="store_true",
+                        help="non ricostruisce il triple store persistente")
+    args = parser.parse_args()
+    export_ontology(fmt=args.format, output=args.output, store=not args.no_store)
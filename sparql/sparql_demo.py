@@ -2,12 +2,19 @@
 Script dimostrativo per interrogare l'ontologia musicale OWL
 e visualizzare un sottoinsieme di tracce con mood 'felice'.
 
-Carica l'ontologia RDF da file e lancia la query SPARQL definita in `ontology_module`.
+Carica l'ontologia RDF da file e lancia la query SPARQL definita in `ontology_module`,
+seguita da una ricerca per intervallo di energia risolta con l'indice numerico, se presente.
 """
 
-from ontology_module import load_ontology, run_query_felici
+from ontology_module import cerca_tracce, load_ontology, run_query_felici
+from range_index import load_range_index
 
 if __name__ == "__main__":
     print("Esecuzione query SPARQL sulle tracce 'felici'...")
     g = load_ontology()
     run_query_felici(g)
+
+    print("\nTracce 'felici' con energia tra 0.7 e 0.9:")
+    index = load_range_index()
+    for row in cerca_tracce(g, mood="felice", energy=(0.7, 0.9), limit=5, index=index):
+        print(f"'{row['name']}' di {row['artist']} | Energia: {row['energy']}")
@@ -0,0 +1,395 @@
+"""
+Endpoint HTTP locale conforme al protocollo SPARQL sull'ontologia musicale.
+
+Il grafo viene caricato una sola volta con `load_ontology` (triple store persistente o file)
+e resta in memoria per tutta la durata del server, così gli altri strumenti possono
+interrogarlo senza ripetere il parsing. Le query arrivano come:
+- GET  /sparql?query=...
+- POST /sparql con corpo `application/sparql-query` oppure form `query=...`
+
+Le richieste sono servite da thread concorrenti (sola lettura); ogni query viene eseguita
+in un pool di worker con un tempo massimo, e i risultati vengono troncati a `--max-rows`
+righe (SELECT) o triple (CONSTRUCT/DESCRIBE). Per CONSTRUCT e DESCRIBE il limite vale
+anche per la valutazione: sul triple store Oxigraph le triple vengono lette in streaming
+fino al limite, sui grafi in memoria la query viene limitata a `--max-rows` + 1
+soluzioni. Una query oltre il tempo massimo non può essere interrotta e continua a
+occupare il suo worker: quando tutti i worker sono occupati le nuove richieste vengono
+rifiutate subito con 503 invece di attendere in coda. Le risposte sono conservate in una
+cache LRU indicizzata dal testo normalizzato della query e dalla versione del grafo
+(incrementata da `ricarica`).
+
+Esempio:
+    python sparql/sparql_endpoint.py --port 3030
+    curl --data-urlencode 'query=SELECT * WHERE { ?s ?p ?o } LIMIT 3' http://localhost:3030/sparql
+"""
+
+import argparse
+import gc
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from itertools import islice
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from ontology_module import OxigraphStore, load_ontology
+
+# Parametri predefiniti del server
+HOST = "127.0.0.1"
+PORT = 3030
+QUERY_TIMEOUT = 30.0
+MAX_ROWS = 10_000
+CACHE_SIZE = 256
+N_WORKERS = 4
+
+# Tipi di contenuto delle risposte
+JSON_RESULTS = "application/sparql-results+json"
+NTRIPLES = "application/n-triples"
+
+# Letterali stringa, IRI, commenti e spazi: solo gli ultimi due vengono normalizzati
+TOKEN_RE = re.compile(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\])*"'
+                      r"|'(?:\\.|[^'\\])*'|<[^<>\s]*>|(?:\s|#[^\n]*)+")
+
+# Forma della query (dopo eventuali dichiarazioni PREFIX e BASE), sul testo normalizzato
+FORM_RE = re.compile(r"(?:(?:PREFIX\s*[^\s:]*:\s*<[^>]*>|BASE\s*<[^>]*>)\s*)*"
+                     r"(SELECT|CONSTRUCT|DESCRIBE|ASK)\b", re.IGNORECASE)
+
+class EndpointSaturo(Exception):
+    """Tutti i worker stanno eseguendo una query (anche oltre il tempo massimo)."""
+
+def normalizza_query(query):
+    """
+    Normalizza il testo di una query per l'uso come chiave di cache.
+
+    Rimuove i commenti e riduce ogni sequenza di spazi a uno solo, lasciando invariati
+    letterali stringa e IRI.
+
+    Args:
+        query (str): Testo della query.
+
+    Returns:
+        str: Testo normalizzato.
+    """
+    def replace(match):
+        token = match.group(0)
+        if token[0] in "\"'<":
+            return token
+        return " "
+    return TOKEN_RE.sub(replace, query).strip()
+
+def termine_json(term):
+    """
+    Converte un termine RDF nel formato JSON dei risultati SPARQL.
+
+    Args:
+        term (rdflib.term.Node): Termine da convertire.
+
+    Returns:
+        dict: Termine serializzato.
+    """
+    if isinstance(term, URIRef):
+        return {"type": "uri", "value": str(term)}
+    if isinstance(term, BNode):
+        return {"type": "bnode", "value": str(term)}
+    value = {"type": "literal", "value": str(term)}
+    if isinstance(term, Literal):
+        if term.language:
+            value["xml:lang"] = term.language
+        elif term.datatype:
+            value["datatype"] = str(term.datatype)
+    return value
+
+class SparqlEndpoint:
+    """
+    Esecutore delle query con timeout, limite di righe e cache LRU delle risposte.
+
+    Args:
+        graph (rdflib.Graph): Grafo dell'ontologia, già caricato.
+        timeout (float): Tempo massimo di esecuzione di una query, in secondi.
+        max_rows (int): Numero massimo di righe (SELECT) o triple (CONSTRUCT/DESCRIBE)
+            restituite.
+        cache_size (int): Numero massimo di risposte in cache.
+        n_workers (int): Query eseguite al massimo in parallelo.
+    """
+
+    def __init__(self, graph, timeout=QUERY_TIMEOUT, max_rows=MAX_ROWS,
+                 cache_size=CACHE_SIZE, n_workers=N_WORKERS):
+        self.graph = graph
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.cache_size = cache_size
+        self.versione = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.n_workers = n_workers
+        self.in_corso = 0
+        self._executor = ThreadPoolExecutor(max_workers=n_workers)
+
+    def ricarica(self, graph=None):
+        """
+        Sostituisce (o ricarica) il grafo e invalida le risposte in cache.
+
+        Args:
+            graph (rdflib.Graph | None): Nuovo grafo; se None viene ricaricato con
+                `load_ontology`.
+        """
+        graph = graph if graph is not None else load_ontology()
+        with self._lock:
+            old, self.graph = self.graph, graph
+            self.versione += 1
+            self._cache.clear()
+        if old is not graph and hasattr(old, "close"):
+            old.close()
+
+    def _esegui(self, query):
+        """
+        Esegue la query e serializza il risultato (nel thread del worker).
+
+        Args:
+            query (str): Testo della query.
+
+        Returns:
+            tuple[str, bytes, bool]: Tipo di contenuto, corpo e flag di troncamento.
+        """
+        form = FORM_RE.match(normalizza_query(query))
+        if form is not None and form.group(1).upper() in ("CONSTRUCT", "DESCRIBE"):
+            return self._esegui_triple(query)
+
+        result = self.graph.query(query)
+        if result.type == "ASK":
+            body = {"head": {}, "boolean": bool(result.askAnswer)}
+            return JSON_RESULTS, json.dumps(body).encode("utf-8"), False
+
+        variables = [str(v) for v in result.vars]
+        bindings = []
+        truncated = False
+        for row in result:
+            if len(bindings) >= self.max_rows:
+                truncated = True
+                break
+            bindings.append({
+                var: termine_json(term)
+                for var, term in zip(variables, row) if term is not None
+            })
+        if truncated:
+            # La lettura interrotta lascia un ciclo tra il risultato e il suo generatore: va
+            # raccolto in questo thread (pyoxigraph non rilascia i risultati da altri thread)
+            del result, row
+            gc.collect()
+        body = {"head": {"vars": variables}, "results": {"bindings": bindings}}
+        return JSON_RESULTS, json.dumps(body, ensure_ascii=False).encode("utf-8"), truncated
+
+    def _esegui_triple(self, query):
+        """
+        Esegue una query CONSTRUCT o DESCRIBE limitandone anche la valutazione.
+
+        Sul triple store Oxigraph la query viene eseguita direttamente da `pyoxigraph`, che
+        produce le triple in modo lazy: ne vengono lette al più `max_rows` + 1 e serializzate
+        senza costruire il grafo completo del risultato. Sui grafi in memoria rdflib
+        costruirebbe comunque tutto il grafo del risultato, quindi il pattern della query
+        compilata viene avvolto in uno `Slice` di `max_rows` + 1 soluzioni (o ne riduce
+        il LIMIT se maggiore).
+
+        Args:
+            query (str): Testo della query.
+
+        Returns:
+            tuple[str, bytes, bool]: Tipo di contenuto, corpo e flag di troncamento.
+        """
+        if OxigraphStore is not None and isinstance(self.graph.store, OxigraphStore):
+            import pyoxigraph as ox
+
+            triples = self.graph.store._inner.query(
+                query, default_graph=ox.NamedNode(str(self.graph.identifier)),
+                prefixes={prefix: str(ns) for prefix, ns in self.graph.namespaces()},
+            )
+            rows = list(islice(triples, self.max_rows + 1))
+            body = ox.serialize(rows[:self.max_rows], format=ox.RdfFormat.N_TRIPLES)
+            return NTRIPLES, body or b"", len(rows) > self.max_rows
+
+        prepared = prepareQuery(query)
+        pattern = prepared.algebra.p
+        if pattern.name == "Slice":
+            if pattern.length is None or pattern.length > self.max_rows + 1:
+                pattern["length"] = self.max_rows + 1
+        else:
+            prepared.algebra["p"] = CompValue("Slice", p=pattern, start=0,
+                                              length=self.max_rows + 1)
+        graph = Graph()
+        truncated = False
+        for n, triple in enumerate(self.graph.query(prepared)):
+            if n >= self.max_rows:
+                truncated = True
+                break
+            graph.add(triple)
+        return NTRIPLES, graph.serialize(format="nt", encoding="utf-8"), truncated
+
+    def esegui(self, query):
+        """
+        Restituisce la risposta a una query, dalla cache se disponibile.
+
+        Args:
+            query (str): Testo della query.
+
+        Returns:
+            tuple[str, bytes, bool, bool]: Tipo di contenuto, corpo, flag di troncamento
+            e flag di risposta servita dalla cache.
+
+        Raises:
+            EndpointSaturo: Se tutti i worker sono occupati.
+            TimeoutError: Se la query supera il tempo massimo.
+            Exception: Errori di sintassi o di valutazione della query.
+        """
+        key = (normalizza_query(query), self.versione)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return (*self._cache[key], True)
+
+        with self._lock:
+            if self.in_corso >= self.n_workers:
+                raise EndpointSaturo(f"Tutti i {self.n_workers} worker sono occupati, riprovare")
+            self.in_corso += 1
+        future = self._executor.submit(self._esegui, query)
+        future.add_done_callback(self._worker_libero)
+        try:
+            response = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # La valutazione non è interrompibile: il worker termina in background
+            future.cancel()
+            raise TimeoutError(f"Query interrotta dopo {self.timeout} secondi")
+
+        with self._lock:
+            if key[1] == self.versione:
+                self._cache[key] = response
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return (*response, False)
+
+    def _worker_libero(self, future):
+        """Libera il posto di una query conclusa (anche dopo il tempo massimo)."""
+        with self._lock:
+            self.in_corso -= 1
+
+    def chiudi(self):
+        """
+        Arresta il pool di worker.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class SparqlHandler(BaseHTTPRequestHandler):
+    """
+    Gestore HTTP del protocollo SPARQL (solo query, nessun aggiornamento).
+    """
+
+    endpoint = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/sparql":
+            self._errore(404, "Percorso non trovato: usare /sparql")
+            return
+        query = parse_qs(url.query).get("query", [None])[0]
+        self._rispondi(query)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/sparql":
+            self._errore(404, "Percorso non trovato: usare /sparql")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        if content_type == "application/sparql-query":
+            query = body
+        else:
+            query = parse_qs(body).get("query", [None])[0]
+            if query is None:
+                query = parse_qs(url.query).get("query", [None])[0]
+        self._rispondi(query)
+
+    def _rispondi(self, query):
+        if not query:
+            self._errore(400, "Parametro 'query' mancante")
+            return
+        try:
+            content_type, body, truncated, cached = self.endpoint.esegui(query)
+        except (EndpointSaturo, TimeoutError) as e:
+            self._errore(503, str(e))
+            return
+        except Exception as e:
+            self._errore(400, f"Query non valida: {e}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Graph-Version", str(self.endpoint.versione))
+        self.send_header("X-Cache", "HIT" if cached else "MISS")
+        if truncated:
+            self.send_header("X-Truncated", str(self.endpoint.max_rows))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _errore(self, status, message):
+        body = message.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host=HOST, port=PORT, timeout=QUERY_TIMEOUT, max_rows=MAX_ROWS,
+          cache_size=CACHE_SIZE, n_workers=N_WORKERS, graph=None):
+    """
+    Carica il grafo una sola volta e avvia l'endpoint fino all'interruzione (Ctrl+C).
+
+    Args:
+        host (str): Indirizzo di ascolto.
+        port (int): Porta di ascolto.
+        timeout (float): Tempo massimo di esecuzione di una query, in secondi.
+        max_rows (int): Numero massimo di righe (SELECT) o triple (CONSTRUCT/DESCRIBE)
+            restituite.
+        cache_size (int): Numero massimo di risposte in cache.
+        n_workers (int): Query eseguite al massimo in parallelo.
+        graph (rdflib.Graph | None): Grafo già caricato (default: `load_ontology()`).
+    """
+    print("Caricamento dell'ontologia...")
+    graph = graph if graph is not None else load_ontology()
+    endpoint = SparqlEndpoint(graph, timeout, max_rows, cache_size, n_workers)
+    handler = type("Handler", (SparqlHandler,), {"endpoint": endpoint})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"Endpoint SPARQL in ascolto su http://{host}:{server.server_port}/sparql")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArresto dell'endpoint.")
+    finally:
+        server.server_close()
+        endpoint.chiudi()
+        if hasattr(graph, "close"):
+            graph.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Endpoint SPARQL locale sull'ontologia musicale")
+    parser.add_argument("--host", default=HOST, help=f"indirizzo di ascolto (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"porta (default: {PORT})")
+    parser.add_argument("--timeout", type=float, default=QUERY_TIMEOUT,
+                        help=f"tempo massimo per query in secondi (default: {QUERY_TIMEOUT})")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS,
+                        help=f"righe massime per risultato (default: {MAX_ROWS})")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help=f"risposte massime in cache (default: {CACHE_SIZE})")
+    parser.add_argument("--workers", type=int, default=N_WORKERS,
+                        help=f"query in parallelo (default: {N_WORKERS})")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.timeout, args.max_rows, args.cache_size, args.workers)